@@ -0,0 +1,175 @@
+"""Przepustowość paneli (uczeń, rodzic, nauczyciel, profil nauczyciela) przy
+wielu równoległych żądaniach: ASGI (uvicorn, widoki async) kontra WSGI
+(wielowątkowy serwer Django, każde żądanie w osobnym wątku).
+
+Oba serwery działają w tym procesie na tej samej tymczasowej bazie, a ruch
+generuje osobny proces (asyncio, połączenia keep-alive), żeby klient nie
+konkurował z serwerem o GIL. Wymaga uvicorn (pip install uvicorn).
+
+Użycie: python benchmarks/bench_asgi_wsgi.py [--requests 2000] [--concurrency 50]
+        [--cold]   (bez cache fragmentów - każde żądanie idzie do bazy)
+
+Uwaga: ORM Django w widokach async wykonuje zapytania przez sync_to_async
+(jeden wątek na proces), więc na szybkiej, lokalnej bazie ASGI nie musi
+wygrać - zysk to brak wątku blokowanego na każde oczekujące żądanie.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+
+async def _client(host, port, targets, requests_count, concurrency):
+    """Tryb procesu-klienta: `concurrency` połączeń, łącznie `requests_count` żądań GET."""
+    remaining = [requests_count]
+    latencies, errors = [], []
+
+    async def connection(n):
+        reader, writer = await asyncio.open_connection(host, port)
+        i = n
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            path, cookie = targets[i % len(targets)]
+            i += 1
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: testserver\r\nCookie: {cookie}\r\n\r\n'.encode())
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while (line := await reader.readline()) not in (b'\r\n', b''):
+                name, _, value = line.decode().partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors.append(status)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[int(len(latencies) * 0.95)],
+        'errors': len(errors),
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_wsgi(port):
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', port), QuietHandler, allow_reuse_address=True)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def serve_asgi(port):
+    import uvicorn
+    from django.core.asgi import get_asgi_application
+
+    server = uvicorn.Server(uvicorn.Config(get_asgi_application(), host='127.0.0.1', port=port,
+                                           log_level='warning', lifespan='off'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+    return stop
+
+
+def run_server_benchmarks(args):
+    from _setup import setup, throwaway_database
+
+    setup()
+
+    from io import StringIO
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test import Client
+    from django.urls import reverse
+
+    from core.models import SubjectAssignment, User
+
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        sys.exit('Brak uvicorn - zainstaluj: pip install uvicorn')
+
+    with throwaway_database():
+        call_command('seed_data', classes=6, students_per_class=25, subjects=8, grades_per_student=6,
+                     random_seed=1, stdout=StringIO())
+        teacher = SubjectAssignment.objects.first().teacher
+        student = User.objects.filter(role='student').first()
+        admin = User.objects.create(email='bench@szkola.pl', username='bench@szkola.pl', role='admin')
+
+        def cookie(user):
+            client = Client()
+            client.force_login(user)
+            return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        targets = [
+            (reverse('student_panel'), cookie(student)),
+            (reverse('parent_panel'), cookie(student.parent)),
+            (reverse('teacher_panel'), cookie(teacher)),
+            (reverse('teacher_details', args=[teacher.id]), cookie(admin)),
+        ]
+
+        print(f'{args.requests} żądań, {args.concurrency} równoległych połączeń, '
+              f'cache fragmentów: {"wyłączony" if args.cold else "włączony"}')
+        for label, serve in (('WSGI (wątki)', serve_wsgi), ('ASGI (uvicorn)', serve_asgi)):
+            port = _free_port()
+            stop = serve(port)
+            try:
+                result = subprocess.run(
+                    [sys.executable, __file__, '--client', json.dumps(targets), '--port', str(port),
+                     '--requests', str(args.requests), '--concurrency', str(args.concurrency)],
+                    capture_output=True, text=True, check=True,
+                )
+            finally:
+                stop()
+            stats = json.loads(result.stdout)
+            print(f"{label:>16}: {stats['rps']:8.1f} żądań/s  p50 {stats['p50']:6.1f} ms  "
+                  f"p95 {stats['p95']:6.1f} ms  (błędy HTTP: {stats['errors']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--cold', action='store_true')
+    parser.add_argument('--client', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        targets = json.loads(args.client)
+        print(json.dumps(asyncio.run(_client('127.0.0.1', args.port, targets, args.requests, args.concurrency))))
+        return
+    if args.cold:
+        os.environ['DASHBOARD_CACHE_TIMEOUT'] = '0'
+    run_server_benchmarks(args)
+
+
+if __name__ == '__main__':
+    main()
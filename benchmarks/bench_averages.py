@@ -0,0 +1,67 @@
+"""Średnie ważone całej szkoły (np. do świadectw): pętla po obiektach Grade
+kontra core.averages (kolumny z jednego zapytania, NumPy albo czysty Python).
+
+Użycie: python benchmarks/bench_averages.py [--classes 40] [--students-per-class 30]
+        [--subjects 10] [--grades-per-student 12] [--repeat 3]
+"""
+import argparse
+from collections import defaultdict
+from io import StringIO
+
+from _setup import setup, throwaway_database, best_of
+
+setup()
+
+from django.core.management import call_command  # noqa: E402
+
+from core import averages  # noqa: E402
+from core.models import Grade  # noqa: E402
+
+
+def per_object(mode):
+    """Dotychczasowy sposób: obiekty modeli i sumowanie w pętli, para po parze."""
+    grades = defaultdict(list)
+    for grade in Grade.objects.all():
+        grades[grade.student_id, grade.subject_id].append(grade)
+    result = {}
+    for pair, items in grades.items():
+        if mode == 'simple':
+            result[pair] = round(sum(float(g.score) for g in items) / len(items), 2)
+        else:
+            result[pair] = round(sum(float(g.score) * g.weight for g in items) / sum(g.weight for g in items), 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--classes', type=int, default=40)
+    parser.add_argument('--students-per-class', type=int, default=30)
+    parser.add_argument('--subjects', type=int, default=10)
+    parser.add_argument('--grades-per-student', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with throwaway_database():
+        call_command('seed_data', classes=args.classes, students_per_class=args.students_per_class,
+                     subjects=args.subjects, grades_per_student=args.grades_per_student,
+                     random_seed=1, stdout=StringIO())
+        print(f"{Grade.objects.count()} ocen, NumPy: {'tak' if averages.np is not None else 'nie (pip install numpy)'}")
+
+        columns = averages.grade_columns(Grade.objects.all())
+        numpy = averages.np
+        print(f"{'tryb':>9} {'obiekty [ms]':>13} {'kolumny+odczyt [ms]':>20} {'sam silnik [ms]':>16} {'czysty Python [ms]':>19}")
+        for mode in ('simple', 'weighted'):
+            assert per_object(mode) == averages.school_averages(mode)
+            t_objects = best_of(lambda: per_object(mode), args.repeat)
+            t_columns = best_of(lambda: averages.school_averages(mode), args.repeat)
+            t_engine = best_of(lambda: averages.compute(columns, mode), args.repeat)
+            averages.np = None
+            try:
+                t_python = best_of(lambda: averages.compute(columns, mode), args.repeat)
+            finally:
+                averages.np = numpy
+            print(f"{mode:>9} {t_objects:>13.1f} {t_columns:>20.1f} {t_engine:>16.1f} {t_python:>19.1f}")
+
+
+if __name__ == '__main__':
+    main()
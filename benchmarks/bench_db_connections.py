@@ -0,0 +1,112 @@
+"""Przepustowość (żądania/s) panelu ucznia przy różnych strategiach połączeń z bazą:
+nowe połączenie na żądanie, CONN_MAX_AGE (trwałe) i pula psycopg 3.
+
+Każdy wariant startuje w osobnym procesie (ustawienia czytane są raz, przy
+imporcie), podnosi wielowątkowy serwer WSGI i odpytuje go przez HTTP z kilku
+wątków. Ma sens na PostgreSQL - najlepiej lokalnym, a dla realnego obrazu
+także zdalnym z TLS, gdzie koszt nawiązania połączenia jest największy.
+
+Użycie: DATABASE_URL=postgres://... python benchmarks/bench_db_connections.py
+        [--requests 2000] [--concurrency 8]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+VARIANTS = [
+    ('bez trwałych połączeń', {'DB_CONN_MAX_AGE': '0', 'DB_POOL': 'False'}),
+    ('CONN_MAX_AGE=600', {'DB_CONN_MAX_AGE': '600', 'DB_POOL': 'False'}),
+    ('pula psycopg', {'DB_CONN_MAX_AGE': '0', 'DB_POOL': 'True'}),
+]
+
+
+def worker(requests_count, concurrency):
+    from _setup import setup, throwaway_database
+
+    setup()
+
+    import http.client
+    from io import StringIO
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connection
+    from django.test import Client
+
+    from core.models import User
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    with throwaway_database():
+        call_command('seed_data', classes=2, students_per_class=10, random_seed=1, stdout=StringIO())
+        client = Client()
+        client.force_login(User.objects.filter(role='student').first())
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        connection.close()
+
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=True)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        errors = []
+
+        def hammer(count):
+            conn = http.client.HTTPConnection('127.0.0.1', port)
+            for _ in range(count):
+                conn.request('GET', '/student/', headers={'Cookie': cookie, 'Host': 'testserver'})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+
+        per_thread = requests_count // concurrency
+        hammer(20)  # rozgrzewka: pierwsze połączenie, cache panelu
+        threads = [threading.Thread(target=hammer, args=(per_thread,)) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        server.server_close()
+
+    print(json.dumps({'rps': per_thread * concurrency / elapsed, 'errors': len(errors)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.requests, args.concurrency)
+        return
+
+    print(f'{args.requests} żądań GET /student/, {args.concurrency} wątków')
+    for label, env in VARIANTS:
+        result = subprocess.run(
+            [sys.executable, __file__, '--worker', '--requests', str(args.requests),
+             '--concurrency', str(args.concurrency)],
+            env={**os.environ, **env}, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            print(f'{label:>24}: błąd\n{result.stderr.strip().splitlines()[-1]}')
+            continue
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{label:>24}: {stats['rps']:8.1f} żądań/s  (błędy HTTP: {stats['errors']})")
+
+
+if __name__ == '__main__':
+    main()
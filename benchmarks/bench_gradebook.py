@@ -0,0 +1,100 @@
+"""Porównanie renderowania dziennika klasy: stary szablon O(uczniowie x oceny)
+kontra macierz budowana w widoku przez build_gradebook().
+
+Użycie: python benchmarks/bench_gradebook.py [--students 35] [--repeat 5]
+"""
+import argparse
+import random
+
+from _setup import setup, throwaway_database, best_of
+
+setup()
+
+from django.template import engines  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.template.loader import render_to_string  # noqa: E402
+
+from core.models import ClassGroup, Subject, User, Grade, SchoolYear  # noqa: E402
+from core.views import build_gradebook  # noqa: E402
+
+# Pętle poprzedniej wersji class_grades_detail.html (odznaki + modale edycji).
+LEGACY_TEMPLATE = """
+{% for student in students %}
+<tr><td>{{ student.last_name }} {{ student.first_name }}</td><td>
+{% for grade in grades %}{% if grade.student_id == student.id %}
+<button class="badge {% if grade.value <= 2 %}bg-danger{% elif grade.value <= 4 %}bg-warning{% else %}bg-success{% endif %}" data-bs-target="#editGrade{{ grade.id }}">{{ grade.value }}</button>
+{% endif %}{% endfor %}
+</td></tr>
+{% endfor %}
+{% for student in students %}
+<div id="addGrade{{ student.id }}">{{ student.last_name }}</div>
+{% for grade in grades %}{% if grade.student_id == student.id %}
+<div id="editGrade{{ grade.id }}"><input name="grade_id" value="{{ grade.id }}">{{ student.first_name }} {{ grade.value }} {{ grade.comment }}</div>
+{% endif %}{% endfor %}
+{% endfor %}
+"""
+
+
+def populate(students_count, grades_count):
+    Grade.objects.all().delete()
+    User.objects.all().delete()
+    group, _ = ClassGroup.objects.get_or_create(name='1A')
+    subject, _ = Subject.objects.get_or_create(name='Matematyka')
+    teacher = User.objects.create(email='bench-n@szkola.pl', username='bench-n@szkola.pl', role='teacher')
+    User.objects.bulk_create([
+        User(email=f'bench{i}@szkola.pl', username=f'bench{i}@szkola.pl', first_name=f'Uczen{i}',
+             last_name=f'Nazwisko{i:03d}', role='student', class_group=group, password='!')
+        for i in range(students_count)
+    ])
+    students = list(User.objects.filter(role='student'))
+    grades = [
+        Grade(student=random.choice(students), teacher=teacher, subject=subject,
+              value=random.randint(1, 6), comment='Sprawdzian')
+        for _ in range(grades_count)
+    ]
+    school_year = SchoolYear.current()
+    for grade in grades:
+        grade.score = grade.build_score()
+        grade.assign_school_year(school_year)
+    Grade.objects.bulk_create(grades)
+    return group, subject
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=35)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    legacy = engines.all()[0].from_string(LEGACY_TEMPLATE)
+    request = RequestFactory().get('/')
+
+    with throwaway_database():
+        print(f"{'oceny':>8} {'przed [ms]':>12} {'po [ms]':>10} {'przysp.':>8}")
+        for grades_count in (30, 300, 3000):
+            group, subject = populate(args.students, grades_count)
+            teacher = User.objects.get(role='teacher')
+            request.user = teacher
+
+            def students():
+                return User.objects.filter(class_group=group, role='student').order_by('last_name')
+
+            def grades():
+                return Grade.objects.filter(subject=subject, student__class_group=group)
+
+            def before():
+                legacy.render({'students': list(students()), 'grades': list(grades().select_related('student'))})
+
+            def after():
+                render_to_string('core/class_grades_detail.html', {
+                    'group': group, 'subject': subject,
+                    'gradebook': build_gradebook(students(), grades().order_by('date_created', 'id')),
+                }, request=request)
+
+            t_before = best_of(before, args.repeat)
+            t_after = best_of(after, args.repeat)
+            print(f"{grades_count:>8} {t_before:>12.1f} {t_after:>10.1f} {t_before / t_after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
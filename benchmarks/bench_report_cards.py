@@ -0,0 +1,65 @@
+"""Świadectwa całej szkoły: panel ucznia wyrenderowany dla każdego ucznia po kolei
+(tyle żądań, ilu uczniów) kontra manage.py generate_report_cards (jedno zapytanie
+o oceny na klasę, średnie z core.averages, renderowanie w puli procesów).
+
+Użycie: python benchmarks/bench_report_cards.py [--classes 20] [--students-per-class 30]
+        [--subjects 10] [--grades-per-student 8] [--workers N]
+"""
+import argparse
+import os
+import tempfile
+import time
+from io import StringIO
+
+from _setup import setup, throwaway_database
+
+setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from core import report_cards  # noqa: E402
+from core.models import User  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--students-per-class', type=int, default=30)
+    parser.add_argument('--subjects', type=int, default=10)
+    parser.add_argument('--grades-per-student', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with throwaway_database():
+        call_command('seed_data', classes=args.classes, students_per_class=args.students_per_class,
+                     subjects=args.subjects, grades_per_student=args.grades_per_student, random_seed=1, stdout=StringIO())
+        students = list(User.objects.filter(role='student'))
+
+        client = Client()
+        cache.clear()
+        started = time.perf_counter()
+        for student in students:
+            client.force_login(student)
+            client.get(reverse('student_panel'))
+        t_panels = time.perf_counter() - started
+
+        timings = {}
+        for workers in sorted({1, args.workers}):
+            with tempfile.TemporaryDirectory() as output:
+                started = time.perf_counter()
+                report_cards.generate(output, workers=workers)
+                timings[workers] = time.perf_counter() - started
+
+    n = len(students)
+    print(f'{n} uczniów, {args.subjects} przedmiotów, CPU: {os.cpu_count()}')
+    print(f'  {"student_panel po kolei:":<32}{t_panels:6.2f} s ({t_panels * 1000 / n:.1f} ms/uczeń)')
+    for workers, elapsed in timings.items():
+        label = f'generate_report_cards ({workers} proc.):'
+        print(f'  {label:<32}{elapsed:6.2f} s ({elapsed * 1000 / n:.1f} ms/uczeń)')
+
+
+if __name__ == '__main__':
+    main()
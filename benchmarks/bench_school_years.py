@@ -0,0 +1,81 @@
+"""Oceny z kilku lat szkolnych: odczyt ocen ucznia do panelu z całej historii
+(jak przed wprowadzeniem SchoolYear) kontra tylko bieżący rok, a potem ten sam
+odczyt po przeniesieniu zamkniętych lat do archiwum (archive_school_year).
+
+Użycie: python benchmarks/bench_school_years.py [--years 5] [--classes 10]
+        [--students-per-class 25] [--grades-per-student 40] [--repeat 5]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+
+from _setup import setup, throwaway_database, best_of
+
+setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db.models import Max, Min  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from core import grade_stats, school_years  # noqa: E402
+from core.models import Grade, SchoolYear, User  # noqa: E402
+
+
+def spread_over_years(years):
+    """Rozkłada istniejące oceny równo na `years` lat: bieżący i years-1 zamkniętych."""
+    current = SchoolYear.current()
+    bounds = Grade.objects.aggregate(first=Min('id'), last=Max('id'))
+    per_year = (bounds['last'] - bounds['first'] + 1) // years
+    for back in range(1, years):
+        year = SchoolYear.for_date(current.start - timedelta(days=365 * back - 30))
+        start = bounds['first'] + (back - 1) * per_year
+        Grade.objects.filter(id__gte=start, id__lt=start + per_year).update(
+            school_year=year, term=1, date_created=timezone.make_aware(datetime.combine(year.start, datetime.min.time())),
+        )
+    grade_stats.rebuild()
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--classes', type=int, default=10)
+    parser.add_argument('--students-per-class', type=int, default=25)
+    parser.add_argument('--grades-per-student', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with throwaway_database():
+        call_command('seed_data', classes=args.classes, students_per_class=args.students_per_class,
+                     grades_per_student=args.grades_per_student, random_seed=1, stdout=StringIO())
+        current = spread_over_years(args.years)
+        student_ids = list(User.objects.filter(role='student').values_list('id', flat=True))
+
+        def panels(all_years):
+            for student_id in student_ids:
+                grades = Grade.objects.filter(student_id=student_id)
+                if not all_years:
+                    grades = grades.filter(school_year=current)
+                list(grades.select_related('teacher', 'category').order_by('date_created', 'id'))
+
+        total = Grade.objects.count()
+        t_history = best_of(lambda: panels(True), args.repeat)
+        t_current = best_of(lambda: panels(False), args.repeat)
+
+        started = time.perf_counter()
+        for year in SchoolYear.objects.exclude(id=current.id):
+            school_years.archive_year(year)
+        t_archive = time.perf_counter() - started
+        t_archived = best_of(lambda: panels(False), args.repeat)
+
+    n = len(student_ids)
+    print(f'{total} ocen z {args.years} lat, {n} uczniów (odczyt ocen do panelu każdego ucznia)')
+    print(f'  cała historia:          {t_history:8.1f} ms ({t_history / n:.2f} ms/uczeń)')
+    print(f'  bieżący rok:            {t_current:8.1f} ms ({t_current / n:.2f} ms/uczeń)')
+    print(f'  bieżący rok po archiw.: {t_archived:8.1f} ms ({t_archived / n:.2f} ms/uczeń)')
+    print(f'  archiwizacja {total - total // args.years} ocen: {t_archive:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Koszt bezczynnych strumieni SSE z powiadomieniami o ocenach (parent_stream)
+w porównaniu z odświeżaniem pełnego panelu rodzica.
+
+Serwer (uvicorn, w tym procesie) dostaje N otwartych strumieni od osobnego
+procesu-klienta. Mierzymy przyrost pamięci (RSS) i czas CPU serwera przez
+kilka sekund bezczynności, potem zapis jednej oceny dziecka i czas, po jakim
+powiadomienie dociera do wszystkich strumieni. Dla porównania: czas jednego
+wejścia na parent_panel bez cache fragmentów. Wymaga uvicorn (pip install uvicorn).
+
+Użycie: python benchmarks/bench_sse.py [--connections 1000] [--idle 10]
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from bench_asgi_wsgi import _free_port, serve_asgi
+
+
+def _raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _rss_mb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def _client(port, path, cookie, connections):
+    """Tryb procesu-klienta: otwiera strumienie, zgłasza gotowość i czeka na jedno zdarzenie w każdym."""
+    _raise_fd_limit()
+    received = []
+
+    async def stream(ready):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: testserver\r\nCookie: {cookie}\r\nAccept: text/event-stream\r\n\r\n'.encode())
+        while (await reader.readline()) != b'\r\n':
+            pass
+        ready.set_result(None)
+        while b'event: grade' not in await reader.readline():
+            pass
+        received.append(time.time())
+        writer.close()
+
+    loop = asyncio.get_running_loop()
+    readies = [loop.create_future() for _ in range(connections)]
+    tasks = [asyncio.ensure_future(stream(ready)) for ready in readies]
+    await asyncio.gather(*readies)
+    print('ready', flush=True)
+    await asyncio.gather(*tasks)
+    return received
+
+
+def run(args):
+    from _setup import best_of, setup, throwaway_database
+
+    setup()
+    _raise_fd_limit()
+
+    from io import StringIO
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.db import transaction
+    from django.test import Client
+    from django.urls import reverse
+
+    from core import grade_journal
+    from core.models import Grade, User
+
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        sys.exit('Brak uvicorn - zainstaluj: pip install uvicorn')
+
+    with throwaway_database():
+        call_command('seed_data', classes=6, students_per_class=25, subjects=8, grades_per_student=6,
+                     random_seed=1, stdout=StringIO())
+        student = User.objects.filter(role='student').select_related('parent').first()
+        client = Client()
+        client.force_login(student.parent)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        def cold_panel():
+            cache.clear()
+            client.get(reverse('parent_panel'))
+        panel_ms = best_of(cold_panel)
+
+        port = _free_port()
+        stop = serve_asgi(port)
+        try:
+            rss_before = _rss_mb()
+            proc = subprocess.Popen(
+                [sys.executable, __file__, '--client', json.dumps([reverse('parent_stream'), cookie]),
+                 '--port', str(port), '--connections', str(args.connections)],
+                stdout=subprocess.PIPE, text=True,
+            )
+            assert proc.stdout.readline().strip() == 'ready'
+            rss_open = _rss_mb()
+            cpu_start = time.process_time()
+            time.sleep(args.idle)
+            idle_cpu_ms = (time.process_time() - cpu_start) * 1000
+
+            grade = Grade.objects.filter(student=student).first()
+            sent = time.time()
+            with transaction.atomic():
+                grade_journal.grade_removed(grade, None)
+            received = json.loads(proc.communicate()[0])
+        finally:
+            stop()
+
+    delays = sorted((moment - sent) * 1000 for moment in received)
+    print(f'{args.connections} otwartych strumieni parent_stream')
+    print(f'  pamięć serwera: +{rss_open - rss_before:.1f} MB ({(rss_open - rss_before) * 1024 / args.connections:.1f} KB/strumień)')
+    print(f'  CPU serwera przez {args.idle} s bezczynności: {idle_cpu_ms:.0f} ms')
+    print(f'  powiadomienie o ocenie: p50 {delays[len(delays) // 2]:.1f} ms, max {delays[-1]:.1f} ms '
+          f'({len(delays)}/{args.connections} strumieni)')
+    print(f'parent_panel bez cache: {panel_ms:.1f} ms/żądanie - {args.connections} odświeżeń '
+          f'to ok. {panel_ms * args.connections / 1000:.1f} s pracy serwera')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--idle', type=float, default=10)
+    parser.add_argument('--client', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        path, cookie = json.loads(args.client)
+        print(json.dumps(asyncio.run(_client(args.port, path, cookie, args.connections))))
+        return
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,10 @@
 """
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+Uruchomienie: uvicorn config.asgi:application. Tylko pod ASGI działają strumienie
+SSE z powiadomieniami o ocenach (student_stream / parent_stream, core.notifications);
+pub/sub jest w pamięci procesu, więc przy kilku workerach powiadomienia z innego
+procesu przychodzą dopiero po ponownym połączeniu strumienia.
 """
 
 import os
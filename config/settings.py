@@ -8,6 +8,8 @@ from pathlib import Path
 import environ
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
@@ -35,6 +37,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.RequestTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -47,7 +50,7 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backend.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,6 +76,13 @@ DATABASES = {
     'default': env.db(),
 }
 
+# Trwałe połączenia (DB_CONN_MAX_AGE, sekundy) oszczędzają handshake TCP+TLS+auth tylko pod WSGI (gunicorn),
+# gdzie wątek obsługuje kolejne żądania tym samym połączeniem. Pod ASGI (uvicorn) każde żądanie ma własny
+# kontekst i własne połączenie, więc trwałe połączenia tylko się mnożą do timeoutu - stąd domyślnie 0,
+# a pod ASGI zamiast nich pula psycopg 3 (DB_POOL=True).
+DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=0)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = env.bool('DB_CONN_HEALTH_CHECKS', default=True)
+
 """
 DATABASES = {
     'default': {
@@ -87,9 +97,22 @@ DATABASES = {
 }
 """
 
-DATABASES['default']['OPTIONS'] = {
-    'sslmode': 'require',
-}
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default'].setdefault('OPTIONS', {}).setdefault('sslmode', env.str('DB_SSLMODE', default='require'))
+    # Pula połączeń psycopg 3 (pip install "psycopg[binary,pool]"); wyklucza się z CONN_MAX_AGE > 0.
+    if env.bool('DB_POOL', default=False):
+        try:
+            import psycopg  # noqa: F401
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            # requirements.txt instaluje psycopg2, z którym Django nie obsługuje puli.
+            raise ImproperlyConfigured('DB_POOL=True wymaga psycopg 3 z pulą połączeń: pip install "psycopg[binary,pool]".')
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+            'timeout': env.int('DB_POOL_TIMEOUT', default=10),
+        }
+        DATABASES['default']['CONN_MAX_AGE'] = 0
 """
 DATABASES = {
     'default': {
@@ -103,6 +126,62 @@ DATABASES = {
 }
 """
 
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Np. CACHE_URL=filecache:///var/tmp/dziennik_cache albo dbcache://dziennik_cache (+ manage.py createcachetable)
+
+# Domyślny locmem jest osobny w każdym procesie: przy WEB_CONCURRENCY > 1 (liczba procesów gunicorn/uvicorn)
+# core.dashboard_cache nie używa go do fragmentów paneli i ETagów API, a uprawnień (core.permissions)
+# nie trzyma w nim nigdy - potrzebny jest wspólny backend (plikowy, bazodanowy, redis, memcached).
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+WEB_CONCURRENCY = env.int('WEB_CONCURRENCY', default=1)
+
+DASHBOARD_CACHE_TIMEOUT = env.int('DASHBOARD_CACHE_TIMEOUT', default=600)
+
+# Liczba uczniów/nauczycieli na stronie list w panelu admina
+ADMIN_PAGE_SIZE = env.int('ADMIN_PAGE_SIZE', default=50)
+
+# Sposób liczenia średnich (core.averages): simple, weighted (wagi kategorii ocen) albo term
+# (średnia ze średnich ważonych obu semestrów; bieżące średnie w panelach są wtedy ważone)
+GRADE_AVERAGE_MODE = env.str('GRADE_AVERAGE_MODE', default='weighted')
+
+# core.middleware.RequestTimingMiddleware: nagłówek Server-Timing + log wolnych żądań (logger core.slow_requests,
+# jedna linia JSON na żądanie). Domyślnie na stderr; REQUEST_TIMING_SLOW_LOG=/var/log/dziennik/slow_requests.jsonl
+# zapisuje do pliku rotowanego po REQUEST_TIMING_SLOW_LOG_MAX_BYTES (trzyma REQUEST_TIMING_SLOW_LOG_BACKUPS starszych).
+REQUEST_TIMING_SAMPLE_RATE = env.float('REQUEST_TIMING_SAMPLE_RATE', default=1.0)
+REQUEST_TIMING_SLOW_MS = env.float('REQUEST_TIMING_SLOW_MS', default=500)
+REQUEST_TIMING_SLOW_LOG = env.str('REQUEST_TIMING_SLOW_LOG', default='')
+REQUEST_TIMING_SLOW_LOG_MAX_BYTES = env.int('REQUEST_TIMING_SLOW_LOG_MAX_BYTES', default=10 * 1024 * 1024)
+REQUEST_TIMING_SLOW_LOG_BACKUPS = env.int('REQUEST_TIMING_SLOW_LOG_BACKUPS', default=5)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': REQUEST_TIMING_SLOW_LOG,
+            'maxBytes': REQUEST_TIMING_SLOW_LOG_MAX_BYTES,
+            'backupCount': REQUEST_TIMING_SLOW_LOG_BACKUPS,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        } if REQUEST_TIMING_SLOW_LOG else {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'core.slow_requests': {'handlers': ['slow_requests'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -120,6 +199,21 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Ważność linku aktywacyjnego nowego konta (core.activation), w dniach
+ACCOUNT_ACTIVATION_DAYS = env.int('ACCOUNT_ACTIVATION_DAYS', default=7)
+
+# Koszt PBKDF2 (liczba iteracji); None = domyślna wartość Django. W testach np. PBKDF2_ITERATIONS=1000.
+# Niższa wartość w produkcji osłabia hasła - przy logowaniu hashe są przeliczane na bieżący koszt.
+PBKDF2_ITERATIONS = env.int('PBKDF2_ITERATIONS', default=None)
+
+PASSWORD_HASHERS = [
+    'core.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 AUTH_USER_MODEL = 'core.User'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard_router'
@@ -15,6 +15,14 @@ urlpatterns = [
     path('student/', views.student_panel, name='student_panel'),
     path('teacher/', views.teacher_panel, name='teacher_panel'),
     path('parent/', views.parent_panel, name='parent_panel'),
+    path('student/events/', views.student_events, name='student_events'),
+    path('parent/events/', views.parent_events, name='parent_events'),
+    path('student/stream/', views.student_stream, name='student_stream'),
+    path('parent/stream/', views.parent_stream, name='parent_stream'),
+    path('api/student/', views.api_student, name='api_student'),
+    path('api/parent/', views.api_parent, name='api_parent'),
+    path('api/teacher/', views.api_teacher, name='api_teacher'),
+    path('api/teacher/class/<int:class_id>/subject/<int:subject_id>/', views.api_class_grades, name='api_class_grades'),
     path('admin-panel/', views.admin_dashboard, name='admin_dashboard'),
     path('admin-panel/delete-class/<int:class_id>/', views.delete_class, name='delete_class'),
     path('admin-panel/edit-teacher/<int:teacher_id>/', views.edit_teacher, name='edit_teacher'),
@@ -24,7 +32,11 @@ urlpatterns = [
     path('admin-panel/delete-subject/<int:subject_id>/', views.delete_subject, name='delete_subject'),
     path('admin-panel/edit-family/<int:student_id>/', views.edit_student_family, name='edit_student_family'),
     path('teacher/class/<int:class_id>/subject/<int:subject_id>/', views.class_grades_detail, name='class_grades_detail'),
+    path('teacher/class/<int:class_id>/subject/<int:subject_id>/export/', views.export_class_grades, name='export_class_grades'),
+    path('admin-panel/import-families/', views.import_families, name='import_families'),
+    path('admin-panel/export-grades/', views.export_school_grades, name='export_school_grades'),
     path('change-password/', views.change_password, name='change_password'),
+    path('activate/<str:token>/', views.activate_account, name='activate_account'),
     path('assignment/<int:assignment_id>/delete/', views.remove_assignment, name='remove_assignment'),
 
 ]
\ No newline at end of file
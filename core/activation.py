@@ -0,0 +1,59 @@
+"""Aktywacja kont zakładanych przez sekretariat.
+
+Nowe konto dostaje nieużywalne hasło i losowy, jednorazowy token. W bazie
+trzymamy tylko jego SHA-256 - token ma 256 bitów entropii, więc (inaczej niż
+hasło) nie potrzebuje wolnego PBKDF2, a zakładanie setek kont nie kosztuje
+sekund CPU.
+
+Link aktywacyjny (GET) nikogo nie loguje - tylko pokazuje formularz hasła.
+Token sprawdzamy ponownie przy POST i zużywamy razem z zapisem hasła, więc
+link z historii przeglądarki czy logów poczty nie daje dostępu do konta.
+Link wygasa po ACCOUNT_ACTIVATION_DAYS dniach od wystawienia.
+"""
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.urls import reverse
+from django.utils import timezone
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue(user):
+    """Ustawia nieużywalne hasło i nowy token (bez zapisu do bazy). Zwraca token do wysłania."""
+    token = secrets.token_urlsafe(32)
+    user.password = make_password(None)
+    user.activation_token = hash_token(token)
+    user.activation_sent_at = timezone.now()
+    return token
+
+
+def user_for_token(token):
+    """Konto z tym tokenem, jeśli nie został zużyty i nie wygasł, inaczej None."""
+    from .models import User
+
+    valid_since = timezone.now() - timedelta(days=settings.ACCOUNT_ACTIVATION_DAYS)
+    return User.objects.filter(
+        activation_token=hash_token(token), activation_sent_at__gte=valid_since, is_active=True,
+    ).first()
+
+
+def activate(user, token):
+    """Zapisuje hasło ustawione już na user i zużywa token. False, gdy token zużyto w międzyczasie."""
+    from .models import User
+
+    # Warunek na token w samym UPDATE: z dwóch równoczesnych formularzy zapisze się tylko jeden.
+    activated = User.objects.filter(pk=user.pk, activation_token=hash_token(token)).update(
+        password=user.password, activation_token='', activation_sent_at=None,
+    )
+    user.activation_token, user.activation_sent_at = '', None
+    return bool(activated)
+
+
+def activation_url(request, token):
+    return request.build_absolute_uri(reverse('activate_account', args=[token]))
@@ -1,7 +1,87 @@
 from django.contrib import admin
-from .models import User, ClassGroup, Subject, Grade
+from django.db import transaction
+from .models import User, ClassGroup, Subject, Grade, GradeCategory, SchoolYear
+from . import dashboard_cache, grade_journal, grade_stats
 
 admin.site.register(User)
 admin.site.register(ClassGroup)
 admin.site.register(Subject)
-admin.site.register(Grade)
\ No newline at end of file
+
+
+def _grades_changed(*student_ids):
+    dashboard_cache.bump_grades(*student_ids)
+    dashboard_cache.bump_roster()  # statystyki klas w panelach nauczycieli
+
+
+@admin.register(Grade)
+class GradeAdmin(admin.ModelAdmin):
+    """Zapis i usuwanie przez te same funkcje co dziennik klasy: GradeStats, dziennik zmian i wersje cache paneli."""
+    list_display = ('student', 'subject', 'mark', 'category', 'weight', 'teacher', 'school_year', 'date_created')
+    list_select_related = ('student', 'subject', 'category', 'teacher', 'school_year')
+    list_filter = ('school_year', 'subject')
+    readonly_fields = ('school_year', 'term')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Inny uczeń albo przedmiot to inny klucz GradeStats - taką ocenę usuwa się i wystawia od nowa.
+        if obj is not None:
+            return (*self.readonly_fields, 'student', 'subject', 'teacher')
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        if 'category' in form.changed_data:
+            obj.set_category(obj.category)
+        with transaction.atomic():
+            if change:
+                old = Grade.objects.get(pk=obj.pk)  # obj ma już wartości z formularza
+                super().save_model(request, obj, form, change)
+                grade_stats.grade_changed(obj, old.score, old.weight)
+                grade_journal.grade_changed(obj, old.mark, old.weight, request.user)
+            else:
+                super().save_model(request, obj, form, change)
+                grade_stats.grade_added(obj)
+                grade_journal.grade_added(obj, request.user)
+            _grades_changed(obj.student_id)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            grade_journal.grade_removed(obj, request.user)
+            super().delete_model(request, obj)
+            grade_stats.grade_removed(obj)
+            _grades_changed(obj.student_id)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            pairs = grade_stats.affected_pairs(queryset)
+            student_ids = grade_journal.grades_removed(queryset, request.user)
+            super().delete_queryset(request, queryset)
+            grade_stats.refresh_pairs(pairs)
+            _grades_changed(*student_ids)
+
+
+@admin.register(GradeCategory)
+class GradeCategoryAdmin(admin.ModelAdmin):
+    list_display = ('name', 'weight')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        dashboard_cache.bump_categories()
+        if change and 'weight' in form.changed_data:
+            # Nowa waga dotyczy też ocen już wystawionych w tej kategorii.
+            pairs = grade_stats.category_weight_changed(obj)
+            if pairs:
+                dashboard_cache.bump_grades(*{student_id for student_id, *_ in pairs})
+                dashboard_cache.bump_roster()  # statystyki klas we wszystkich panelach nauczycieli
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        dashboard_cache.bump_categories()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        dashboard_cache.bump_categories()
+
+
+@admin.register(SchoolYear)
+class SchoolYearAdmin(admin.ModelAdmin):
+    list_display = ('name', 'start', 'second_term_start', 'end', 'archived_at')
+    readonly_fields = ('archived_at',)  # ustawia manage.py archive_school_year
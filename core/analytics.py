@@ -0,0 +1,145 @@
+"""Analityka szkoły liczona wsadowo (manage.py compute_analytics).
+
+Oceny są sumowane do tabeli GradeSnapshot w komórkach tydzień x klasa x
+przedmiot x nauczyciel. Wszystkie miary (liczba, suma Grade.score, liczba
+ocen 1-6) są addytywne, więc tryb przyrostowy dolicza tylko oceny wystawione
+po poprzednim przebiegu, a rankingi i trendy w panelu admina to krótkie
+zapytania grupujące po małej tabeli snapshotów zamiast po Grade.
+
+Tryb przyrostowy nie widzi zmian ani usunięć starszych ocen - nocne pełne
+przeliczenie je koryguje. Klasa oceny to bieżąca klasa ucznia.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from .models import AnalyticsRun, Grade, GradeSnapshot
+
+GRADE_VALUES = [value for value, _ in Grade.VALUE_CHOICES]
+MEASURES = ['count', 'sum'] + [f'value_{value}' for value in GRADE_VALUES]
+# Oceny młodsze niż to zostawiamy następnemu przebiegowi: date_created jest ustawiane
+# przed commitem, więc świeża transakcja mogłaby się pojawić "w przeszłości" po naszym odczycie.
+SETTLE_TIME = timedelta(minutes=1)
+TREND_WEEKS = 12
+
+
+def _cells(grades):
+    return (
+        grades.values(
+            'subject_id', 'teacher_id',
+            week=TruncWeek('date_created', output_field=DateField()),
+            class_group_id=F('student__class_group_id'),
+        )
+        .annotate(
+            count=Count('id'), sum=Sum('score'),
+            **{f'value_{value}': Count('id', filter=Q(value=value)) for value in GRADE_VALUES},
+        )
+        .order_by()
+    )
+
+
+def _key(row):
+    return row['week'], row['class_group_id'], row['subject_id'], row['teacher_id']
+
+
+def _merge(rows, batch_size):
+    """Dolicza komórki z nowych ocen do istniejących snapshotów (stała liczba zapytań na przebieg)."""
+    if not rows:
+        return
+    existing = {
+        (s.week, s.class_group_id, s.subject_id, s.teacher_id): s
+        for s in GradeSnapshot.objects.select_for_update().filter(
+            week__in={row['week'] for row in rows}, subject_id__in={row['subject_id'] for row in rows},
+        )
+    }
+    to_create, to_update = [], []
+    for row in rows:
+        snapshot = existing.get(_key(row))
+        if snapshot is None:
+            to_create.append(GradeSnapshot(**row))
+            continue
+        for measure in MEASURES:
+            setattr(snapshot, measure, getattr(snapshot, measure) + row[measure])
+        to_update.append(snapshot)
+    GradeSnapshot.objects.bulk_create(to_create, batch_size=batch_size)
+    GradeSnapshot.objects.bulk_update(to_update, MEASURES, batch_size=batch_size)
+
+
+@transaction.atomic
+def compute(incremental=False, batch_size=1000):
+    """Przelicza snapshoty (całość albo tylko nowe oceny) i zapisuje AnalyticsRun."""
+    until = timezone.now() - SETTLE_TIME
+    previous = AnalyticsRun.objects.order_by('-processed_until').first() if incremental else None
+    grades = Grade.objects.filter(date_created__lte=until)
+    if previous is not None:
+        grades = grades.filter(date_created__gt=previous.processed_until)
+    rows = list(_cells(grades))
+
+    if previous is None:
+        GradeSnapshot.objects.all().delete()
+        GradeSnapshot.objects.bulk_create([GradeSnapshot(**row) for row in rows], batch_size=batch_size)
+    else:
+        _merge(rows, batch_size)
+    return AnalyticsRun.objects.create(
+        mode='incremental' if previous is not None else 'full',
+        processed_until=until,
+        grades_processed=sum(row['count'] for row in rows),
+    )
+
+
+def _average(total, count):
+    return round(float(total) / count, 2) if count else 0
+
+
+def _ranking(fields, name):
+    rows = GradeSnapshot.objects.values(*fields).annotate(count=Sum('count'), total=Sum('sum')).order_by()
+    ranking = [{**row, 'name': name(row), 'average': _average(row['total'], row['count'])} for row in rows]
+    ranking.sort(key=lambda row: (-row['average'], -row['count']))
+    return ranking
+
+
+def _distribution():
+    totals = GradeSnapshot.objects.aggregate(**{f'value_{v}': Sum(f'value_{v}') for v in GRADE_VALUES})
+    all_grades = sum(value or 0 for value in totals.values())
+    return [
+        {'value': v, 'count': totals[f'value_{v}'] or 0,
+         'percent': round((totals[f'value_{v}'] or 0) * 100 / all_grades) if all_grades else 0}
+        for v in GRADE_VALUES
+    ]
+
+
+def _trend():
+    rows = list(
+        GradeSnapshot.objects.values('week').annotate(count=Sum('count'), total=Sum('sum')).order_by('-week')[:TREND_WEEKS]
+    )[::-1]
+    return [
+        {'week': row['week'], 'count': row['count'], 'average': _average(row['total'], row['count']),
+         'percent': round(_average(row['total'], row['count']) * 100 / GRADE_VALUES[-1])}
+        for row in rows
+    ]
+
+
+def dashboard_data():
+    """Dane zakładki Analityka: jedno zapytanie o ostatni przebieg, reszta z cache aż do kolejnego przebiegu."""
+    run = AnalyticsRun.objects.order_by('-id').first()
+    if run is None:
+        return None
+    key = f'analytics:dashboard:{run.id}'
+    data = cache.get(key)
+    if data is None:
+        data = {
+            'run': run,
+            'classes': _ranking(['class_group_id', 'class_group__name'], lambda row: row['class_group__name'] or 'bez klasy'),
+            'subjects': _ranking(['subject_id', 'subject__name'], lambda row: row['subject__name']),
+            'teachers': _ranking(['teacher_id', 'teacher__first_name', 'teacher__last_name'],
+                                 lambda row: f"{row['teacher__first_name']} {row['teacher__last_name']}"),
+            'distribution': _distribution(),
+            'trend': _trend(),
+        }
+        cache.set(key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+    return data
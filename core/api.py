@@ -0,0 +1,176 @@
+"""JSON tylko do odczytu dla aplikacji mobilnej: dane paneli ucznia, rodzica,
+nauczyciela i dziennika klasy.
+
+Odpowiedzi są zwarte: oceny to listy wartości w kolejności GRADE_FIELDS (same
+id zamiast zagnieżdżonych obiektów), a nazwy przedmiotów, nauczycieli,
+kategorii i klas są raz, w tablicach 'subjects' / 'teachers' / 'categories' /
+'class_groups' (id -> nazwa; nauczyciel: nazwa i e-mail do kontaktu).
+
+Silny ETag składamy z tych samych wersji z core.dashboard_cache co klucze
+fragmentów paneli - zapis oceny podbija wersję ucznia. Sprawdzenie
+If-None-Match to więc odczyt z cache, a odpowiedź 304 nie dotyka tabeli Grade.
+Gdy wersji nie ma (kilka procesów bez wspólnego cache, dashboard_cache.enabled),
+ETag liczymy z treści odpowiedzi - 304 dalej oszczędza transfer, ale nie bazę.
+
+Oceny i średnie dotyczą jednego roku szkolnego: bieżącego albo (uczeń, rodzic)
+wybranego parametrem ?year=<id>, także zarchiwizowanego.
+"""
+import hashlib
+
+from django.db.models import Count, Q
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from . import averages, school_years, services
+from .models import Grade, SubjectAssignment
+
+FORMAT_VERSION = 2  # zmiana układu odpowiedzi unieważnia ETagi zapisane przez klientów
+GRADE_FIELDS = ['id', 'student', 'subject', 'teacher', 'mark', 'category', 'weight', 'date_created', 'comment']
+_GRADE_COLUMNS = [
+    'id', 'student_id', 'subject_id', 'subject__name', 'teacher_id', 'teacher__first_name', 'teacher__last_name',
+    'teacher__email', 'value', 'modifier', 'category_id', 'category__name', 'weight', 'date_created', 'comment',
+]
+
+
+def etag(*parts):
+    """ETag z wersji danych albo None, gdy któraś wersja jest nieznana (cache paneli wyłączony)."""
+    if any(part is None for part in parts):
+        return None
+    digest = hashlib.sha256(':'.join(str(part) for part in (FORMAT_VERSION, *parts)).encode()).hexdigest()
+    return quote_etag(digest[:32])
+
+
+def not_modified(request, tag):
+    """Odpowiedź 304, gdy klient ma już tę wersję (If-None-Match), inaczej None."""
+    response = get_conditional_response(request, etag=tag) if tag is not None else None
+    if response is not None:
+        response['ETag'] = tag
+    return response
+
+
+def json_response(request, data, tag):
+    response = JsonResponse(data)
+    if tag is None:
+        tag = quote_etag(hashlib.sha256(response.content).hexdigest()[:32])
+        if unchanged := not_modified(request, tag):
+            return unchanged
+    response['ETag'] = tag
+    response['Cache-Control'] = 'private, no-cache'  # klient zawsze pyta, ale może dostać 304
+    return response
+
+
+def _grade_rows(grades):
+    return grades.values_list(*_GRADE_COLUMNS).order_by('date_created', 'id')
+
+
+def _pack(rows):
+    """Wiersze z _grade_rows -> (oceny wg GRADE_FIELDS, tablice nazw)."""
+    grades, subjects, teachers, categories = [], {}, {}, {}
+    for (pk, student_id, subject_id, subject_name, teacher_id, first_name, last_name, email,
+         value, modifier, category_id, category_name, weight, date_created, comment) in rows:
+        grades.append([pk, student_id, subject_id, teacher_id, f'{value}{modifier}', category_id, weight, date_created, comment])
+        subjects[subject_id] = subject_name
+        if teacher_id is not None:  # w archiwum nauczyciel mógł zostać usunięty
+            teachers[teacher_id] = {'name': f'{first_name} {last_name}', 'email': email}
+        if category_id is not None:
+            categories[category_id] = category_name
+    return grades, {'subjects': subjects, 'teachers': teachers, 'categories': categories}
+
+
+def _summary(summary):
+    return {
+        'count': summary['count'],
+        'average': summary['average'],
+        'averages': {subject['id']: subject['average'] for subject in summary['subjects']},
+    }
+
+
+def _student(student, summary):
+    return {'id': student.id, 'first_name': student.first_name, 'last_name': student.last_name,
+            'class_group': student.class_group_id, **_summary(summary)}
+
+
+def _with_summary_subjects(lookups, summaries):
+    # przedmioty ze średnią, ale bez ocen na liście (np. po usunięciu) też muszą mieć nazwę
+    for summary in summaries:
+        for subject in summary['subjects']:
+            lookups['subjects'].setdefault(subject['id'], subject['name'])
+    return lookups
+
+
+async def astudent_data(student, class_group, school_year):
+    grades, lookups = _pack([row async for row in _grade_rows(school_years.grades_of(school_year).filter(student=student))])
+    summary = await services.astudent_summary(student.id, school_year)
+    return {
+        'school_year': school_year.id,
+        'student': _student(student, summary),
+        'grade_fields': GRADE_FIELDS,
+        'grades': grades,
+        'class_groups': {class_group.id: class_group.name} if class_group else {},
+        **_with_summary_subjects(lookups, [summary]),
+    }
+
+
+async def aparent_data(children, school_year):
+    child_ids = [child.id for child in children]
+    grades, lookups = _pack([row async for row in _grade_rows(school_years.grades_of(school_year).filter(student_id__in=child_ids))])
+    summaries = await services.agrade_summary(child_ids, school_year)
+    return {
+        'school_year': school_year.id,
+        'children': [_student(child, summaries[child.id]) for child in children],
+        'grade_fields': GRADE_FIELDS,
+        'grades': grades,
+        'class_groups': {child.class_group_id: child.class_group.name for child in children if child.class_group_id},
+        **_with_summary_subjects(lookups, summaries.values()),
+    }
+
+
+async def ateacher_data(teacher_id, school_year):
+    assignments = (
+        SubjectAssignment.objects.filter(teacher_id=teacher_id)
+        .values('class_group_id', 'class_group__name', 'subject_id', 'subject__name')
+        .annotate(students=Count('class_group__user', filter=Q(class_group__user__role='student')))
+        .order_by('class_group__name', 'subject__name')
+    )
+    assignments = [row async for row in assignments]
+    overview = await services.ateacher_overview(teacher_id, school_year)
+    rows = []
+    for row in assignments:
+        stats = overview.get((row['class_group_id'], row['subject_id']))
+        rows.append({
+            'class_group': row['class_group_id'], 'subject': row['subject_id'], 'students': row['students'],
+            'count': stats['count'] if stats else 0,
+            'average': stats['average'] if stats else None,
+            'last_grade_at': stats['last_grade_at'] if stats else None,
+            'distribution': [item['count'] for item in stats['distribution']] if stats else [0] * len(services.GRADE_VALUES),
+        })
+    return {
+        'school_year': school_year.id,
+        'assignments': rows,
+        'distribution_values': services.GRADE_VALUES,
+        'subjects': {row['subject_id']: row['subject__name'] for row in assignments},
+        'class_groups': {row['class_group_id']: row['class_group__name'] for row in assignments},
+    }
+
+
+def gradebook_data(group, subject, students, school_year):
+    """Dziennik klasy z przedmiotu w bieżącym roku: uczniowie ze średnią (core.averages) i ich oceny."""
+    class_grades = Grade.objects.filter(subject=subject, school_year=school_year, student__class_group=group)
+    grades, lookups = _pack(_grade_rows(class_grades))
+    student_averages = averages.averages(class_grades)
+    return {
+        'school_year': school_year.id,
+        'class_group': group.id,
+        'subject': subject.id,
+        'students': [
+            {'id': student.id, 'first_name': student.first_name, 'last_name': student.last_name,
+             'average': student_averages.get((student.id, subject.id))}
+            for student in students
+        ],
+        'grade_fields': GRADE_FIELDS,
+        'grades': grades,
+        'class_groups': {group.id: group.name},
+        **lookups,
+        'subjects': {subject.id: subject.name},
+    }
@@ -0,0 +1,132 @@
+"""Średnie ocen: prosta, ważona i semestralna, liczone całymi kolumnami.
+
+Oceny czytamy jednym zapytaniem jako kolumny (uczeń, przedmiot, wynik, waga,
+semestr) - bez obiektów Grade - i grupujemy je naraz dla wszystkich par
+(uczeń, przedmiot). Z NumPy to kilka operacji na tablicach (np.unique +
+np.bincount), co dla całej szkoły trwa ułamek sekundy; bez NumPy ta sama
+arytmetyka idzie jedną pętlą po kolumnach.
+
+Tryby (settings.GRADE_AVERAGE_MODE albo argument mode):
+  simple   - średnia arytmetyczna wyników (4+ = 4.5, 4- = 3.75),
+  weighted - suma wynik x waga kategorii / suma wag,
+  term     - średnia ze średnich ważonych semestrów (każdy semestr liczy się
+             tak samo, niezależnie od liczby ocen). Semestr to Grade.term,
+             ustawiany przy zapisie z granic roku szkolnego (SchoolYear).
+"""
+from collections import defaultdict
+from itertools import repeat
+
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .models import Grade
+
+try:
+    import numpy as np
+except ImportError:  # NumPy jest opcjonalne - bez niego liczymy w czystym Pythonie
+    np = None
+
+MODES = ('simple', 'weighted', 'term')
+
+
+def get_mode(mode=None):
+    mode = mode or settings.GRADE_AVERAGE_MODE
+    if mode not in MODES:
+        raise ValueError(f"Nieznany tryb średniej: {mode} (dostępne: {', '.join(MODES)}).")
+    return mode
+
+
+def from_totals(count, total, weighted_total, weight_total, mode=None):
+    """Średnia z sum przechowywanych w GradeStats/zapytaniach grupujących.
+
+    Sumy nie dzielą ocen na semestry, więc tryb term liczy tu średnią ważoną
+    (bieżąca średnia w panelach); pełny tryb term daje compute().
+    """
+    if get_mode(mode) == 'simple':
+        return round(float(total) / count, 2) if count else 0
+    return round(float(weighted_total) / weight_total, 2) if weight_total else 0
+
+
+def grade_columns(grades, mode=None):
+    """Jedno zapytanie: kolumny (student_id, subject_id, score, weight, term) ocen z querysetu.
+
+    score czytamy jako float (bez tworzenia Decimal dla każdego wiersza), a semestr
+    tylko w trybie term.
+    """
+    fields = ['student_id', 'subject_id', Cast('score', FloatField()), 'weight']
+    if get_mode(mode) == 'term':
+        fields = fields + ['term']
+    columns = list(zip(*grades.values_list(*fields).order_by().iterator(chunk_size=5000))) or [(), (), (), ()]
+    return tuple(columns) if len(columns) == 5 else (*columns, None)
+
+
+def object_columns(grades, mode=None):
+    """Te same kolumny z już pobranych obiektów Grade (np. dziennik klasy)."""
+    with_terms = get_mode(mode) == 'term'
+    rows = [(g.student_id, g.subject_id, g.score, g.weight, g.term if with_terms else None) for g in grades]
+    columns = tuple(zip(*rows)) or ((), (), (), (), ())
+    return (*columns[:4], columns[4] if with_terms else None)
+
+
+def _numpy_averages(students, subjects, scores, weights, terms, mode):
+    students = np.asarray(students, dtype=np.int64)
+    subjects = np.asarray(subjects, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    weights = np.ones_like(scores) if mode == 'simple' else np.asarray(weights, dtype=np.float64)
+
+    # Para (uczeń, przedmiot) zakodowana jako jedna liczba - unique na 1D jest dużo szybsze niż na wierszach.
+    span = int(subjects.max()) + 1
+    pair = students * span + subjects
+    group = pair * 3 + np.asarray(terms, dtype=np.int64) if mode == 'term' else pair
+    keys, inverse = np.unique(group, return_inverse=True)
+    means = np.bincount(inverse, weights=scores * weights) / np.bincount(inverse, weights=weights)
+    if mode == 'term':
+        keys, inverse = np.unique(keys // 3, return_inverse=True)
+        means = np.bincount(inverse, weights=means) / np.bincount(inverse)
+
+    return {(int(key // span), int(key % span)): round(float(mean), 2) for key, mean in zip(keys.tolist(), means.tolist())}
+
+
+def _python_averages(students, subjects, scores, weights, terms, mode):
+    sums, totals = defaultdict(float), defaultdict(float)
+    for student, subject, score, weight, term in zip(students, subjects, scores, weights, terms or repeat(None)):
+        key = (student, subject, term) if mode == 'term' else (student, subject)
+        weight = 1 if mode == 'simple' else weight
+        sums[key] += float(score) * weight
+        totals[key] += weight
+    means = {key: sums[key] / totals[key] for key in sums}
+    if mode == 'term':
+        by_pair = defaultdict(list)
+        for (student, subject, _), mean in means.items():
+            by_pair[student, subject].append(mean)
+        means = {pair: sum(term_means) / len(term_means) for pair, term_means in by_pair.items()}
+    return {pair: round(mean, 2) for pair, mean in means.items()}
+
+
+def compute(columns, mode=None):
+    """{(student_id, subject_id): średnia} dla kolumn z grade_columns()/object_columns() (terms tylko w trybie term)."""
+    mode = get_mode(mode)
+    if not columns[0]:
+        return {}
+    if np is not None:
+        return _numpy_averages(*columns, mode)
+    return _python_averages(*columns, mode)
+
+
+def averages(grades, mode=None):
+    """Średnie dla querysetu ocen (klasa, przedmiot, cała szkoła) - jedno zapytanie."""
+    return compute(grade_columns(grades, mode), mode)
+
+
+def _in_year(grades, school_year):
+    return grades if school_year is None else grades.filter(school_year=school_year)
+
+
+def class_averages(class_id, mode=None, school_year=None):
+    """Bez school_year - wszystkie oceny w Grade (lata jeszcze niezarchiwizowane)."""
+    return averages(_in_year(Grade.objects.filter(student__class_group_id=class_id), school_year), mode)
+
+
+def school_averages(mode=None, school_year=None):
+    return averages(_in_year(Grade.objects.all(), school_year), mode)
@@ -0,0 +1,16 @@
+from django.core import checks
+
+from . import dashboard_cache
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Kilka procesów serwera z cache osobnym w każdym procesie: cache paneli i uprawnień jest wyłączony."""
+    if dashboard_cache.enabled():
+        return []
+    return [checks.Warning(
+        'WEB_CONCURRENCY > 1, a domyślny cache (locmem) nie jest wspólny dla procesów serwera - '
+        'fragmenty paneli i ETagi API liczone są przy każdym żądaniu.',
+        hint='Ustaw CACHE_URL na wspólny backend, np. filecache:///var/tmp/dziennik_cache albo dbcache://dziennik_cache.',
+        id='core.W001',
+    )]
@@ -0,0 +1,195 @@
+"""Cache wyrenderowanych fragmentów paneli (uczeń, rodzic, nauczyciel).
+
+Klucz fragmentu składa się z id użytkownika i numerów wersji danych, od
+których fragment zależy (oceny konkretnego ucznia, przypisania nauczyciela,
+skład klas). Zapis oceny podbija wersję ucznia, więc stare fragmenty po prostu
+przestają być trafiane i wygasają same - nie trzeba ich szukać ani kasować.
+
+Podbicie wersji widzą tylko procesy korzystające z tego samego cache. Locmem
+jest osobny w każdym procesie, więc przy kilku procesach serwera
+(WEB_CONCURRENCY > 1) bez wspólnego backendu (CACHE_URL) cache paneli jest
+wyłączony (enabled()): wersje to None, a fragmenty renderujemy za każdym razem.
+
+Funkcje z prefiksem "a" to odpowiedniki dla widoków async (cache.aget itd.).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+ROSTER = 'roster'
+ASSIGNMENTS = 'assignments'
+CATEGORIES = 'categories'
+
+_LOCAL_BACKENDS = {'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache'}
+
+
+def shared():
+    """Czy domyślny cache jest wspólny dla wszystkich procesów serwera (nie locmem ani dummy)."""
+    return settings.CACHES['default']['BACKEND'] not in _LOCAL_BACKENDS
+
+
+def enabled():
+    """Czy wersje i fragmenty trzymamy w cache: wspólny backend albo jeden proces serwera."""
+    return shared() or settings.WEB_CONCURRENCY <= 1
+
+
+def _version_key(scope, obj_id=None):
+    return f'dashboard:version:{scope}' if obj_id is None else f'dashboard:version:{scope}:{obj_id}'
+
+
+def _fresh_version():
+    # Wersja startowa zależna od czasu: po wyrzuceniu klucza z cache nie wrócimy do starej wartości.
+    return time.time_ns()
+
+
+def versions(scope, ids):
+    if not enabled():
+        return [None] * len(ids)
+    keys = {_version_key(scope, obj_id): obj_id for obj_id in ids}
+    found = cache.get_many(list(keys))
+    missing = {key: _fresh_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+async def aversions(scope, ids):
+    if not enabled():
+        return [None] * len(ids)
+    keys = {_version_key(scope, obj_id): obj_id for obj_id in ids}
+    found = await cache.aget_many(list(keys))
+    missing = {key: _fresh_version() for key in keys if key not in found}
+    if missing:
+        await cache.aset_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def version(scope, obj_id=None):
+    if not enabled():
+        return None
+    key = _version_key(scope, obj_id)
+    value = cache.get(key)
+    if value is None:
+        value = _fresh_version()
+        cache.set(key, value, None)
+    return value
+
+
+async def aversion(scope, obj_id=None):
+    if not enabled():
+        return None
+    key = _version_key(scope, obj_id)
+    value = await cache.aget(key)
+    if value is None:
+        value = _fresh_version()
+        await cache.aset(key, value, None)
+    return value
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def bump(scope, *ids):
+    """Podbija wersje po zatwierdzeniu transakcji (żeby nie zapisać w cache danych sprzed commitu)."""
+    if not enabled():
+        return
+    keys = [_version_key(scope, obj_id) for obj_id in ids] if ids else [_version_key(scope)]
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def bump_grades(*student_ids):
+    bump('grades', *student_ids)
+
+
+def bump_teachers(*teacher_ids):
+    bump('teacher', *teacher_ids)
+
+
+def bump_assignments(*teacher_ids):
+    """Zmiana przypisań: panel nauczyciela i jego uprawnienia (core.permissions)."""
+    bump('teacher', *teacher_ids)
+    bump(ASSIGNMENTS, *teacher_ids)
+
+
+def bump_roster():
+    bump(ROSTER)
+
+
+def bump_categories():
+    """Zmiana kategorii ocen (nazwy w odpowiedziach core.api)."""
+    bump(CATEGORIES)
+
+
+def _count(kind):
+    key = f'dashboard:stats:{kind}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+async def _acount(kind):
+    key = f'dashboard:stats:{kind}'
+    if not await cache.aadd(key, 1, None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, None)
+
+
+def _fragment_key(name, key_parts):
+    return 'dashboard:fragment:{}:{}'.format(name, ':'.join(str(part) for part in key_parts))
+
+
+def render_fragment(name, key_parts, template_name, context_fn, request=None):
+    """Zwraca HTML fragmentu z cache albo renderuje go (context_fn wołane tylko przy chybieniu)."""
+    if not enabled():
+        return mark_safe(render_to_string(template_name, context_fn(), request=request))
+    key = _fragment_key(name, key_parts)
+    html = cache.get(key)
+    if html is None:
+        _count('misses')
+        html = render_to_string(template_name, context_fn(), request=request)
+        cache.set(key, html, settings.DASHBOARD_CACHE_TIMEOUT)
+    else:
+        _count('hits')
+    return mark_safe(html)
+
+
+async def arender_fragment(name, key_parts, template_name, context_fn, request=None):
+    """Jak render_fragment, ale context_fn jest korutyną, która zwraca gotowe listy (bez leniwych QuerySetów)."""
+    if not enabled():
+        return mark_safe(render_to_string(template_name, await context_fn(), request=request))
+    key = _fragment_key(name, key_parts)
+    html = await cache.aget(key)
+    if html is None:
+        await _acount('misses')
+        html = render_to_string(template_name, await context_fn(), request=request)
+        await cache.aset(key, html, settings.DASHBOARD_CACHE_TIMEOUT)
+    else:
+        await _acount('hits')
+    return mark_safe(html)
+
+
+def stats():
+    values = cache.get_many(['dashboard:stats:hits', 'dashboard:stats:misses'])
+    return {
+        'hits': values.get('dashboard:stats:hits', 0),
+        'misses': values.get('dashboard:stats:misses', 0),
+    }
+
+
+def reset_stats():
+    cache.delete_many(['dashboard:stats:hits', 'dashboard:stats:misses'])
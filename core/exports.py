@@ -0,0 +1,115 @@
+"""Eksport ocen do CSV strumieniowany wiersz po wierszu.
+
+Oceny czytamy przez .values_list() paczkami po CHUNK_SIZE (bez budowania
+obiektów modeli, na PostgreSQL kursorem po stronie serwera), a każda paczka od
+razu trafia do StreamingHttpResponse - pamięć jest stała niezależnie od liczby
+ocen, a przeglądarka dostaje pierwsze bajty zanim baza skończy czytać tabelę.
+
+Pod ASGI treść odpowiedzi musi być iteratorem async (.aiterator()) - zwykły
+generator Django pod ASGI czyta przez sync_to_async(list), czyli cały naraz.
+Pod WSGI zostaje generator synchroniczny (.iterator()).
+
+Eksport całej szkoły obejmuje też lata zarchiwizowane: najpierw wiersze
+GradeArchive, potem Grade - dwa kolejne zapytania w jednym strumieniu, kolumna
+"Rok szkolny" mówi, z którego roku jest ocena.
+
+Tekst zaczynający się od =, +, -, @ (albo tabulatora / CR) Excel traktuje jak
+formułę, więc taką komórkę poprzedzamy apostrofem.
+"""
+import csv
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from .models import Grade, GradeArchive
+
+HEADER = ['Klasa', 'Przedmiot', 'Nazwisko', 'Imię', 'E-mail ucznia', 'Ocena', 'Kategoria', 'Waga', 'Komentarz',
+          'Nauczyciel', 'Rok szkolny', 'Data']
+FIELDS = [
+    'student__class_group__name', 'subject__name', 'student__last_name', 'student__first_name',
+    'student__email', 'value', 'modifier', 'category__name', 'weight', 'comment', 'teacher__last_name', 'school_year__name',
+    'date_created',
+]
+CHUNK_SIZE = 2000
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class _Echo:
+    """Pseudo-plik dla csv.writer: write() zwraca tekst zamiast go buforować."""
+
+    def write(self, value):
+        return value
+
+
+def escape_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def format_row(row, tz):
+    # value + modifier -> jedna kolumna "4+"
+    cells = [*row[:5], f'{row[5]}{row[6]}', *row[7:-1]]
+    return [escape_cell(cell) for cell in cells] + [row[-1].astimezone(tz).strftime('%Y-%m-%d %H:%M')]
+
+
+def _header(writer):
+    return '\ufeff' + writer.writerow(HEADER)  # BOM - Excel inaczej czyta plik jako cp1250
+
+
+def _querysets(grades):
+    return grades if isinstance(grades, (list, tuple)) else [grades]
+
+
+def _stream(grades):
+    tz = timezone.get_current_timezone()
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield _header(writer)
+    # Wiersze sklejamy w paczki: osobny chunk na każdy wiersz to osobny zapis do gniazda.
+    chunk = []
+    for queryset in _querysets(grades):
+        for row in queryset.values_list(*FIELDS).iterator(chunk_size=CHUNK_SIZE):
+            chunk.append(writer.writerow(format_row(row, tz)))
+            if len(chunk) >= CHUNK_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+async def _astream(grades):
+    tz = timezone.get_current_timezone()
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield _header(writer)
+    chunk = []
+    # .values(), bo values_list().aiterator() wykonuje zapytanie synchronicznie (SynchronousOnlyOperation).
+    for queryset in _querysets(grades):
+        async for values in queryset.values(*FIELDS).aiterator(chunk_size=CHUNK_SIZE):
+            chunk.append(writer.writerow(format_row([values[field] for field in FIELDS], tz)))
+            if len(chunk) >= CHUNK_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def csv_response(request, grades, filename):
+    stream = _astream(grades) if isinstance(request, ASGIRequest) else _stream(grades)
+    response = StreamingHttpResponse(stream, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def class_grades(group, subject):
+    return Grade.objects.filter(subject=subject, student__class_group=group).order_by(
+        'student__last_name', 'student__first_name', 'student_id', 'date_created', 'id'
+    )
+
+
+def school_grades():
+    # Kolejność zgodna z gradearchive_student_year_idx i grade_student_year_date_idx - baza nie musi
+    # sortować całej tabeli przed pierwszym wierszem. Archiwum pierwsze: to starsze lata.
+    order = ('student_id', 'school_year_id', 'date_created', 'id')
+    return [GradeArchive.objects.order_by(*order), Grade.objects.order_by(*order)]
@@ -0,0 +1,173 @@
+"""Hurtowy import uczniów z rodzicami z pliku CSV (początek roku szkolnego).
+
+Plik ma nagłówek z kolumnami COLUMNS (separator ";" albo ","). Każdy wiersz
+przechodzi przez FamilyImportRowForm, klasy rozwiązujemy z mapy nazw
+wczytanej raz, a poprawne wiersze trafiają do bazy paczkami - jedna transakcja
+i dwa bulk_create na paczkę. Błędne wiersze nie przerywają importu, tylko
+trafiają do raportu z numerem linii. Cały plik czytamy i dekodujemy przed
+pierwszą paczką - błąd kodowania w dalszej części pliku (UnicodeDecodeError)
+przerywa import, zanim powstanie jakiekolwiek konto.
+
+Rodzeństwo: ten sam e-mail rodzica w kilku wierszach (albo istniejące już
+konto rodzica) oznacza jednego rodzica z kilkorgiem dzieci.
+
+Nowe konta nie mają hasła - dostają tokeny aktywacyjne (core.activation),
+zwracane w ImportResult.activations do rozesłania rodzinom.
+"""
+import csv
+
+from django.db import IntegrityError, transaction
+
+from . import activation, dashboard_cache
+from .forms import FamilyImportRowForm
+from .models import ClassGroup, User
+
+COLUMNS = {
+    'imie_ucznia': 'student_first_name',
+    'nazwisko_ucznia': 'student_last_name',
+    'email_ucznia': 'student_email',
+    'klasa': 'class_group',
+    'imie_rodzica': 'parent_first_name',
+    'nazwisko_rodzica': 'parent_last_name',
+    'email_rodzica': 'parent_email',
+}
+
+
+class FamilyImportError(Exception):
+    """Plik nie nadaje się do importu (brak nagłówka albo kolumn)."""
+
+
+class ImportResult:
+    def __init__(self):
+        self.students = 0
+        self.parents = 0
+        self.errors = []  # (numer linii, [komunikaty])
+        self.activations = []  # (e-mail, rola, token)
+
+    def add_error(self, line, *messages):
+        self.errors.append((line, list(messages)))
+
+
+def _form_errors(form):
+    labels = {name: field.label for name, field in form.fields.items()}
+    return [
+        f"{labels.get(name, name)}: {message}" if name != '__all__' else message
+        for name, messages in form.errors.items() for message in messages
+    ]
+
+
+def read_rows(lines):
+    """Zwraca (numer linii, dane dla FamilyImportRowForm) dla każdego niepustego wiersza."""
+    lines = iter(lines)
+    header_line = next(lines, '')
+    reader = csv.reader([header_line], delimiter=';' if ';' in header_line else ',')
+    header = [column.strip().lower() for column in next(reader, [])]
+    missing = [column for column in COLUMNS if column not in header]
+    if missing:
+        raise FamilyImportError(f"Brak kolumn: {', '.join(missing)}. Wymagany nagłówek: {';'.join(COLUMNS)}")
+    positions = [(header.index(column), field) for column, field in COLUMNS.items()]
+
+    rows = csv.reader(lines, delimiter=reader.dialect.delimiter)
+    for line, row in enumerate(rows, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        yield line, {field: row[i].strip() if i < len(row) else '' for i, field in positions}
+
+
+class FamilyImporter:
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.result = ImportResult()
+        self.class_ids = {name.upper(): pk for pk, name in ClassGroup.objects.values_list('id', 'name')}
+        self.student_emails = set()
+        self.parent_ids = {}  # e-mail rodzica -> id (utworzony w tym imporcie albo istniejący)
+
+    def run(self, lines):
+        rows = list(read_rows(lines))  # najpierw cały plik: UnicodeDecodeError przed zapisem czegokolwiek
+        batch = []
+        for line, data in rows:
+            form = FamilyImportRowForm(data, class_ids=self.class_ids)
+            if not form.is_valid():
+                self.result.add_error(line, *_form_errors(form))
+                continue
+            batch.append((line, form.cleaned_data))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        self._flush(batch)
+        self.result.errors.sort()
+        if self.result.students:
+            dashboard_cache.bump_roster()
+        return self.result
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        emails = {row[key] for _, row in batch for key in ('student_email', 'parent_email')}
+        existing = {
+            email: (pk, role)
+            for email, pk, role in User.objects.filter(email__in=emails).values_list('email', 'id', 'role')
+        }
+
+        accepted, new_parents = [], {}
+        for line, row in batch:
+            student_email, parent_email = row['student_email'], row['parent_email']
+            if student_email in existing or student_email in self.student_emails:
+                self.result.add_error(line, f"Konto {student_email} już istnieje.")
+                continue
+            if student_email in self.parent_ids or student_email in new_parents:
+                self.result.add_error(line, f"{student_email} jest już adresem rodzica.")
+                continue
+            if parent_email in self.student_emails:
+                self.result.add_error(line, f"{parent_email} jest już adresem ucznia.")
+                continue
+            if parent_email in existing and parent_email not in self.parent_ids:
+                pk, role = existing[parent_email]
+                if role != 'parent':
+                    self.result.add_error(line, f"Konto {parent_email} istnieje i nie jest kontem rodzica.")
+                    continue
+                self.parent_ids[parent_email] = pk
+            if parent_email not in self.parent_ids and parent_email not in new_parents:
+                new_parents[parent_email] = User(
+                    email=parent_email, username=parent_email, role='parent',
+                    first_name=row['parent_first_name'], last_name=row['parent_last_name'],
+                )
+            self.student_emails.add(student_email)
+            accepted.append((line, row))
+
+        try:
+            with transaction.atomic():
+                parents = list(new_parents.values())
+                tokens = []
+                for parent in parents:
+                    parent.search_name = parent.build_search_name()
+                    tokens.append((parent.email, 'parent', activation.issue(parent)))
+                User.objects.bulk_create(parents)
+                parent_ids = {**self.parent_ids, **{parent.email: parent.pk for parent in parents}}
+                students = []
+                for _, row in accepted:
+                    student = User(
+                        email=row['student_email'], username=row['student_email'], role='student',
+                        class_group_id=row['class_group'],
+                        parent_id=parent_ids[row['parent_email']],
+                        first_name=row['student_first_name'], last_name=row['student_last_name'],
+                    )
+                    student.search_name = student.build_search_name()
+                    tokens.append((student.email, 'student', activation.issue(student)))
+                    students.append(student)
+                User.objects.bulk_create(students)
+        except IntegrityError as e:
+            # np. konto dodane równolegle z panelu - cała paczka wraca do raportu
+            for line, row in accepted:
+                self.student_emails.discard(row['student_email'])
+                self.result.add_error(line, f"Błąd bazy danych: {e}")
+            return
+
+        self.parent_ids = parent_ids
+        self.result.parents += len(parents)
+        self.result.students += len(students)
+        self.result.activations.extend(tokens)
+
+
+def import_families(lines, batch_size=500):
+    return FamilyImporter(batch_size).run(lines)
@@ -1,6 +1,7 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from .models import User, ClassGroup, Subject
+from .models import User, ClassGroup, Subject, Grade, GradeCategory
+import copy
 import re
 
 
@@ -123,4 +124,93 @@ class AssignTeacherForm(forms.Form):
         queryset=ClassGroup.objects.all(),
         label="Klasa",
         widget=forms.Select(attrs={'class': 'form-control'})
-    )
\ No newline at end of file
+    )
+
+class GradeForm(forms.Form):
+    """Pojedyncza ocena w dzienniku; value to stopień z plusem/minusem, po walidacji (4, '+')."""
+    value = forms.TypedChoiceField(
+        choices=Grade.MARK_CHOICES,
+        coerce=Grade.parse_mark,
+        label="Stopień",
+        widget=forms.Select(attrs={'class': 'form-select border-2'})
+    )
+    category = forms.ModelChoiceField(
+        queryset=GradeCategory.objects.all(), required=False,
+        label="Kategoria",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    comment = forms.CharField(
+        max_length=255, required=False,
+        label="Komentarz",
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+
+class GradeEntryForm(GradeForm):
+    """Wiersz formularza ocen dla całej klasy (kategoria jest wspólna - BulkGradeForm)."""
+    student_id = forms.IntegerField(widget=forms.HiddenInput)
+    value = forms.TypedChoiceField(
+        choices=[('', '—')] + Grade.MARK_CHOICES,
+        coerce=Grade.parse_mark, empty_value=None, required=False,
+        label="Stopień",
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
+    )
+    category = None
+    comment = forms.CharField(
+        max_length=255, required=False,
+        label="Komentarz",
+        widget=forms.TextInput(attrs={'class': 'form-control form-control-sm'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('comment') and cleaned_data.get('value') is None:
+            raise ValidationError("Komentarz bez oceny - wybierz stopień albo usuń komentarz.")
+        return cleaned_data
+
+class BaseGradeEntryFormSet(forms.BaseFormSet):
+    def clean(self):
+        if any(self.errors):
+            return
+        if not any(form.cleaned_data.get('value') is not None for form in self.forms):
+            raise ValidationError("Nie wpisano żadnej oceny.")
+
+GradeEntryFormSet = forms.formset_factory(GradeEntryForm, formset=BaseGradeEntryFormSet, extra=0)
+
+class BulkGradeForm(forms.Form):
+    category = forms.ModelChoiceField(
+        queryset=GradeCategory.objects.all(), required=False,
+        label="Kategoria",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+
+class FamilyImportRowForm(forms.Form):
+    """Jeden wiersz importu rodzin z CSV: te same pola i walidatory co StudentBasicForm
+    i ParentBasicForm, ale bez zapytań do bazy - klasę rozwiązujemy z mapy nazw,
+    a unikalność e-maili sprawdza import hurtowo dla całej paczki wierszy."""
+
+    def __init__(self, *args, class_ids, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.class_ids = class_ids
+        for name in ('first_name', 'last_name', 'email'):
+            self.fields[f'student_{name}'] = copy.deepcopy(StudentBasicForm.base_fields[name])
+            self.fields[f'parent_{name}'] = copy.deepcopy(ParentBasicForm.base_fields[name])
+        self.fields['class_group'] = forms.CharField(label="Klasa ucznia")
+
+    def clean_class_group(self):
+        name = self.cleaned_data['class_group'].upper().strip()
+        if name not in self.class_ids:
+            raise ValidationError(f"Nie ma klasy {name}.")
+        return self.class_ids[name]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('student_email') and cleaned_data.get('student_email') == cleaned_data.get('parent_email'):
+            raise ValidationError("Uczeń i rodzic muszą mieć różne adresy e-mail.")
+        return cleaned_data
+
+class FamilyImportForm(forms.Form):
+    file = forms.FileField(
+        label="Plik CSV",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'})
+    )
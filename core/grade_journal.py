@@ -0,0 +1,149 @@
+"""Dziennik zmian ocen (GradeEvent): dodania, zmiany i usunięcia, tylko dopisywane.
+
+Widoki zapisują zdarzenie w tej samej transakcji co zmianę oceny, obok
+core.grade_stats. Numerem kolejnym jest id zdarzenia, więc "co się zmieniło
+od kursora" to zakres po indeksie (student, id) - panele ucznia i rodzica
+dociągają tylko nowe zdarzenia zamiast przeładowywać wszystkie oceny.
+
+Id nadawane jest przy INSERT, a widoczne dopiero po commicie, więc zdarzenie
+o mniejszym id może pojawić się później niż większe. Kursor przesuwamy więc
+tylko za zdarzenia starsze niż SETTLE_TIME; młodsze wracają w kolejnym
+odpytaniu (klient pomija powtórki po id).
+
+Po commicie id nowych zdarzeń trafiają do core.notifications (strumienie SSE
+otwartych paneli).
+
+Przepisania wag po zmianie kategorii (grade_stats.category_weight_changed)
+nie zapisujemy - to zmiana konfiguracji, nie oceny. Stare zdarzenia archiwizuje
+i usuwa archive() (manage.py archive_grade_events), np. po roku szkolnym.
+"""
+import json
+from datetime import timedelta
+from functools import partial
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import notifications
+from .models import GradeEvent
+
+SETTLE_TIME = timedelta(seconds=2)
+PAGE_SIZE = 200
+FIELDS = ['id', 'action', 'grade_id', 'student_id', 'subject_id', 'subject__name',
+          'old_mark', 'new_mark', 'old_weight', 'new_weight', 'comment', 'created_at']
+
+
+def _event(grade, action, actor, **values):
+    return GradeEvent(student_id=grade.student_id, subject_id=grade.subject_id, grade_id=grade.pk,
+                      action=action, actor=actor, **values)
+
+
+def _publish(latest):
+    for student_id, event_id in latest.items():
+        notifications.publish(student_id, event_id)
+
+
+def _append(events, batch_size=None):
+    """Zapis zdarzeń i powiadomienie strumieni po commicie (ostatnie id na ucznia wystarcza)."""
+    GradeEvent.objects.bulk_create(events, batch_size=batch_size)
+    latest = {}
+    for event in events:
+        latest[event.student_id] = max(event.id, latest.get(event.student_id, 0))
+    if latest:
+        transaction.on_commit(partial(_publish, latest))
+
+
+def grades_added(grades, actor):
+    _append([
+        _event(grade, 'created', actor, new_mark=grade.mark, new_weight=grade.weight, comment=grade.comment)
+        for grade in grades
+    ])
+
+
+def grade_added(grade, actor):
+    grades_added([grade], actor)
+
+
+def grade_changed(grade, old_mark, old_weight, actor):
+    _append([_event(grade, 'changed', actor, old_mark=old_mark, new_mark=grade.mark,
+                    old_weight=old_weight, new_weight=grade.weight, comment=grade.comment)])
+
+
+def grade_removed(grade, actor):
+    """Wywołać przed grade.delete() - po usunięciu obiekt nie ma już id."""
+    _append([_event(grade, 'deleted', actor, old_mark=grade.mark, old_weight=grade.weight)])
+
+
+def grades_removed(grades, actor, batch_size=1000):
+    """Zdarzenia usunięcia dla querysetu ocen, np. przed kaskadą przy usuwaniu nauczyciela.
+
+    Zwraca zbiór id uczniów, których dotyczą usunięte oceny.
+    """
+    rows = grades.values_list('id', 'student_id', 'subject_id', 'value', 'modifier', 'weight').order_by('id')
+    events = [
+        GradeEvent(grade_id=pk, student_id=student_id, subject_id=subject_id, action='deleted', actor=actor,
+                   old_mark=f'{value}{modifier}', old_weight=weight)
+        for pk, student_id, subject_id, value, modifier, weight in rows.iterator(chunk_size=batch_size)
+    ]
+    _append(events, batch_size)
+    return {event.student_id for event in events}
+
+
+def _events(student_ids, cursor):
+    return (
+        GradeEvent.objects.filter(student_id__in=student_ids, id__gt=cursor)
+        .order_by('id').values(*FIELDS)[:PAGE_SIZE + 1]
+    )
+
+
+def _page(events, cursor):
+    has_more = len(events) > PAGE_SIZE
+    events = events[:PAGE_SIZE]
+    settled = timezone.now() - SETTLE_TIME
+    for event in events:
+        if event['created_at'] > settled:
+            break
+        cursor = event['id']
+    return {'events': events, 'cursor': cursor, 'has_more': has_more}
+
+
+def events_since(student_ids, cursor=0):
+    """{'events': [...], 'cursor': następny kursor, 'has_more': bool} - zdarzenia uczniów po kursorze."""
+    return _page(list(_events(student_ids, cursor)), cursor)
+
+
+async def aevents_since(student_ids, cursor=0):
+    return _page([event async for event in _events(student_ids, cursor)], cursor)
+
+
+def latest_cursor(student_ids):
+    """Kursor "stan na teraz" - zapisywany we fragmencie panelu przed odczytem ocen."""
+    return GradeEvent.objects.filter(student_id__in=student_ids).aggregate(cursor=Max('id'))['cursor'] or 0
+
+
+async def alatest_cursor(student_ids):
+    return (await GradeEvent.objects.filter(student_id__in=student_ids).aaggregate(cursor=Max('id')))['cursor'] or 0
+
+
+def archive(before, out=None, batch_size=10000):
+    """Usuwa zdarzenia starsze niż `before`, opcjonalnie zapisując je wcześniej do `out` (JSON lines).
+
+    Id rośnie razem z czasem, więc datę zamieniamy raz na zakres id, a usuwamy
+    zakresami klucza głównego w paczkach (krótkie transakcje).
+    """
+    bounds = GradeEvent.objects.filter(created_at__lt=before).aggregate(first=Min('id'), last=Max('id'))
+    if bounds['last'] is None:
+        return 0
+    archived, start, boundary = 0, bounds['first'] - 1, bounds['last']
+    while start < boundary:
+        end = min(start + batch_size, boundary)
+        with transaction.atomic():
+            batch = GradeEvent.objects.filter(id__gt=start, id__lte=end)
+            if out is not None:
+                for event in batch.order_by('id').values(*FIELDS, 'actor_id').iterator(chunk_size=batch_size):
+                    out.write(json.dumps(event, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+            archived += batch.delete()[0]
+        start = end
+    return archived
@@ -0,0 +1,164 @@
+"""Przyrostowe utrzymanie tabeli GradeStats.
+
+Widoki wywołują te funkcje w tej samej transakcji, w której zapisują oceny,
+dzięki czemu panele ucznia i rodzica czytają jeden wiersz na przedmiot
+zamiast wszystkich ocen. Sumy liczone są z Grade.score (stopień z plusem/minusem),
+a weighted_sum/weight_total z wagami kategorii - patrz core.averages.from_totals.
+
+Statystyki są osobne dla każdego roku szkolnego: kluczem jest trójka
+(uczeń, przedmiot, rok), a panele czytają tylko wiersze bieżącego roku.
+Archiwizacja roku (core.school_years) usuwa jego statystyki razem z ocenami.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Sum
+
+from .models import Grade, GradeStats
+
+FIELDS = ['count', 'sum', 'weighted_sum', 'weight_total', 'last_grade_at']
+TOTALS = {
+    'count': Count('id'),
+    'sum': Sum('score'),
+    'weighted_sum': Sum(F('score') * F('weight'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+    'weight_total': Sum('weight'),
+    'last_grade_at': Max('date_created'),
+}
+
+
+KEY = ['student_id', 'subject_id', 'school_year_id']
+
+
+def _key(stats):
+    return stats.student_id, stats.subject_id, stats.school_year_id
+
+
+def _existing(keys):
+    return {
+        _key(stats): stats
+        for stats in GradeStats.objects.select_for_update().filter(
+            student_id__in={key[0] for key in keys},
+            subject_id__in={key[1] for key in keys},
+            school_year_id__in={key[2] for key in keys},
+        )
+    }
+
+
+def _totals(grades):
+    totals = defaultdict(lambda: {'count': 0, 'sum': 0, 'weighted_sum': 0, 'weight_total': 0, 'last': None})
+    for grade in grades:
+        item = totals[_key(grade)]
+        item['count'] += 1
+        item['sum'] += grade.score
+        item['weighted_sum'] += grade.score * grade.weight
+        item['weight_total'] += grade.weight
+        if item['last'] is None or grade.date_created > item['last']:
+            item['last'] = grade.date_created
+    return totals
+
+
+@transaction.atomic
+def grades_added(grades):
+    """Dolicza nowe oceny (jedną lub wiele) do statystyk stałą liczbą zapytań."""
+    totals = _totals(grades)
+    if not totals:
+        return
+    existing = _existing(totals)
+    to_create, to_update = [], []
+    for key, item in totals.items():
+        stats = existing.get(key)
+        if stats is None:
+            stats = GradeStats(**dict(zip(KEY, key)))
+            to_create.append(stats)
+        else:
+            to_update.append(stats)
+        stats.count += item['count']
+        stats.sum += item['sum']
+        stats.weighted_sum += item['weighted_sum']
+        stats.weight_total += item['weight_total']
+        if stats.last_grade_at is None or item['last'] > stats.last_grade_at:
+            stats.last_grade_at = item['last']
+    GradeStats.objects.bulk_create(to_create)
+    GradeStats.objects.bulk_update(to_update, FIELDS)
+
+
+def grade_added(grade):
+    grades_added([grade])
+
+
+def grade_changed(grade, old_score, old_weight):
+    if (grade.score, grade.weight) != (old_score, old_weight):
+        GradeStats.objects.filter(**dict(zip(KEY, _key(grade)))).update(
+            sum=F('sum') + grade.score - old_score,
+            weighted_sum=F('weighted_sum') + grade.score * grade.weight - old_score * old_weight,
+            weight_total=F('weight_total') + grade.weight - old_weight,
+        )
+
+
+def grade_removed(grade):
+    refresh_pairs([_key(grade)])
+
+
+def affected_pairs(grades):
+    """Klucze (uczeń, przedmiot, rok) dotknięte przez queryset ocen - do odświeżenia po kaskadowym usunięciu."""
+    return set(grades.values_list(*KEY).distinct())
+
+
+@transaction.atomic
+def refresh_pairs(keys):
+    """Przelicza od nowa statystyki wskazanych kluczy (uczeń, przedmiot, rok) stałą liczbą zapytań."""
+    keys = set(keys)
+    if not keys:
+        return
+    fresh = {
+        tuple(row[field] for field in KEY): row
+        for row in Grade.objects.filter(
+            student_id__in={key[0] for key in keys},
+            subject_id__in={key[1] for key in keys},
+            school_year_id__in={key[2] for key in keys},
+        )
+        .values(*KEY)
+        .annotate(**TOTALS)
+        .order_by()
+    }
+    existing = _existing(keys)
+    to_create, to_update, to_delete = [], [], []
+    for key in keys:
+        row, stats = fresh.get(key), existing.get(key)
+        if row is None:
+            if stats is not None:
+                to_delete.append(stats.pk)
+            continue
+        if stats is None:
+            stats = GradeStats(**dict(zip(KEY, key)))
+            to_create.append(stats)
+        else:
+            to_update.append(stats)
+        for field in FIELDS:
+            setattr(stats, field, row[field])
+    GradeStats.objects.filter(pk__in=to_delete).delete()
+    GradeStats.objects.bulk_create(to_create)
+    GradeStats.objects.bulk_update(to_update, FIELDS)
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    """Odbudowuje całą tabelę jednym zapytaniem grupującym. Zwraca liczbę wierszy."""
+    GradeStats.objects.all().delete()
+    rows = Grade.objects.values(*KEY).annotate(**TOTALS).order_by()
+    objs = [GradeStats(**row) for row in rows]
+    GradeStats.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
+
+
+@transaction.atomic
+def category_weight_changed(category):
+    """Przepisuje nową wagę kategorii na jej oceny i przelicza dotknięte statystyki.
+
+    Zwraca klucze (uczeń, przedmiot, rok), żeby wywołujący mógł unieważnić panele.
+    """
+    grades = Grade.objects.filter(category=category)
+    keys = affected_pairs(grades.exclude(weight=category.weight))
+    grades.update(weight=category.weight)
+    refresh_pairs(keys)
+    return keys
@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 z liczbą iteracji z settings.PBKDF2_ITERATIONS (ten sam format hasha co w Django)."""
+
+    @property
+    def iterations(self):
+        return settings.PBKDF2_ITERATIONS or PBKDF2PasswordHasher.iterations
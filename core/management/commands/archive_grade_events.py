@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core import grade_journal
+
+
+class Command(BaseCommand):
+    help = ('Archiwizuje i usuwa zdarzenia dziennika zmian ocen starsze niż podana data, '
+            'np. po zakończeniu roku szkolnego.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True, help='Data graniczna RRRR-MM-DD (zdarzenia sprzed niej).')
+        parser.add_argument('--output', help='Plik JSON lines na archiwum; bez niego zdarzenia są tylko usuwane.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        try:
+            before = timezone.make_aware(datetime.strptime(options['before'], '%Y-%m-%d'))
+        except ValueError:
+            raise CommandError('Niepoprawna data --before (oczekiwano RRRR-MM-DD).')
+
+        if options['output']:
+            with open(options['output'], 'a', encoding='utf-8') as out:
+                archived = grade_journal.archive(before, out, options['batch_size'])
+        else:
+            archived = grade_journal.archive(before, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Zarchiwizowano {archived} zdarzeń sprzed {options["before"]}.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import school_years
+from core.models import SchoolYear
+
+
+class Command(BaseCommand):
+    help = ('Przenosi oceny zakończonego roku szkolnego do archiwum (GradeArchive). '
+            'Panele pokazują je dalej po wybraniu roku.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', help='Nazwa roku szkolnego, np. 2024/2025.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            year = SchoolYear.objects.get(name=options['year'])
+        except SchoolYear.DoesNotExist:
+            raise CommandError(f'Nie ma roku szkolnego {options["year"]}.')
+        try:
+            moved = school_years.archive_year(year, options['batch_size'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f'Zarchiwizowano {moved} ocen z roku {year.name}.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from core import analytics
+
+
+class Command(BaseCommand):
+    help = ('Przelicza snapshoty analityki ocen (rankingi klas, przedmiotów, nauczycieli, trendy tygodniowe). '
+            'Np. cron: pełne przeliczenie w nocy, --incremental co kilkanaście minut w ciągu dnia.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Dolicz tylko oceny wystawione po poprzednim przebiegu (bez zmian i usunięć starszych ocen).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        run = analytics.compute(incremental=options['incremental'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{run.get_mode_display()}: {run.grades_processed} ocen do {run.processed_until:%Y-%m-%d %H:%M}.'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from core import dashboard_cache
+
+
+class Command(BaseCommand):
+    help = 'Pokazuje liczniki trafień/chybień cache fragmentów paneli.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Wyzeruj liczniki po wypisaniu.')
+
+    def handle(self, *args, **options):
+        stats = dashboard_cache.stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total * 100 if total else 0
+        self.stdout.write(f"Trafienia: {stats['hits']}, chybienia: {stats['misses']} ({ratio:.1f}% trafień)")
+        if options['reset']:
+            dashboard_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Liczniki wyzerowane.'))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core import averages, report_cards
+from core.models import ClassGroup, SchoolYear
+
+
+class Command(BaseCommand):
+    help = ('Generuje świadectwa (oceny i średnie z przedmiotów) wszystkich uczniów jako pliki HTML do druku. '
+            'Ponowne uruchomienie pomija uczniów, którzy mają już plik. Tylko bieżący rok szkolny.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='swiadectwa', help='Katalog docelowy (domyślnie ./swiadectwa).')
+        parser.add_argument('--class', dest='classes', action='append', metavar='KLASA',
+                            help='Tylko wskazana klasa (można podać kilka razy).')
+        parser.add_argument('--workers', type=int, help='Liczba procesów renderujących (domyślnie liczba CPU, 1 = bez puli).')
+        parser.add_argument('--mode', choices=averages.MODES, help='Tryb średniej rocznej (domyślnie GRADE_AVERAGE_MODE).')
+        parser.add_argument('--force', action='store_true', help='Nadpisuje istniejące pliki.')
+
+    def handle(self, *args, **options):
+        school_year = SchoolYear.current()
+        if options['classes']:
+            missing = set(options['classes']) - set(ClassGroup.objects.filter(name__in=options['classes']).values_list('name', flat=True))
+            if missing:
+                raise CommandError(f'Nie ma klas: {", ".join(sorted(missing))}.')
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers musi być co najmniej 1.')
+
+        started = time.perf_counter()
+        counts = report_cards.generate(
+            options['output'], school_year, options['classes'], options['workers'], options['force'], options['mode'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Świadectwa {school_year.name}: wygenerowano {counts["generated"]}, pominięto {counts["skipped"]} '
+            f'(już istniały) w {time.perf_counter() - started:.1f} s -> {options["output"]}'
+        ))
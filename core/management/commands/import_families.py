@@ -0,0 +1,50 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from core.family_import import FamilyImportError, import_families
+
+
+class Command(BaseCommand):
+    help = 'Importuje uczniów z rodzicami z pliku CSV (kolumny: imie_ucznia;nazwisko_ucznia;email_ucznia;klasa;imie_rodzica;nazwisko_rodzica;email_rodzica).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Plik CSV w UTF-8 (separator ";" albo ",").')
+        parser.add_argument('--batch-size', type=int, default=500, help='Liczba wierszy w jednej transakcji.')
+        parser.add_argument('--report', help='Zapisz błędne wiersze do pliku CSV (linia;błędy).')
+        # Nowe konta nie mają hasła - bez linków aktywacyjnych nikt by się na nie nie zalogował.
+        parser.add_argument('--activations', required=True,
+                            help='Plik CSV na linki aktywacyjne nowych kont (email;rola;link).')
+        parser.add_argument('--base-url', default='', help='Adres serwisu doklejany do linków, np. https://dziennik.szkola.pl')
+
+    def handle(self, *args, **options):
+        # Plik na linki otwieramy przed importem: gdy nie da się go zapisać, nie powstaje żadne konto.
+        try:
+            activations = open(options['activations'], 'w', encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(str(e))
+        with activations:
+            try:
+                with open(options['path'], encoding='utf-8-sig', newline='') as source:
+                    result = import_families(source, batch_size=options['batch_size'])
+            except (OSError, FamilyImportError) as e:
+                raise CommandError(str(e))
+            except UnicodeDecodeError:
+                raise CommandError('Plik musi być zapisany w kodowaniu UTF-8 - nie utworzono żadnego konta.')
+            base_url = options['base_url'].rstrip('/')
+            writer = csv.writer(activations, delimiter=';')
+            writer.writerow(['email', 'rola', 'link'])
+            writer.writerows(
+                [email, role, base_url + reverse('activate_account', args=[token])]
+                for email, role, token in result.activations
+            )
+
+        for line, messages in result.errors:
+            self.stderr.write(f"  linia {line}: {'; '.join(messages)}")
+        if options['report'] and result.errors:
+            with open(options['report'], 'w', encoding='utf-8-sig', newline='') as report:
+                writer = csv.writer(report, delimiter=';')
+                writer.writerow(['linia', 'bledy'])
+                writer.writerows([line, ' | '.join(messages)] for line, messages in result.errors)
+        summary = f'Dodano {result.students} uczniów i {result.parents} rodziców, błędnych wierszy: {len(result.errors)}.'
+        self.stdout.write(self.style.SUCCESS(summary) if not result.errors else self.style.WARNING(summary))
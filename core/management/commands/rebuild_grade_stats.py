@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from core import grade_stats
+
+
+class Command(BaseCommand):
+    help = 'Przelicza od nowa tabelę GradeStats na podstawie wszystkich ocen (naprawa po ręcznych zmianach w bazie).'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write("Przeliczanie statystyk ocen...")
+        rows = grade_stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Gotowe: {rows} wierszy statystyk (uczeń/przedmiot).'))
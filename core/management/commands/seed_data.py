@@ -1,99 +1,173 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.hashers import make_password
-from core.models import User, ClassGroup, Subject, SubjectAssignment, Grade
+from core.models import (
+    User, ClassGroup, Subject, SubjectAssignment, Grade, GradeArchive, GradeCategory, GradeEvent, GradeStats, SchoolYear,
+)
+from core import grade_stats
 from django.db import transaction
 import random
+import string
+import time
+
+SUBJECT_NAMES = [
+    'Matematyka', 'Język Polski', 'Język Angielski', 'Historia', 'Geografia',
+    'Biologia', 'Chemia', 'Fizyka', 'Informatyka', 'Wiedza o Społeczeństwie',
+    'Język Niemiecki', 'Plastyka', 'Muzyka', 'Wychowanie Fizyczne', 'Religia',
+]
+CATEGORIES = [("Sprawdzian", 3), ("Kartkówka", 2), ("Odpowiedź", 1), ("Zadanie domowe", 1), ("Aktywność", 1)]
+# Co druga ocena bez znaku, reszta z plusem albo minusem (4+, 4-)
+MARKS = [Grade.parse_mark(mark) for mark, _ in Grade.MARK_CHOICES if len(mark) == 1] * 2 + [
+    Grade.parse_mark(mark) for mark, _ in Grade.MARK_CHOICES if len(mark) == 2
+]
+
+
+def with_search_name(users):
+    # bulk_create omija User.save(), więc klucz wyszukiwania uzupełniamy ręcznie.
+    for user in users:
+        user.search_name = user.build_search_name()
+    return users
+
 
 class Command(BaseCommand):
-    help = 'Czyści bazę i generuje 5 przedmiotów, 9 klas, 10 nauczycieli, 45 uczniów oraz oceny.'
+    help = 'Czyści bazę i generuje syntetyczną szkołę (domyślnie 5 przedmiotów, 9 klas, 10 nauczycieli, 45 uczniów oraz oceny).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int, default=9, help='Liczba klas (max 234: roczniki 1-9 x litery A-Z).')
+        parser.add_argument('--students-per-class', type=int, default=5)
+        parser.add_argument('--subjects', type=int, default=5, help=f'Liczba przedmiotów (max {len(SUBJECT_NAMES)}).')
+        parser.add_argument('--teachers', type=int, default=10)
+        parser.add_argument('--grades-per-student', type=int, default=2, help='Liczba ocen ucznia z każdego przedmiotu.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--random-seed', type=int, default=None, help='Ziarno losowania (powtarzalne dane).')
+
+    def handle(self, *args, **options):
+        n_classes = options['classes']
+        per_class = options['students_per_class']
+        n_subjects = options['subjects']
+        n_teachers = options['teachers']
+        per_subject = options['grades_per_student']
+        batch_size = options['batch_size']
+
+        if not 1 <= n_classes <= 9 * 26:
+            raise CommandError("--classes musi być w zakresie 1-234.")
+        if not 1 <= n_subjects <= len(SUBJECT_NAMES):
+            raise CommandError(f"--subjects musi być w zakresie 1-{len(SUBJECT_NAMES)}.")
+        if n_teachers < 1:
+            raise CommandError("--teachers musi być co najmniej 1.")
 
-    def handle(self, *args, **kwargs):
+        rng = random.Random(options['random_seed'])
+        started = time.perf_counter()
         self.stdout.write("Rozpoczynam proces (Clean & Seed)...")
 
         with transaction.atomic():
             self.stdout.write("Czyszczenie starej bazy danych...")
+            GradeEvent.objects.all().delete()
+            GradeStats.objects.all().delete()
             Grade.objects.all().delete()
+            GradeArchive.objects.all().delete()
+            GradeCategory.objects.all().delete()
             SubjectAssignment.objects.all().delete()
             User.objects.filter(is_superuser=False).delete()
             Subject.objects.all().delete()
             ClassGroup.objects.all().delete()
 
-            self.stdout.write("Tworzenie przedmiotów...")
-            subject_names = ['Matematyka', 'Język Polski', 'Język Angielski', 'Historia', 'Geografia']
-            subjects = [Subject.objects.create(name=name) for name in subject_names]
+            self.stdout.write("Tworzenie przedmiotów i klas...")
+            subjects = Subject.objects.bulk_create([Subject(name=name) for name in SUBJECT_NAMES[:n_subjects]])
+            categories = GradeCategory.objects.bulk_create([GradeCategory(name=name, weight=weight) for name, weight in CATEGORIES])
+            class_names = [f"{year}{letter}" for letter in string.ascii_uppercase for year in range(1, 10)][:n_classes]
+            classes = ClassGroup.objects.bulk_create([ClassGroup(name=name) for name in sorted(class_names)])
 
-            self.stdout.write("Tworzenie klas...")
-            classes = []
-            for year in range(1, 4):
-                for letter in ['A', 'B', 'C']:
-                    obj = ClassGroup.objects.create(name=f"{year}{letter}")
-                    classes.append(obj)
+            # PBKDF2 jest celowo wolne - liczymy hash raz na rolę i używamy go dla wszystkich kont.
+            passwords = {
+                'teacher': make_password('nauczyciel123'),
+                'parent': make_password('rodzic123'),
+                'student': make_password('uczen123'),
+            }
 
+            phase = time.perf_counter()
             self.stdout.write("Tworzenie nauczycieli...")
-            teachers = []
-            for i in range(1, 11):
-                email = f'nauczyciel{i}@szkola.pl'
-                user = User.objects.create(
-                    email=email,
-                    username=email,
-                    first_name=f'Nauczyciel{i}',
-                    last_name=f'Kowalski{i}',
-                    role='teacher',
-                    password=make_password('nauczyciel123')
+            teachers = User.objects.bulk_create(with_search_name([
+                User(
+                    email=f'nauczyciel{i}@szkola.pl', username=f'nauczyciel{i}@szkola.pl',
+                    first_name=f'Nauczyciel{i}', last_name=f'Kowalski{i}',
+                    role='teacher', password=passwords['teacher'],
                 )
-                teachers.append(user)
+                for i in range(1, n_teachers + 1)
+            ]), batch_size=batch_size)
 
             self.stdout.write("Przypisywanie kadry do przedmiotów...")
-            for cls in classes:
+            assignments = SubjectAssignment.objects.bulk_create([
+                SubjectAssignment(teacher=rng.choice(teachers), subject=subj, class_group=cls)
+                for cls in classes for subj in subjects
+            ], batch_size=batch_size)
+            teacher_for = {(a.class_group_id, a.subject_id): a.teacher_id for a in assignments}
+
+            self.stdout.write("Tworzenie rodziców i uczniów...")
+            total_students = n_classes * per_class
+            parents = User.objects.bulk_create(with_search_name([
+                User(
+                    email=f'rodzic{i}@poczta.pl', username=f'rodzic{i}@poczta.pl',
+                    first_name=f'Rodzic{i}', last_name=f'Studentowski{i}',
+                    role='parent', password=passwords['parent'],
+                )
+                for i in range(1, total_students + 1)
+            ]), batch_size=batch_size)
+            students = User.objects.bulk_create(with_search_name([
+                User(
+                    email=f'uczen{i}@szkola.pl', username=f'uczen{i}@szkola.pl',
+                    first_name=f'Student{i}', last_name=f'Studentowski{i}',
+                    role='student', password=passwords['student'],
+                    parent=parents[i - 1], class_group=classes[(i - 1) // per_class],
+                )
+                for i in range(1, total_students + 1)
+            ]), batch_size=batch_size)
+            users_count = len(teachers) + len(parents) + len(students)
+            self._report("Użytkownicy", users_count, phase)
+
+            phase = time.perf_counter()
+            self.stdout.write("Generowanie ocen...")
+            total_grades = total_students * n_subjects * per_subject
+            created = 0
+            batch = []
+            school_year = SchoolYear.current()
+            for student in students:
                 for subj in subjects:
-                    SubjectAssignment.objects.create(
-                        teacher=random.choice(teachers),
-                        subject=subj,
-                        class_group=cls
-                    )
-
-            self.stdout.write("Generowanie uczniów, rodziców i ocen (to chwilę potrwa)...")
-            possible_values = [1, 2, 2.5, 3, 3.5, 4, 4.5, 5, 5.5, 6]
-            comments = ["Aktywność", "Sprawdzian", "Kartkówka", "Zadanie domowe", "Odpowiedź"]
-            
-            student_global_idx = 1
-            for cls in classes:
-                for i in range(1, 6):
-                    p_email = f'rodzic{student_global_idx}@poczta.pl'
-                    parent = User.objects.create(
-                        email=p_email,
-                        username=p_email,
-                        first_name=f'Rodzic{student_global_idx}',
-                        last_name=f'Studentowski{student_global_idx}',
-                        role='parent',
-                        password=make_password('rodzic123')
-                    )
-
-                    s_email = f'uczen{student_global_idx}@szkola.pl'
-                    student = User.objects.create(
-                        email=s_email,
-                        username=s_email,
-                        first_name=f'Student{student_global_idx}',
-                        last_name=f'Studentowski{student_global_idx}',
-                        role='student',
-                        password=make_password('uczen123'),
-                        parent=parent,
-                        class_group=cls
-                    )
-
-                    for subj in subjects:
-                        assignment = SubjectAssignment.objects.get(class_group=cls, subject=subj)
-                        
-                        for _ in range(2):
-                            Grade.objects.create(
-                                student=student,
-                                subject=subj,
-                                teacher=assignment.teacher,
-                                value=random.choice(possible_values),
-                                comment=random.choice(comments)
-                            )
-                    
-                    student_global_idx += 1
+                    teacher_id = teacher_for[(student.class_group_id, subj.id)]
+                    for _ in range(per_subject):
+                        value, modifier = rng.choice(MARKS)
+                        category = rng.choice(categories)
+                        grade = Grade(
+                            student_id=student.id, subject_id=subj.id, teacher_id=teacher_id,
+                            value=value, modifier=modifier, comment=category.name,
+                        )
+                        grade.set_category(category)
+                        grade.score = grade.build_score()  # bulk_create omija Grade.save()
+                        grade.assign_school_year(school_year)
+                        batch.append(grade)
+                    if len(batch) >= batch_size:
+                        created += self._flush(batch, created, total_grades)
+                        batch = []
+            created += self._flush(batch, created, total_grades)
+            self._report("Oceny", created, phase)
+
+            self.stdout.write("Liczenie statystyk ocen...")
+            grade_stats.rebuild()
 
         self.stdout.write(self.style.SUCCESS('--- SEEDOWANIE ZAKOŃCZONE ---'))
-        self.stdout.write(f'Stworzono: 5 przedmiotów, 9 klas, 10 nauczycieli, 45 uczniów i rodziców oraz 450 ocen.')
\ No newline at end of file
+        self.stdout.write(
+            f'Stworzono: {len(subjects)} przedmiotów, {len(classes)} klas, {len(teachers)} nauczycieli, '
+            f'{total_students} uczniów i rodziców oraz {created} ocen w {time.perf_counter() - started:.1f} s.'
+        )
+
+    def _flush(self, batch, created, total):
+        if not batch:
+            return 0
+        Grade.objects.bulk_create(batch)
+        done = created + len(batch)
+        self.stdout.write(f"  oceny: {done}/{total} ({done * 100 // total}%)")
+        return len(batch)
+
+    def _report(self, label, count, since):
+        elapsed = time.perf_counter() - since
+        rate = count / elapsed if elapsed else count
+        self.stdout.write(f"  {label}: {count} w {elapsed:.2f} s ({rate:.0f}/s)")
@@ -0,0 +1,124 @@
+"""Pomiar zapytań SQL, czasu bazy, renderowania szablonów i całego żądania.
+
+Wyniki trafiają do nagłówka Server-Timing (widoczny w narzędziach
+deweloperskich przeglądarki), a żądania wolniejsze niż
+REQUEST_TIMING_SLOW_MS idą do loggera core.slow_requests (jedna linia JSON
+z najczęściej powtarzanymi zapytaniami; plik i rotację ustawia LOGGING
+w config/settings.py). REQUEST_TIMING_SAMPLE_RATE < 1 mierzy tylko część
+żądań - pozostałe przechodzą bez żadnego narzutu.
+
+Middleware działa i pod WSGI, i pod ASGI - w trybie async nie wymusza
+przełączenia widoków async na wątek.
+"""
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+_current = ContextVar('request_timing', default=None)
+slow_log = logging.getLogger('core.slow_requests')
+
+
+class RequestTiming:
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.statements = Counter()
+        self.start = time.perf_counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - start) * 1000
+            self.queries += 1
+            self.statements[sql] += 1
+
+
+def add_template_time(ms):
+    """Wołane przez core.template_backend po wyrenderowaniu szablonu."""
+    timing = _current.get()
+    if timing is not None:
+        timing.template_ms += ms
+
+
+@contextmanager
+def _measure():
+    timing = RequestTiming()
+    token = _current.set(timing)
+    try:
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(timing))
+            yield timing
+    finally:
+        _current.reset(token)
+
+
+class RequestTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.REQUEST_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        with _measure() as timing:
+            response = self.get_response(request)
+        total_ms = self.add_header(response, timing)
+        if total_ms >= settings.REQUEST_TIMING_SLOW_MS:
+            self.log_slow_request(request, response, timing, total_ms)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= settings.REQUEST_TIMING_SAMPLE_RATE:
+            return await self.get_response(request)
+        with _measure() as timing:
+            response = await self.get_response(request)
+        total_ms = self.add_header(response, timing)
+        if total_ms >= settings.REQUEST_TIMING_SLOW_MS:
+            # handler logu (plik) i ewentualne leniwe request.user to operacje blokujące
+            await sync_to_async(self.log_slow_request)(request, response, timing, total_ms)
+        return response
+
+    def add_header(self, response, timing):
+        total_ms = (time.perf_counter() - timing.start) * 1000
+        response['Server-Timing'] = (
+            f'db;dur={timing.db_ms:.1f};desc="{timing.queries} SQL", '
+            f'tpl;dur={timing.template_ms:.1f}, total;dur={total_ms:.1f}'
+        )
+        return total_ms
+
+    def log_slow_request(self, request, response, timing, total_ms):
+        user = getattr(request, 'user', None)
+        entry = {
+            'ts': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+            'total_ms': round(total_ms, 1),
+            'db_ms': round(timing.db_ms, 1),
+            'template_ms': round(timing.template_ms, 1),
+            'queries': timing.queries,
+            'duplicates': [
+                {'sql': sql, 'count': count}
+                for sql, count in timing.statements.most_common(5) if count > 1
+            ],
+        }
+        slow_log.warning(json.dumps(entry, ensure_ascii=False))
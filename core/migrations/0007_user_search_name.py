@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:05
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    users = list(User.objects.only('id', 'first_name', 'last_name'))
+    for user in users:
+        text = f"{user.last_name} {user.first_name}".strip().lower().replace('ł', 'l')
+        text = unicodedata.normalize('NFKD', text)
+        user.search_name = ' '.join(''.join(ch for ch in text if not unicodedata.combining(ch)).split())
+    User.objects.bulk_update(users, ['search_name'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0006_grade_user_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_role_name_idx',
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='search_name',
+            field=models.CharField(blank=True, editable=False, max_length=320),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'search_name', 'id'], name='user_role_search_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_user_search_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='activation_token',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_user_activation_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('full', 'Pełne przeliczenie'), ('incremental', 'Przyrostowe')], max_length=20)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_until', models.DateTimeField()),
+                ('grades_processed', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GradeSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sum', models.IntegerField(default=0)),
+                ('value_1', models.PositiveIntegerField(default=0)),
+                ('value_2', models.PositiveIntegerField(default=0)),
+                ('value_3', models.PositiveIntegerField(default=0)),
+                ('value_4', models.PositiveIntegerField(default=0)),
+                ('value_5', models.PositiveIntegerField(default=0)),
+                ('value_6', models.PositiveIntegerField(default=0)),
+                ('class_group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.classgroup')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.subject')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('week', 'class_group', 'subject', 'teacher')},
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:20
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+DEFAULT_CATEGORIES = [('Sprawdzian', 3), ('Kartkówka', 2), ('Odpowiedź', 1), ('Zadanie domowe', 1), ('Aktywność', 1)]
+
+
+def fill_scores(apps, schema_editor):
+    # Dotychczasowe oceny nie mają plusów/minusów ani kategorii: score = value, waga 1.
+    apps.get_model('core', 'Grade').objects.update(score=F('value'))
+    apps.get_model('core', 'GradeStats').objects.update(weighted_sum=F('sum'), weight_total=F('count'))
+    GradeCategory = apps.get_model('core', 'GradeCategory')
+    GradeCategory.objects.bulk_create([GradeCategory(name=name, weight=weight) for name, weight in DEFAULT_CATEGORIES])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_analytics_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('weight', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+            ],
+            options={
+                'ordering': ['-weight', 'name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='modifier',
+            field=models.CharField(blank=True, choices=[('', 'bez znaku'), ('+', 'plus'), ('-', 'minus')], default='', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='score',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=4),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='weight',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='gradestats',
+            name='weight_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='gradesnapshot',
+            name='sum',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='gradestats',
+            name='sum',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='gradestats',
+            name='weighted_sum',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='grades', to='core.gradecategory'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
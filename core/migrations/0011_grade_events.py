@@ -0,0 +1,35 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_grade_categories_weights'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('created', 'Dodanie'), ('changed', 'Zmiana'), ('deleted', 'Usunięcie')], max_length=10)),
+                ('old_mark', models.CharField(blank=True, max_length=2)),
+                ('new_mark', models.CharField(blank=True, max_length=2)),
+                ('old_weight', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('new_weight', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('comment', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_events', to=settings.AUTH_USER_MODEL)),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'id'], name='gradeevent_student_seq_idx')],
+            },
+        ),
+    ]
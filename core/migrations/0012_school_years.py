@@ -0,0 +1,127 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:05
+
+from datetime import date
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Max, Min, Sum
+from django.utils import timezone
+
+
+def fill_school_years(apps, schema_editor):
+    """Lata szkolne (1 września - 31 sierpnia, semestr 2 od 1 lutego) z dat istniejących ocen i statystyki per rok."""
+    SchoolYear = apps.get_model('core', 'SchoolYear')
+    Grade = apps.get_model('core', 'Grade')
+    GradeStats = apps.get_model('core', 'GradeStats')
+    bounds = Grade.objects.aggregate(first=Min('date_created'), last=Max('date_created'))
+    if bounds['first'] is None:
+        return
+    first = timezone.localdate(bounds['first'])
+    last = timezone.localdate(bounds['last'])
+    for start_year in range(first.year - (first.month < 9), last.year - (last.month < 9) + 1):
+        year, _ = SchoolYear.objects.get_or_create(name=f'{start_year}/{start_year + 1}', defaults={
+            'start': date(start_year, 9, 1), 'second_term_start': date(start_year + 1, 2, 1), 'end': date(start_year + 1, 8, 31),
+        })
+        grades = Grade.objects.filter(date_created__date__range=(year.start, year.end))
+        grades.filter(date_created__date__lt=year.second_term_start).update(school_year=year, term=1)
+        grades.filter(date_created__date__gte=year.second_term_start).update(school_year=year, term=2)
+    GradeStats.objects.all().delete()
+    rows = Grade.objects.values('student_id', 'subject_id', 'school_year_id').annotate(
+        count=Count('id'),
+        sum=Sum('score'),
+        weighted_sum=Sum(F('score') * F('weight'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        weight_total=Sum('weight'),
+        last_grade_at=Max('date_created'),
+    ).order_by()
+    GradeStats.objects.bulk_create([GradeStats(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_grade_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('value', models.IntegerField(choices=[(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5'), (6, '6')])),
+                ('modifier', models.CharField(blank=True, choices=[('', 'bez znaku'), ('+', 'plus'), ('-', 'minus')], default='', max_length=1)),
+                ('score', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('comment', models.CharField(blank=True, max_length=255)),
+                ('date_created', models.DateTimeField()),
+                ('term', models.PositiveSmallIntegerField(choices=[(1, 'Semestr 1'), (2, 'Semestr 2')])),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SchoolYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20, unique=True)),
+                ('start', models.DateField()),
+                ('second_term_start', models.DateField()),
+                ('end', models.DateField()),
+                ('archived_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-start'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='grade',
+            name='grade_student_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='grade',
+            name='grade_subject_student_idx',
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='term',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Semestr 1'), (2, 'Semestr 2')], null=True),
+        ),
+        migrations.AddField(
+            model_name='gradearchive',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.gradecategory'),
+        ),
+        migrations.AddField(
+            model_name='gradearchive',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_grades', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='gradearchive',
+            name='subject',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.subject'),
+        ),
+        migrations.AddField(
+            model_name='gradearchive',
+            name='teacher',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='gradearchive',
+            name='school_year',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_grades', to='core.schoolyear'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='gradestats',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='school_year',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='grades', to='core.schoolyear'),
+        ),
+        migrations.AddField(
+            model_name='gradestats',
+            name='school_year',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.schoolyear'),
+        ),
+        migrations.RunPython(fill_school_years, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Osobno od 0012: na PostgreSQL ALTER TABLE po UPDATE w tej samej transakcji
+    # kończy się błędem "pending trigger events".
+
+    dependencies = [
+        ('core', '0012_school_years'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='grade',
+            name='school_year',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, editable=False, related_name='grades', to='core.schoolyear'),
+        ),
+        migrations.AlterField(
+            model_name='grade',
+            name='term',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Semestr 1'), (2, 'Semestr 2')], editable=False),
+        ),
+        migrations.AlterField(
+            model_name='gradestats',
+            name='school_year',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.schoolyear'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='gradestats',
+            unique_together={('student', 'subject', 'school_year')},
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['student', 'school_year', 'date_created'], name='grade_student_year_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['subject', 'school_year', 'student'], name='grade_subject_year_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gradearchive',
+            index=models.Index(fields=['student', 'school_year', 'date_created'], name='gradearchive_student_year_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.db.models.functions import Now
+
+
+def start_pending_activations(apps, schema_editor):
+    # Linki wystawione przed wprowadzeniem terminu ważności liczą się od dziś.
+    User = apps.get_model('core', 'User')
+    User.objects.exclude(activation_token='').update(activation_sent_at=Now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_school_years_required'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='activation_sent_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(start_pending_activations, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,19 @@
+from datetime import date
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
+import unicodedata
+
+
+def normalize_search(text):
+    """Małe litery bez polskich znaków diakrytycznych (Łódź -> lodz) - klucz do wyszukiwania po prefiksie."""
+    text = (text or '').strip().lower().replace('ł', 'l')
+    text = unicodedata.normalize('NFKD', text)
+    return ' '.join(''.join(ch for ch in text if not unicodedata.combining(ch)).split())
 
 class ClassGroup(models.Model):
     name = models.CharField(max_length=10, unique=True)
@@ -20,26 +34,234 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='children')
     class_group = models.ForeignKey(ClassGroup, on_delete=models.SET_NULL, null=True, blank=True)
+    search_name = models.CharField(max_length=320, blank=True, editable=False)
+    # SHA-256 jednorazowego tokenu aktywacyjnego (core.activation); puste po ustawieniu hasła
+    activation_token = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    activation_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # lista klasy w dzienniku: class_group + role, sortowanie po nazwisku
+            models.Index(fields=['class_group', 'role', 'last_name'], name='user_class_role_name_idx'),
+            # listy uczniów/nauczycieli w panelu admina: wyszukiwanie po prefiksie + stronicowanie kursorem
+            models.Index(fields=['role', 'search_name', 'id'], name='user_role_search_idx'),
+        ]
+
+    def build_search_name(self):
+        return normalize_search(f"{self.last_name} {self.first_name}")
+
+    def save(self, *args, **kwargs):
+        self.search_name = self.build_search_name()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('first_name' in update_fields or 'last_name' in update_fields):
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.email
 
+class GradeCategory(models.Model):
+    """Rodzaj oceny (sprawdzian, kartkówka, ...) z wagą do średniej ważonej."""
+    name = models.CharField(max_length=50, unique=True)
+    weight = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+
+    class Meta:
+        ordering = ['-weight', 'name']
+
+    def __str__(self):
+        return f"{self.name} (waga {self.weight})"
+
+class SchoolYear(models.Model):
+    """Rok szkolny z dwoma semestrami (semestr 2 od second_term_start).
+
+    Panele pokazują domyślnie oceny bieżącego roku, a oceny zamkniętych lat
+    przenosi do GradeArchive manage.py archive_school_year (archived_at).
+    Brakujące lata tworzy for_date() z domyślnymi granicami: 1 września -
+    31 sierpnia, semestr 2 od 1 lutego. Tabela ma kilka wierszy, więc
+    current() to zwykłe zapytanie - bez cache, który przeżyłby usunięcie roku.
+    """
+    name = models.CharField(max_length=20, unique=True)
+    start = models.DateField()
+    second_term_start = models.DateField()
+    end = models.DateField()
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-start']
+
+    @classmethod
+    def for_date(cls, day):
+        year = cls.objects.filter(start__lte=day, end__gte=day).first()
+        if year is None:
+            first = day.year if day.month >= 9 else day.year - 1
+            year, _ = cls.objects.get_or_create(name=f'{first}/{first + 1}', defaults={
+                'start': date(first, 9, 1), 'second_term_start': date(first + 1, 2, 1), 'end': date(first + 1, 8, 31),
+            })
+        return year
+
+    @classmethod
+    def current(cls):
+        return cls.for_date(timezone.localdate())
+
+    @classmethod
+    async def acurrent(cls):
+        year = await cls.objects.filter(start__lte=timezone.localdate(), end__gte=timezone.localdate()).afirst()
+        return year or await sync_to_async(cls.current)()
+
+    @property
+    def is_closed(self):
+        return self.end < timezone.localdate()
+
+    @property
+    def is_current(self):
+        return self.start <= timezone.localdate() <= self.end
+
+    def term_of(self, moment):
+        return 2 if timezone.localdate(moment) >= self.second_term_start else 1
+
+    def __str__(self):
+        return self.name + (' (archiwum)' if self.archived_at else '')
+
 class Grade(models.Model):
+    TERM_CHOICES = [(1, 'Semestr 1'), (2, 'Semestr 2')]
     VALUE_CHOICES = [
         (1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5'), (6, '6'),
     ]
+    MODIFIER_CHOICES = [('', 'bez znaku'), ('+', 'plus'), ('-', 'minus')]
+    # 4+ = 4.5, 4- = 3.75 - wartości liczone do średnich
+    MODIFIER_DELTAS = {'': Decimal('0'), '+': Decimal('0.5'), '-': Decimal('-0.25')}
+    # Stopnie do wyboru w dzienniku: 1, 1+, 2-, 2, 2+, ..., 6- , 6 (bez 1- i 6+)
+    MARK_CHOICES = [
+        (f'{value}{modifier}', f'{value}{modifier}')
+        for value, _ in VALUE_CHOICES for modifier in ('-', '', '+')
+        if (value, modifier) not in ((1, '-'), (6, '+'))
+    ]
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grades_received')
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grades_given')
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
     value = models.IntegerField(choices=VALUE_CHOICES)
+    modifier = models.CharField(max_length=1, choices=MODIFIER_CHOICES, blank=True, default='')
+    # Wartość liczbowa stopnia z plusem/minusem (value + MODIFIER_DELTAS) - sumowana w bazie
+    score = models.DecimalField(max_digits=4, decimal_places=2, editable=False)
+    category = models.ForeignKey(GradeCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='grades')
+    # Waga kategorii w chwili wystawienia; zmiana wagi kategorii przepisuje ją (grade_stats.category_weight_changed)
+    weight = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
     comment = models.CharField(max_length=255, blank=True)
     date_created = models.DateTimeField(auto_now_add=True)
+    # Ustawiane przy zapisie (assign_school_year) - panele filtrują po bieżącym roku, średnia semestralna po term
+    school_year = models.ForeignKey(SchoolYear, on_delete=models.PROTECT, related_name='grades', editable=False)
+    term = models.PositiveSmallIntegerField(choices=TERM_CHOICES, editable=False)
+
+    class Meta:
+        indexes = [
+            # panel ucznia/rodzica: oceny ucznia (lub kilku dzieci) z bieżącego roku w kolejności wystawienia
+            models.Index(fields=['student', 'school_year', 'date_created'], name='grade_student_year_date_idx'),
+            # dziennik klasy: przedmiot + rok + uczniowie klasy
+            models.Index(fields=['subject', 'school_year', 'student'], name='grade_subject_year_student_idx'),
+            # usuwanie/edycja nauczyciela: jego oceny i dotknięci uczniowie
+            models.Index(fields=['teacher', 'student'], name='grade_teacher_student_idx'),
+        ]
+
+    @staticmethod
+    def parse_mark(mark):
+        """'4+' -> (4, '+'); mark pochodzi z MARK_CHOICES."""
+        return int(mark[0]), mark[1:]
+
+    @property
+    def mark(self):
+        return f"{self.value}{self.modifier}"
+
+    def build_score(self):
+        return Decimal(int(self.value)) + self.MODIFIER_DELTAS[self.modifier]
+
+    def set_category(self, category):
+        self.category = category
+        self.weight = category.weight if category is not None else 1
+
+    def assign_school_year(self, school_year=None):
+        """Rok i semestr z daty wystawienia (nowa ocena: teraz); bulk_create omija save(), więc wołać ręcznie."""
+        moment = self.date_created or timezone.now()
+        self.school_year = school_year or SchoolYear.for_date(timezone.localdate(moment))
+        self.term = self.school_year.term_of(moment)
+
+    def save(self, *args, **kwargs):
+        self.score = self.build_score()
+        if self.school_year_id is None:
+            self.assign_school_year(SchoolYear.current() if self.date_created is None else None)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('value' in update_fields or 'modifier' in update_fields):
+            kwargs['update_fields'] = {*update_fields, 'score'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.student.last_name} - {self.subject.name}: {self.value}"
+        return f"{self.student.last_name} - {self.subject.name}: {self.mark}"
+
+class GradeArchive(models.Model):
+    """Oceny zamkniętych lat szkolnych przeniesione z Grade (core.school_years.archive_year).
+
+    id to id oryginalnej oceny (zdarzenia GradeEvent dalej się do niej odnoszą).
+    Pola jak w Grade, ale nauczyciel i kategoria mogą zniknąć bez kasowania archiwum.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_grades')
+    teacher = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='+')
+    value = models.IntegerField(choices=Grade.VALUE_CHOICES)
+    modifier = models.CharField(max_length=1, choices=Grade.MODIFIER_CHOICES, blank=True, default='')
+    score = models.DecimalField(max_digits=4, decimal_places=2)
+    category = models.ForeignKey(GradeCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    weight = models.PositiveSmallIntegerField(default=1)
+    comment = models.CharField(max_length=255, blank=True)
+    date_created = models.DateTimeField()
+    school_year = models.ForeignKey(SchoolYear, on_delete=models.PROTECT, related_name='archived_grades')
+    term = models.PositiveSmallIntegerField(choices=Grade.TERM_CHOICES)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'school_year', 'date_created'], name='gradearchive_student_year_idx'),
+        ]
+
+    @property
+    def mark(self):
+        return f"{self.value}{self.modifier}"
+
+    def __str__(self):
+        return f"{self.school_year_id}: {self.student_id} - {self.subject_id}: {self.mark}"
+
+class GradeEvent(models.Model):
+    """Dziennik zmian ocen, tylko do dopisywania (core.grade_journal).
+
+    id jest numerem kolejnym zdarzenia - panele ucznia i rodzica pytają o
+    zdarzenia z id większym niż ich kursor (indeks student + id).
+    """
+    ACTION_CHOICES = (('created', 'Dodanie'), ('changed', 'Zmiana'), ('deleted', 'Usunięcie'))
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grade_events')
+    subject = models.ForeignKey(Subject, on_delete=models.SET_NULL, null=True, blank=True)
+    grade_id = models.BigIntegerField()  # bez FK - zdarzenie zostaje po usunięciu oceny
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    old_mark = models.CharField(max_length=2, blank=True)
+    new_mark = models.CharField(max_length=2, blank=True)
+    old_weight = models.PositiveSmallIntegerField(null=True, blank=True)
+    new_weight = models.PositiveSmallIntegerField(null=True, blank=True)
+    comment = models.CharField(max_length=255, blank=True)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'id'], name='gradeevent_student_seq_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Dziennik zmian ocen jest tylko do dopisywania.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"#{self.id} {self.get_action_display()} oceny {self.grade_id}: {self.old_mark or '-'} -> {self.new_mark or '-'}"
 
 class SubjectAssignment(models.Model):
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'teacher'})
@@ -50,4 +272,64 @@ class SubjectAssignment(models.Model):
         unique_together = ('subject', 'class_group') 
 
     def __str__(self):
-        return f"{self.subject.name} - {self.class_group.name} ({self.teacher.last_name})"
\ No newline at end of file
+        return f"{self.subject.name} - {self.class_group.name} ({self.teacher.last_name})"
+
+class GradeStats(models.Model):
+    """Zagregowane oceny ucznia z jednego przedmiotu w roku szkolnym (utrzymywane przyrostowo przez core.grade_stats)."""
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grade_stats')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
+    school_year = models.ForeignKey(SchoolYear, on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+    sum = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # suma score x waga i suma wag - średnia ważona to weighted_sum / weight_total
+    weighted_sum = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    weight_total = models.PositiveIntegerField(default=0)
+    last_grade_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('student', 'subject', 'school_year')
+
+    @property
+    def average(self):
+        return round(self.sum / self.count, 2) if self.count else 0
+
+    def __str__(self):
+        return f"{self.student_id}/{self.subject_id}: {self.count} ocen"
+
+
+class GradeSnapshot(models.Model):
+    """Oceny zagregowane do komórek tydzień x klasa x przedmiot x nauczyciel (liczone przez compute_analytics).
+
+    Rankingi klas, przedmiotów, nauczycieli i trendy tygodniowe w panelu admina
+    to sumy po tej tabeli - nie skanujemy tabeli Grade przy każdym wejściu.
+    """
+    week = models.DateField()
+    class_group = models.ForeignKey(ClassGroup, on_delete=models.CASCADE, null=True, blank=True)
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
+    teacher = models.ForeignKey(User, on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+    sum = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    value_1 = models.PositiveIntegerField(default=0)
+    value_2 = models.PositiveIntegerField(default=0)
+    value_3 = models.PositiveIntegerField(default=0)
+    value_4 = models.PositiveIntegerField(default=0)
+    value_5 = models.PositiveIntegerField(default=0)
+    value_6 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('week', 'class_group', 'subject', 'teacher')
+
+    def __str__(self):
+        return f"{self.week} {self.class_group_id}/{self.subject_id}/{self.teacher_id}: {self.count} ocen"
+
+
+class AnalyticsRun(models.Model):
+    """Przebieg compute_analytics; processed_until to granica date_created dla trybu przyrostowego."""
+    MODE_CHOICES = (('full', 'Pełne przeliczenie'), ('incremental', 'Przyrostowe'))
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES)
+    started_at = models.DateTimeField(auto_now_add=True)
+    processed_until = models.DateTimeField()
+    grades_processed = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.get_mode_display()} do {self.processed_until:%Y-%m-%d %H:%M}"
@@ -0,0 +1,89 @@
+"""Powiadomienia o zmianach ocen w obrębie procesu (pub/sub dla strumieni SSE).
+
+core.grade_journal po commicie publikuje id nowego zdarzenia dla ucznia, a
+otwarte strumienie (views.student_stream / parent_stream) dostają je przez
+własną kolejkę asyncio. Powiadomienie niesie tylko (student_id, event_id) -
+klient i tak dociąga szczegóły z dziennika po kursorze, więc czekający
+strumień nie trzyma połączenia z bazą ani żadnych danych o ocenach.
+
+Pod ASGI połączenia z bazą należą do kontekstu żądania i zamykają się dopiero
+na jego końcu, więc strumień zwalnia je przez release_connections() zaraz po
+odczycie kursora - inaczej każdy otwarty panel trzymałby połączenie z bazą.
+
+Zapis ocen działa w wątku (widok sync), a strumienie w pętli zdarzeń ASGI,
+dlatego publish() przekazuje powiadomienie przez loop.call_soon_threadsafe.
+Pub/sub jest w pamięci jednego procesu: przy kilku workerach uvicorna
+zdarzenie z innego procesu dotrze do klienta dopiero po ponownym połączeniu
+(strumień sprawdza wtedy dziennik od Last-Event-ID).
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.db import connections
+
+HEARTBEAT = 25  # s - komentarz ":" podtrzymujący połączenie przez proxy
+MAX_PENDING = 16
+
+_lock = threading.Lock()
+_subscribers = defaultdict(set)
+
+
+class Subscription:
+    def __init__(self, student_ids):
+        self.student_ids = tuple(student_ids)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=MAX_PENDING)
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Klient pobiera wszystko po kursorze, więc zaległe powiadomienie i tak obejmie to zdarzenie.
+            pass
+
+    async def get(self, timeout=None):
+        """(student_id, event_id) albo None po `timeout` sekundach ciszy."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        with _lock:
+            for student_id in self.student_ids:
+                _subscribers[student_id].discard(self)
+                if not _subscribers[student_id]:
+                    del _subscribers[student_id]
+
+
+def subscribe(student_ids):
+    """Subskrypcja zdarzeń uczniów; wołać z pętli zdarzeń i zamknąć przez close()."""
+    subscription = Subscription(student_ids)
+    with _lock:
+        for student_id in subscription.student_ids:
+            _subscribers[student_id].add(subscription)
+    return subscription
+
+
+def publish(student_id, event_id):
+    """Bezpieczne z dowolnego wątku; bez subskrybentów to tylko odczyt słownika."""
+    with _lock:
+        subscriptions = list(_subscribers.get(student_id, ()))
+    for subscription in subscriptions:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription._put, (student_id, event_id))
+        except RuntimeError:  # pętla już zamknięta - strumień i tak się kończy
+            pass
+
+
+def release_connections():
+    """Zamyka połączenia z bazą bieżącego żądania (poza transakcją, np. testową); wołać przez sync_to_async."""
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block:
+            conn.close()
+
+
+def subscriber_count():
+    with _lock:
+        return len({subscription for subscriptions in _subscribers.values() for subscription in subscriptions})
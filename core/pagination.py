@@ -0,0 +1,81 @@
+"""Stronicowanie kursorem (keyset) i wyszukiwanie po prefiksie dla list użytkowników.
+
+Zamiast OFFSET (który każe bazie przejść wszystkie wcześniejsze wiersze)
+pamiętamy ostatni pokazany wiersz i pytamy o następne po (search_name, id) -
+koszt strony jest stały niezależnie od tego, jak daleko przewinięto listę.
+"""
+from urllib.parse import urlencode
+
+from django.db.models import Q
+
+from .models import User, normalize_search
+
+
+def _prefix_filter(field, prefix):
+    # Zakres [prefix, prefix z podbitą ostatnią literą) daje skan indeksu na każdej bazie,
+    # startswith odrzuca ewentualne fałszywe trafienia przy sortowaniu lingwistycznym.
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper, f'{field}__startswith': prefix})
+
+
+def prefix_search(queryset, query):
+    """Filtr po prefiksie "nazwisko [imię]" albo e-maila, korzystający z indeksu."""
+    query = query.strip()
+    if '@' in query:
+        return queryset.filter(_prefix_filter('email', query.lower()))
+    prefix = normalize_search(query)
+    if not prefix:
+        return queryset
+    return queryset.filter(_prefix_filter('search_name', prefix))
+
+
+class KeysetPage:
+    def __init__(self, items, has_next, has_previous):
+        self.items = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = items[-1].id if items and has_next else None
+        self.previous_cursor = items[0].id if items and has_previous else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _cursor_row(cursor):
+    try:
+        return User.objects.filter(pk=int(cursor)).values('search_name', 'id').first()
+    except (TypeError, ValueError):
+        return None
+
+
+def keyset_page(queryset, page_size, after=None, before=None):
+    """Zwraca KeysetPage z queryset posortowanym po (search_name, id)."""
+    if before and (row := _cursor_row(before)):
+        items = list(queryset.filter(
+            Q(search_name__lt=row['search_name']) | Q(search_name=row['search_name'], id__lt=row['id'])
+        ).order_by('-search_name', '-id')[:page_size + 1])
+        has_previous = len(items) > page_size
+        items = items[:page_size][::-1]
+        return KeysetPage(items, has_next=True, has_previous=has_previous)
+
+    has_previous = False
+    if after and (row := _cursor_row(after)):
+        queryset = queryset.filter(
+            Q(search_name__gt=row['search_name']) | Q(search_name=row['search_name'], id__gt=row['id'])
+        )
+        has_previous = True
+    items = list(queryset.order_by('search_name', 'id')[:page_size + 1])
+    return KeysetPage(items[:page_size], has_next=len(items) > page_size, has_previous=has_previous)
+
+
+def page_url(request, **changes):
+    """Adres bieżącej strony z podmienionymi parametrami GET (None usuwa parametr)."""
+    params = request.GET.copy()
+    for key, value in changes.items():
+        params.pop(key, None)
+        if value is not None:
+            params[key] = value
+    return '?' + urlencode(sorted(params.items()))
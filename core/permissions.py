@@ -0,0 +1,99 @@
+"""Sprawdzanie ról i przypisań nauczycieli bez dodatkowych zapytań.
+
+Rola jest polem użytkownika, którego AuthenticationMiddleware i tak wczytuje
+z sesji, więc jej sprawdzenie nic nie kosztuje. Zbiór przypisań nauczyciela
+(pary class_group_id, subject_id) trzymamy w cache pod kluczem z wersją
+'assignments' z dashboard_cache - zmiana przypisań podbija wersję, a zwykłe
+wejście do dziennika klasy nie odpytuje bazy o uprawnienia. Tylko gdy cache
+paneli jest włączony (dashboard_cache.enabled): przy kilku procesach z locmem
+odebrane przypisanie działałoby dalej w pozostałych procesach, więc wtedy
+pytamy bazę przy każdym sprawdzeniu.
+"""
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+
+from . import dashboard_cache
+from .models import SubjectAssignment
+
+DASHBOARDS = {
+    'admin': 'admin_dashboard',
+    'teacher': 'teacher_panel',
+    'parent': 'parent_panel',
+    'student': 'student_panel',
+}
+
+
+def role_of(user):
+    """Rola, według której kierujemy użytkownika (superuser działa jako admin)."""
+    return 'admin' if user.is_superuser else user.role
+
+
+def has_role(user, *role_names):
+    return user.is_superuser or user.role in role_names
+
+
+def role_required(*role_names):
+    """Wpuszcza zalogowanych użytkowników z jedną z ról (i superusera); obsługuje widoki sync i async."""
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            # Widok async: użytkownika pobieramy przez request.auser(), żeby nie dotykać bazy synchronicznie.
+            @wraps(view_func)
+            async def _async_wrapped_view(request, *args, **kwargs):
+                user = await request.auser()
+                if not user.is_authenticated:
+                    return redirect_to_login(request.get_full_path())
+                request.user = user
+                if not user.has_usable_password():
+                    return redirect('change_password')
+                if has_role(user, *role_names):
+                    return await view_func(request, *args, **kwargs)
+                raise PermissionDenied
+            return _async_wrapped_view
+
+        @wraps(view_func)
+        @login_required
+        def _wrapped_view(request, *args, **kwargs):
+            if not request.user.has_usable_password():
+                return redirect('change_password')
+            if has_role(request.user, *role_names):
+                return view_func(request, *args, **kwargs)
+            raise PermissionDenied
+        return _wrapped_view
+    return decorator
+
+
+def teacher_assignments(teacher_id):
+    """frozenset par (class_group_id, subject_id) przypisanych nauczycielowi."""
+    if not dashboard_cache.enabled():
+        return frozenset(SubjectAssignment.objects.filter(teacher_id=teacher_id).values_list('class_group_id', 'subject_id'))
+    version = dashboard_cache.version(dashboard_cache.ASSIGNMENTS, teacher_id)
+    key = f'permissions:assignments:{teacher_id}:{version}'
+    pairs = cache.get(key)
+    if pairs is None:
+        pairs = frozenset(SubjectAssignment.objects.filter(teacher_id=teacher_id).values_list('class_group_id', 'subject_id'))
+        cache.set(key, pairs, settings.DASHBOARD_CACHE_TIMEOUT)
+    return pairs
+
+
+def teaches(user, class_id, subject_id):
+    """Czy użytkownik może prowadzić dziennik tej klasy z tego przedmiotu (superuser zawsze)."""
+    if user.is_superuser:
+        return True
+    return user.role == 'teacher' and (int(class_id), int(subject_id)) in teacher_assignments(user.id)
+
+
+def assignment_required(view_func):
+    """Dla widoków z class_id i subject_id w adresie: tylko nauczyciel z takim przypisaniem."""
+    @wraps(view_func)
+    def _wrapped_view(request, class_id, subject_id, *args, **kwargs):
+        if not teaches(request.user, class_id, subject_id):
+            raise PermissionDenied
+        return view_func(request, class_id, subject_id, *args, **kwargs)
+    return _wrapped_view
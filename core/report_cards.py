@@ -0,0 +1,142 @@
+"""Świadectwa (oceny i średnie z każdego przedmiotu) dla wszystkich uczniów,
+jako samodzielne pliki HTML gotowe do druku lub konwersji do PDF.
+
+Dane klasy to jedno zapytanie o oceny (kolumny przez values_list, bez
+obiektów Grade) i średnie liczone naraz core.averages.compute - roczne w
+trybie GRADE_AVERAGE_MODE i semestralne (ważone). Proces główny czyta bazę
+klasa po klasie i od razu oddaje gotowe konteksty (same słowniki i liczby)
+do puli procesów, która renderuje szablon i zapisuje pliki. Procesy robocze
+nie dotykają bazy, więc nie potrzebują własnych połączeń.
+
+Plik zapisujemy pod nazwą tymczasową i podmieniamy os.replace, więc
+istniejący plik jest zawsze kompletny - ponowne uruchomienie pomija uczniów,
+którzy już mają świadectwo (chyba że force=True).
+
+Świadectwa powstają tylko dla bieżącego roku: skład klas bierzemy z
+User.class_group, a baza nie pamięta, w której klasie uczeń był rok wcześniej.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.template.loader import render_to_string
+from django.utils.text import slugify
+
+from . import averages, school_years
+from .models import ClassGroup, SchoolYear, User, normalize_search
+
+TEMPLATE = 'core/report_card.html'
+TERMS = (1, 2)
+
+
+def _slug(text):
+    return slugify(normalize_search(text)) or 'x'
+
+
+def card_path(output_dir, school_year, class_name, student):
+    name = f"{_slug(student['last_name'])}_{_slug(student['first_name'])}_{student['id']}.html"
+    return os.path.join(output_dir, school_year.name.replace('/', '-'), _slug(class_name), name)
+
+
+def _columns(rows):
+    return tuple(zip(*rows))[:5] or ((),) * 5
+
+
+def class_cards(class_group, school_year, students, mode=None):
+    """Konteksty świadectw uczniów klasy: jedno zapytanie o oceny, średnie z core.averages."""
+    # Pierwsze pięć kolumn w układzie core.averages.compute (uczeń, przedmiot, wynik, waga, semestr).
+    rows = list(
+        school_years.grades_of(school_year).filter(student_id__in=[student['id'] for student in students])
+        .values_list('student_id', 'subject_id', Cast('score', FloatField()), 'weight', 'term',
+                     'subject__name', 'value', 'modifier')
+        .order_by('subject__name', 'subject_id', 'date_created', 'id')
+    )
+    yearly = averages.compute(_columns(rows), mode)
+    # Średnia semestru to średnia ważona jego ocen (tryb term dzieli na semestry dopiero rok).
+    term_mode = 'simple' if averages.get_mode(mode) == 'simple' else 'weighted'
+    by_term = {term: averages.compute(_columns([row for row in rows if row[4] == term]), term_mode) for term in TERMS}
+
+    subjects = {student['id']: {} for student in students}
+    for student_id, subject_id, _, _, term, subject_name, value, modifier in rows:
+        subject = subjects[student_id].get(subject_id)
+        if subject is None:
+            key = (student_id, subject_id)
+            subject = subjects[student_id][subject_id] = {
+                'id': subject_id, 'name': subject_name, 'marks': {t: [] for t in TERMS}, 'average': yearly.get(key),
+                'term_averages': {t: by_term[t].get(key) for t in TERMS},
+            }
+        subject['marks'][term].append(f'{value}{modifier}')
+
+    today = date.today()
+    cards = []
+    for student in students:
+        rows_for_student = list(subjects[student['id']].values())
+        subject_averages = [subject['average'] for subject in rows_for_student]
+        cards.append({
+            'student': student,
+            'class_name': class_group.name,
+            'school_year': school_year.name,
+            'subjects': rows_for_student,
+            'average': round(sum(subject_averages) / len(subject_averages), 2) if subject_averages else None,
+            'generated_on': today,
+        })
+    return cards
+
+
+def render_card(job):
+    """Renderuje i zapisuje jedno świadectwo (w procesie roboczym). job = (ścieżka, kontekst)."""
+    path, context = job
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write(render_to_string(TEMPLATE, context))
+    os.replace(tmp_path, path)
+    return path
+
+
+def _init_worker():
+    # Przy starcie procesów przez "spawn" (Windows, macOS) Django trzeba załadować od nowa.
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _jobs(output_dir, school_year, class_names, force, mode, counts):
+    groups = ClassGroup.objects.order_by('name')
+    if class_names:
+        groups = groups.filter(name__in=class_names)
+    for group in groups:
+        students = list(User.objects.filter(class_group=group, role='student')
+                        .order_by('last_name', 'first_name', 'id').values('id', 'first_name', 'last_name'))
+        paths = {student['id']: card_path(output_dir, school_year, group.name, student) for student in students}
+        todo = [student for student in students if force or not os.path.exists(paths[student['id']])]
+        counts['skipped'] += len(students) - len(todo)
+        if todo:
+            for card in class_cards(group, school_year, todo, mode):
+                yield paths[card['student']['id']], card
+
+
+def generate(output_dir, school_year=None, class_names=None, workers=None, force=False, mode=None, chunksize=16):
+    """Generuje świadectwa do katalogu output_dir/<rok>/<klasa>/. Zwraca {'generated', 'skipped'}.
+
+    workers=1 renderuje w bieżącym procesie (bez puli). Inny rok niż bieżący -> ValueError.
+    """
+    current = SchoolYear.current()
+    school_year = school_year or current
+    if school_year.id != current.id:
+        raise ValueError(f"Świadectwa można wygenerować tylko dla bieżącego roku szkolnego ({current.name}).")
+    counts = {'generated': 0, 'skipped': 0}
+    jobs = _jobs(output_dir, school_year, class_names, force, mode, counts)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for job in jobs:
+            render_card(job)
+            counts['generated'] += 1
+        return counts
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for _ in pool.map(render_card, jobs, chunksize=chunksize):
+            counts['generated'] += 1
+    return counts
@@ -0,0 +1,76 @@
+"""Lata szkolne: wybór roku w panelach i archiwizacja zamkniętych lat.
+
+Oceny bieżącego roku są w Grade, a indeksy paneli zaczynają się od (uczeń, rok)
+i (przedmiot, rok), więc panel czyta tylko ten rok zamiast całej historii
+ucznia. Po zamknięciu roku archive_year() przenosi jego oceny do GradeArchive
+(manage.py archive_school_year) - tabela Grade przestaje rosnąć z każdym
+rokiem, a stare oceny nadal można obejrzeć w panelu (?year=<id>).
+
+Archiwum to zwykła tabela na każdej bazie, bez partycji PostgreSQL:
+przenosimy wiersze jednym INSERT ... SELECT na paczkę id, co działa tak samo
+na SQLite i PostgreSQL, a migracje nie zależą od backendu.
+"""
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.http import Http404
+from django.utils import timezone
+
+from . import dashboard_cache
+from .models import Grade, GradeArchive, GradeStats, SchoolYear
+
+
+def grades_of(school_year):
+    """Oceny roku - z Grade albo, dla roku zarchiwizowanego, z GradeArchive (te same nazwy pól)."""
+    model = GradeArchive if school_year.archived_at is not None else Grade
+    return model.objects.filter(school_year=school_year)
+
+
+async def aselected(request):
+    """Rok z parametru ?year= (podgląd historii) albo bieżący; nieznany rok -> 404."""
+    current = await SchoolYear.acurrent()
+    year_id = request.GET.get('year')
+    if not year_id or year_id == str(current.id):
+        return current
+    try:
+        return await SchoolYear.objects.aget(id=int(year_id))
+    except (ValueError, SchoolYear.DoesNotExist):
+        raise Http404("Nie ma takiego roku szkolnego.")
+
+
+def archive_year(school_year, batch_size=5000):
+    """Przenosi oceny zamkniętego roku do GradeArchive. Zwraca liczbę przeniesionych ocen.
+
+    Każda paczka id to osobna transakcja (kopia + usunięcie), więc przerwane
+    archiwizowanie można po prostu uruchomić ponownie. archived_at ustawiamy
+    dopiero po przeniesieniu wszystkich ocen.
+    """
+    if not school_year.is_closed:
+        raise ValueError(f"Rok szkolny {school_year.name} jeszcze trwa (do {school_year.end}).")
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in GradeArchive._meta.concrete_fields)
+    copy_sql = (
+        f'INSERT INTO {quote(GradeArchive._meta.db_table)} ({columns}) '
+        f'SELECT {columns} FROM {quote(Grade._meta.db_table)} WHERE school_year_id = %s AND id > %s AND id <= %s'
+    )
+    grades = Grade.objects.filter(school_year=school_year)
+    bounds = grades.aggregate(first=Min('id'), last=Max('id'))
+    moved, student_ids = 0, set()
+    if bounds['last'] is not None:
+        start, boundary = bounds['first'] - 1, bounds['last']
+        while start < boundary:
+            end = min(start + batch_size, boundary)
+            with transaction.atomic():
+                batch = grades.filter(id__gt=start, id__lte=end)
+                student_ids.update(batch.values_list('student_id', flat=True).distinct())
+                with connection.cursor() as cursor:
+                    cursor.execute(copy_sql, [school_year.id, start, end])
+                moved += batch.delete()[0]
+            start = end
+
+    with transaction.atomic():
+        GradeStats.objects.filter(school_year=school_year).delete()
+        school_year.archived_at = timezone.now()
+        school_year.save(update_fields=['archived_at'])
+        dashboard_cache.bump_grades(*student_ids)
+    return moved
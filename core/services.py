@@ -0,0 +1,142 @@
+"""Statystyki ocen dla paneli ucznia, rodzica i nauczyciela.
+
+Średnie liczone są w bazie jednym zapytaniem grupującym po tabeli GradeStats,
+bez tworzenia obiektów Grade tylko po to, żeby je zsumować. Przegląd
+nauczyciela (rozkład ocen 1-6) potrzebuje pojedynczych ocen, więc grupuje
+tabelę Grade - ale też jednym zapytaniem dla wszystkich jego przypisań.
+Sposób liczenia średniej (prosta/ważona) wybiera settings.GRADE_AVERAGE_MODE.
+
+Wszystko liczymy dla jednego roku szkolnego (domyślnie bieżącego). Rok
+zarchiwizowany nie ma już GradeStats, więc jego podsumowanie grupuje
+GradeArchive - to rzadki podgląd historii, nie codzienny panel.
+"""
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+
+from . import averages
+from .grade_stats import TOTALS
+from .models import Grade, GradeArchive, GradeStats, SchoolYear, SubjectAssignment
+
+GRADE_VALUES = [value for value, _ in Grade.VALUE_CHOICES]
+
+
+def _empty_summary():
+    return {'count': 0, 'average': 0, 'subjects': []}
+
+
+def _summary_rows(student_ids, school_year):
+    if school_year.archived_at is not None:
+        return (
+            GradeArchive.objects.filter(student_id__in=student_ids, school_year=school_year)
+            .values('student_id', 'subject_id', 'subject__name')
+            .annotate(count=Count('id'), total=Sum('score'), weighted_total=TOTALS['weighted_sum'],
+                      weight_total=Sum('weight'), last=Max('date_created'))
+            .order_by('student_id', 'subject__name')
+        )
+    return (
+        GradeStats.objects.filter(student_id__in=student_ids, school_year=school_year)
+        .values('student_id', 'subject_id', 'subject__name')
+        .annotate(count=Sum('count'), total=Sum('sum'), weighted_total=Sum('weighted_sum'),
+                  weight_total=Sum('weight_total'), last=Max('last_grade_at'))
+        .order_by('student_id', 'subject__name')
+    )
+
+
+def _build_summary(student_ids, rows):
+    summary = {student_id: _empty_summary() for student_id in student_ids}
+    totals = {student_id: [0, 0, 0, 0] for student_id in student_ids}
+    for row in rows:
+        item = summary[row['student_id']]
+        item['subjects'].append({
+            'id': row['subject_id'],
+            'name': row['subject__name'],
+            'count': row['count'],
+            'average': averages.from_totals(row['count'], row['total'], row['weighted_total'], row['weight_total']),
+            'last_grade_at': row['last'],
+            'grades': [],
+        })
+        item['count'] += row['count']
+        student_totals = totals[row['student_id']]
+        for i, key in enumerate(('count', 'total', 'weighted_total', 'weight_total')):
+            student_totals[i] += row[key]
+    for student_id, item in summary.items():
+        item['average'] = averages.from_totals(*totals[student_id])
+    return summary
+
+
+def grade_summary(student_ids, school_year=None):
+    """Zwraca {student_id: {'count', 'average', 'subjects': [...]}} dla dowolnej liczby uczniów (domyślnie bieżący rok)."""
+    school_year = school_year or SchoolYear.current()
+    return _build_summary(student_ids, _summary_rows(student_ids, school_year))
+
+
+async def agrade_summary(student_ids, school_year=None):
+    """Wersja grade_summary dla widoków async."""
+    school_year = school_year or await SchoolYear.acurrent()
+    return _build_summary(student_ids, [row async for row in _summary_rows(student_ids, school_year)])
+
+
+def student_summary(student_id, school_year=None):
+    return grade_summary([student_id], school_year)[student_id]
+
+
+async def astudent_summary(student_id, school_year=None):
+    return (await agrade_summary([student_id], school_year))[student_id]
+
+
+def attach_grades(summary, grades):
+    """Rozkłada wyświetlane oceny do wierszy przedmiotów podsumowania (jedno przejście)."""
+    by_subject = {subject['id']: subject for subject in summary['subjects']}
+    summary['sixes'] = 0
+    for grade in grades:
+        subject = by_subject.get(grade.subject_id)
+        if subject is not None:
+            subject['grades'].append(grade)
+        if grade.value == 6:
+            summary['sixes'] += 1
+    return summary
+
+
+def _overview_rows(teacher_id, school_year):
+    assignments = SubjectAssignment.objects.filter(teacher_id=teacher_id)
+    assigned = assignments.filter(class_group_id=OuterRef('student__class_group_id'), subject_id=OuterRef('subject_id'))
+    # Zawężenie do przedmiotów nauczyciela i roku pozwala bazie wejść przez grade_subject_year_student_idx
+    # zamiast sprawdzać Exists dla każdej oceny w szkole.
+    return (
+        Grade.objects.filter(subject_id__in=assignments.values('subject_id'), school_year=school_year,
+                             student__class_group_id__in=assignments.values('class_group_id'))
+        .filter(Exists(assigned))
+        .values('student__class_group_id', 'subject_id')
+        .annotate(
+            count=Count('id'), total=Sum('score'), weighted_total=TOTALS['weighted_sum'],
+            weight_total=Sum('weight'), last=Max('date_created'),
+            **{f'value_{value}': Count('id', filter=Q(value=value)) for value in GRADE_VALUES},
+        )
+        .order_by()
+    )
+
+
+def _build_overview(rows):
+    overview = {}
+    for row in rows:
+        count = row['count']
+        overview[row['student__class_group_id'], row['subject_id']] = {
+            'count': count,
+            'average': averages.from_totals(count, row['total'], row['weighted_total'], row['weight_total']),
+            'last_grade_at': row['last'],
+            'distribution': [
+                {'value': value, 'count': row[f'value_{value}'], 'percent': round(row[f'value_{value}'] * 100 / count) if count else 0}
+                for value in GRADE_VALUES
+            ],
+        }
+    return overview
+
+
+def teacher_overview(teacher_id, school_year=None):
+    """Zwraca {(class_group_id, subject_id): {'count', 'average', 'last_grade_at', 'distribution'}}
+    dla wszystkich przypisań nauczyciela - jedno zapytanie grupujące, niezależnie od liczby klas."""
+    return _build_overview(_overview_rows(teacher_id, school_year or SchoolYear.current()))
+
+
+async def ateacher_overview(teacher_id, school_year=None):
+    school_year = school_year or await SchoolYear.acurrent()
+    return _build_overview([row async for row in _overview_rows(teacher_id, school_year)])
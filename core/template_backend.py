@@ -0,0 +1,23 @@
+"""Backend szablonów Django mierzący czas renderowania dla RequestTimingMiddleware."""
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from .middleware import add_template_time
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            add_template_time((time.perf_counter() - start) * 1000)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
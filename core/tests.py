@@ -1,3 +1,1160 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from . import (
+    activation, analytics, averages, dashboard_cache, grade_journal, grade_stats, notifications, permissions, report_cards,
+    services,
+)
+from .models import (
+    AnalyticsRun, ClassGroup, Grade, GradeArchive, GradeCategory, GradeEvent, GradeSnapshot, GradeStats, SchoolYear, Subject,
+    User, SubjectAssignment,
+)
+from .models import normalize_search
+from .pagination import keyset_page, prefix_search
+
+
+class IndexUsageTests(TestCase):
+    """EXPLAIN dla zapytań z widoków - na większej bazie planista musi wybrać indeksy z Meta.indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=20, students_per_class=25, subjects=5, grades_per_student=4,
+                     random_seed=7, stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.student = User.objects.filter(role='student').first()
+        cls.assignment = SubjectAssignment.objects.select_related('class_group', 'subject').first()
+        cls.school_year = SchoolYear.current()
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('EXPLAIN sprawdzany tylko na SQLite i PostgreSQL')
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=f'Plan bez {index_name}:\n{plan}')
+
+    def test_student_panel_grades(self):
+        qs = Grade.objects.filter(student=self.student, school_year=self.school_year).order_by('date_created', 'id')
+        self.assertUsesIndex(qs, 'grade_student_year_date_idx')
+
+    def test_parent_panel_grades_for_children(self):
+        children = User.objects.filter(role='student').values_list('id', flat=True)[:3]
+        qs = Grade.objects.filter(student_id__in=list(children), school_year=self.school_year).order_by('date_created', 'id')
+        self.assertUsesIndex(qs, 'grade_student_year_date_idx')
+
+    def test_class_grades_detail_grades(self):
+        qs = Grade.objects.filter(subject=self.assignment.subject, school_year=self.school_year,
+                                  student__class_group=self.assignment.class_group)
+        self.assertUsesIndex(qs, 'grade_subject_year_student_idx')
+
+    def test_class_grades_detail_students(self):
+        qs = User.objects.filter(class_group=self.assignment.class_group, role='student').order_by('last_name')
+        self.assertUsesIndex(qs, 'user_class_role_name_idx')
+
+    def test_admin_dashboard_students(self):
+        qs = User.objects.filter(role='student').order_by('search_name', 'id')[:51]
+        self.assertUsesIndex(qs, 'user_role_search_idx')
+
+    def test_admin_dashboard_prefix_search(self):
+        qs = prefix_search(User.objects.filter(role='teacher'), 'Kowalski1').order_by('search_name', 'id')
+        self.assertUsesIndex(qs, 'user_role_search_idx')
+
+    def test_teacher_grades_for_cascade(self):
+        qs = Grade.objects.filter(teacher=self.assignment.teacher).values_list('student_id', 'subject_id')
+        self.assertUsesIndex(qs, 'grade_teacher_student_idx')
+
+
+PERF_BASELINE_FILE = Path(__file__).resolve().parent / 'perf_baseline.json'
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        names = [('Łucja', 'Żak'), ('Jan', 'Nowak'), ('Anna', 'Nowak'), ('Ewa', 'Łęcka'), ('Zofia', 'Ćwik'), ('Adam', 'Nowak')]
+        for i, (first, last) in enumerate(names):
+            User.objects.create(email=f'u{i}@szkola.pl', username=f'u{i}@szkola.pl', first_name=first, last_name=last,
+                                role='student')
+        User.objects.create(email='dup@szkola.pl', username='dup@szkola.pl', first_name='Jan', last_name='Nowak', role='student')
+        cls.students = User.objects.filter(role='student')
+        cls.ordered = list(cls.students.order_by('search_name', 'id'))
+
+    def test_normalize_search_folds_polish_letters(self):
+        self.assertEqual(normalize_search('  ŁÓDŹ  Żółć '), 'lodz zolc')
+        self.assertEqual(normalize_search(None), '')
+        self.assertEqual(self.ordered[0].search_name, 'cwik zofia')
+
+    def test_prefix_search_ignores_diacritics_and_case(self):
+        self.assertEqual({u.email for u in prefix_search(self.students, 'ŁĘC')}, {'u3@szkola.pl'})
+        self.assertEqual({u.email for u in prefix_search(self.students, 'zak')}, {'u0@szkola.pl'})
+        self.assertEqual(prefix_search(self.students, 'nowak j').count(), 2)
+        self.assertEqual({u.email for u in prefix_search(self.students, 'U4@Szkola')}, {'u4@szkola.pl'})
+        self.assertEqual(prefix_search(self.students, '  ').count(), self.students.count())
+
+    def test_pages_forward_and_back_across_ties(self):
+        # Dwóch "Nowak Jan" ma ten sam search_name - granica strony wypada między nimi.
+        first = keyset_page(self.students, 5)
+        self.assertEqual(list(first), self.ordered[:5])
+        self.assertEqual((first.has_previous, first.has_next), (False, True))
+        self.assertEqual((self.ordered[4].search_name, self.ordered[5].search_name), ('nowak jan', 'nowak jan'))
+
+        second = keyset_page(self.students, 5, after=first.next_cursor)
+        self.assertEqual(list(second), self.ordered[5:])
+        self.assertEqual((second.has_previous, second.has_next, second.next_cursor), (True, False, None))
+
+        back = keyset_page(self.students, 5, before=second.previous_cursor)
+        self.assertEqual(list(back), self.ordered[:5])
+        self.assertFalse(back.has_previous)
+        self.assertTrue(back.has_next)
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        self.assertEqual(list(keyset_page(self.students, 3, after='abc')), self.ordered[:3])
+        self.assertEqual(list(keyset_page(self.students, 3, before='999999')), self.ordered[:3])
+
+
+def use_shared_cache(test, **extra_settings):
+    """Wspólny (plikowy) cache w katalogu tymczasowym do końca testu - jak CACHE_URL=filecache://..."""
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    override = override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmp.name},
+    }, **extra_settings)
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+class DashboardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=1, students_per_class=2, subjects=1, teachers=1, grades_per_student=2,
+                     random_seed=5, stdout=StringIO())
+        cls.assignment = SubjectAssignment.objects.select_related('teacher').first()
+        cls.student = User.objects.filter(role='student').order_by('id').first()
+
+    def setUp(self):
+        cache.clear()
+        self.renders = 0
+
+    def fragment(self):
+        def context():
+            self.renders += 1
+            return {'school_years': []}
+        key = [self.student.id, dashboard_cache.version('grades', self.student.id)]
+        return dashboard_cache.render_fragment('test', key, 'core/fragments/school_year_picker.html', context)
+
+    def test_hit_miss_and_invalidation(self):
+        self.fragment()
+        self.fragment()
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(dashboard_cache.stats(), {'hits': 1, 'misses': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard_cache.bump_grades(self.student.id)
+        self.fragment()
+        self.assertEqual(self.renders, 2)
+        self.assertEqual(dashboard_cache.stats(), {'hits': 1, 'misses': 2})
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_locmem_with_many_workers_bypasses_cache(self):
+        self.assertFalse(dashboard_cache.enabled())
+        self.assertIsNone(dashboard_cache.version('grades', self.student.id))
+        self.fragment()
+        self.fragment()
+        self.assertEqual(self.renders, 2)
+        self.assertEqual(dashboard_cache.stats(), {'hits': 0, 'misses': 0})
+
+        # ETag API z treści: dalej 304 dla niezmienionych danych, 200 po nowej ocenie.
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('api_student'))
+        self.assertEqual(self.client.get(reverse('api_student'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Grade.objects.create(student=self.student, teacher=self.assignment.teacher, subject=self.assignment.subject, value='5')
+        self.assertEqual(self.client.get(reverse('api_student'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_assignments_are_cached_only_when_cache_is_enabled(self):
+        teacher_id = self.assignment.teacher_id
+        permissions.teacher_assignments(teacher_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(permissions.teacher_assignments(teacher_id)), 1)
+
+        with self.settings(WEB_CONCURRENCY=4):
+            with self.assertNumQueries(1):
+                permissions.teacher_assignments(teacher_id)
+            SubjectAssignment.objects.filter(teacher_id=teacher_id).delete()  # bez bump_assignments, jak w innym procesie
+            self.assertEqual(permissions.teacher_assignments(teacher_id), frozenset())
+
+        use_shared_cache(self, WEB_CONCURRENCY=4)
+        permissions.teacher_assignments(teacher_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(permissions.teacher_assignments(teacher_id), frozenset())
+        SubjectAssignment.objects.create(teacher_id=teacher_id, class_group_id=self.student.class_group_id,
+                                         subject_id=self.assignment.subject_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard_cache.bump_assignments(teacher_id)
+        self.assertEqual(len(permissions.teacher_assignments(teacher_id)), 1)
+
+
+class ViewPerformanceTests(TestCase):
+    """Limit zapytań SQL i regresja czasu odpowiedzi dla każdego adresu z config/urls.py.
+
+    Limit zapytań obowiązuje zawsze - liczba zapytań nie zależy od maszyny.
+    Czas jest porównywany z core/perf_baseline.json tylko przy PERF_CHECK_LATENCY=1
+    (na tej samej maszynie, na której nagrano plik): widok wolniejszy niż
+    PERF_MAX_SLOWDOWN x baseline (domyślnie 2x) i jednocześnie o więcej niż
+    PERF_MIN_DELTA_MS (szum pomiarowy) to błąd, tak samo jak widok bez czasu
+    bazowego. Plik zapisuje tylko uruchomienie z PERF_UPDATE_BASELINE=1.
+    """
+    RUNS = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=6, students_per_class=20, subjects=5, grades_per_student=4,
+                     random_seed=42, stdout=StringIO())
+        cls.admin = User.objects.create(email='sekretariat@szkola.pl', username='sekretariat@szkola.pl', role='admin')
+        cls.superuser = User.objects.get(email='admin@szkola.pl')  # konto z migracji 0002
+        cls.assignment = SubjectAssignment.objects.select_related('teacher').order_by('id').first()
+        cls.teacher = cls.assignment.teacher
+        cls.student = User.objects.filter(role='student', class_group=cls.assignment.class_group).order_by('id').first()
+        cls.parent = cls.student.parent
+        cls.grade = Grade.objects.filter(teacher=cls.teacher, student=cls.student, subject=cls.assignment.subject).first()
+        cls.empty_class = ClassGroup.objects.create(name='9Z')
+        cls.free_subject = Subject.objects.create(name='Astronomia')
+        newcomer = User(email='nowy@szkola.pl', username='nowy@szkola.pl', role='teacher')
+        cls.activation_token = activation.issue(newcomer)
+        newcomer.save()
+        cls.results = {}
+
+    def setUp(self):
+        cache.clear()
+
+    def cases(self):
+        """(nazwa, użytkownik, metoda, adres, dane POST, maks. liczba zapytań)"""
+        a, t, s = self.assignment, self.teacher, self.student
+        grades_url = reverse('class_grades_detail', args=[a.class_group_id, a.subject_id])
+        return [
+            ('login', None, 'get', reverse('login'), None, 0),
+            ('logout', s, 'post', reverse('logout'), {}, 4),
+            ('dashboard_router', s, 'get', reverse('dashboard_router'), None, 2),
+            ('student_panel', s, 'get', reverse('student_panel'), None, 8),
+            ('parent_panel', self.parent, 'get', reverse('parent_panel'), None, 9),
+            ('student_events', s, 'get', reverse('student_events') + '?after=0', None, 3),
+            ('parent_events', self.parent, 'get', reverse('parent_events') + '?after=0', None, 4),
+            ('student_stream', s, 'get', reverse('student_stream'), None, 2),
+            ('api_student', s, 'get', reverse('api_student'), None, 6),
+            ('api_parent', self.parent, 'get', reverse('api_parent'), None, 7),
+            ('api_teacher', t, 'get', reverse('api_teacher'), None, 5),
+            ('api_class_grades', t, 'get', reverse('api_class_grades', args=[a.class_group_id, a.subject_id]), None, 9),
+            ('parent_stream', self.parent, 'get', reverse('parent_stream'), None, 2),
+            ('teacher_panel', t, 'get', reverse('teacher_panel'), None, 5),
+            ('admin_dashboard', self.admin, 'get', reverse('admin_dashboard'), None, 12),
+            ('admin_dashboard_search', self.admin, 'get', reverse('admin_dashboard') + '?student_q=studentowski1', None, 12),
+            ('teacher_details', self.admin, 'get', reverse('teacher_details', args=[t.id]), None, 5),
+            ('edit_teacher', self.admin, 'get', reverse('edit_teacher', args=[t.id]), None, 3),
+            ('edit_student_family', self.admin, 'get', reverse('edit_student_family', args=[s.id]), None, 5),
+            ('delete_class', self.admin, 'get', reverse('delete_class', args=[self.empty_class.id]), None, 8),
+            ('delete_subject', self.admin, 'get', reverse('delete_subject', args=[self.free_subject.id]), None, 14),
+            ('delete_teacher', self.admin, 'get', reverse('delete_teacher', args=[t.id]), None, 29),
+            ('delete_student_family', self.admin, 'get', reverse('delete_student_family', args=[s.id]), None, 32),
+            ('remove_assignment', self.admin, 'get', reverse('remove_assignment', args=[a.id]), None, 5),
+            ('class_grades_detail', t, 'get', grades_url, None, 9),
+            ('class_grades_detail_add', t, 'post', grades_url,
+             {'action': 'add_grade', 'student_id': s.id, 'value': '5', 'comment': 'Test'}, 15),
+            ('class_grades_detail_edit', t, 'post', grades_url,
+             {'action': 'edit_grade', 'grade_id': self.grade.id, 'value': '2', 'comment': 'Test'}, 12),
+            ('class_grades_detail_delete', t, 'post', grades_url,
+             {'action': 'delete_grade', 'grade_id': self.grade.id}, 16),
+            ('class_grades_detail_bulk', t, 'post', grades_url, self.bulk_data(), 15),
+            ('import_families', self.admin, 'get', reverse('import_families'), None, 2),
+            ('export_class_grades', t, 'get', reverse('export_class_grades', args=[a.class_group_id, a.subject_id]), None, 6),
+            ('export_school_grades', self.admin, 'get', reverse('export_school_grades'), None, 4),
+            ('activate_account', None, 'get', reverse('activate_account', args=[self.activation_token]), None, 9),
+            ('change_password', s, 'get', reverse('change_password'), None, 2),
+            ('django_admin', self.superuser, 'get', reverse('admin:index'), None, 3),
+        ]
+
+    def bulk_data(self):
+        students = User.objects.filter(class_group=self.assignment.class_group, role='student').order_by('id')
+        data = {'action': 'bulk_grades', 'bulk-TOTAL_FORMS': len(students), 'bulk-INITIAL_FORMS': len(students)}
+        for i, student in enumerate(students):
+            data.update({f'bulk-{i}-student_id': student.id, f'bulk-{i}-value': '4', f'bulk-{i}-comment': 'Kartkówka'})
+        return data
+
+    def measure(self, user, method, url, data):
+        """Jedno wywołanie w savepoincie wycofywanym po pomiarze - kolejne przypadki widzą te same dane."""
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, method)(url, data) if data is not None else getattr(client, method)(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)  # zapytania eksportu wykonują się dopiero przy czytaniu
+                elapsed = (time.perf_counter() - start) * 1000
+            transaction.set_rollback(True)
+        return response, len(queries), elapsed
+
+    def test_every_url_is_covered(self):
+        names = {p.name for p in get_resolver().url_patterns if getattr(p, 'name', None)}
+        covered = {name for name, *_ in self.cases()}
+        self.assertFalse(names - covered, msg='Dodaj nowe widoki do ViewPerformanceTests.cases()')
+
+    def test_query_counts_and_latency(self):
+        update = bool(os.environ.get('PERF_UPDATE_BASELINE'))
+        check_latency = bool(os.environ.get('PERF_CHECK_LATENCY'))
+        baseline = json.loads(PERF_BASELINE_FILE.read_text()) if PERF_BASELINE_FILE.exists() else {}
+        max_slowdown = float(os.environ.get('PERF_MAX_SLOWDOWN', 2.0))
+        min_delta = float(os.environ.get('PERF_MIN_DELTA_MS', 15))
+        timings = {}
+        for name, user, method, url, data, max_queries in self.cases():
+            with self.subTest(view=name):
+                runs = [self.measure(user, method, url, data) for _ in range(self.RUNS)]
+                response, num_queries, _ = runs[-1]
+                self.assertLess(response.status_code, 400, msg=f'{name}: HTTP {response.status_code}')
+                self.assertLessEqual(num_queries, max_queries, msg=f'{name}: {num_queries} zapytań SQL')
+                timings[name] = round(statistics.median(r[2] for r in runs), 2)
+                if update or not check_latency:
+                    continue
+                self.assertIn(name, baseline, msg=f'{name}: brak czasu bazowego w {PERF_BASELINE_FILE.name} - '
+                                                  'uruchom testy z PERF_UPDATE_BASELINE=1 i dodaj plik do commita')
+                limit = max(baseline[name] * max_slowdown, baseline[name] + min_delta)
+                self.assertLessEqual(timings[name], limit, msg=f'{name}: {timings[name]} ms, baseline {baseline[name]} ms')
+        if update:
+            PERF_BASELINE_FILE.write_text(json.dumps(timings, indent=2, sort_keys=True) + '\n')
+
+
+class BulkGradeEntryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=2, students_per_class=3, subjects=1, teachers=1, grades_per_student=0,
+                     random_seed=13, stdout=StringIO())
+        cls.assignment = SubjectAssignment.objects.select_related('teacher', 'class_group', 'subject').order_by('id').first()
+        cls.students = list(User.objects.filter(role='student', class_group=cls.assignment.class_group).order_by('id'))
+        cls.outsider = User.objects.filter(role='student').exclude(class_group=cls.assignment.class_group).first()
+
+    def setUp(self):
+        self.client.force_login(self.assignment.teacher)
+
+    def post(self, rows):
+        data = {'action': 'bulk_grades', 'bulk-TOTAL_FORMS': len(rows), 'bulk-INITIAL_FORMS': len(rows)}
+        for i, (student, value, comment) in enumerate(rows):
+            data.update({f'bulk-{i}-student_id': student.id, f'bulk-{i}-value': value, f'bulk-{i}-comment': comment})
+        url = reverse('class_grades_detail', args=[self.assignment.class_group_id, self.assignment.subject_id])
+        return self.client.post(url, data)
+
+    def test_creates_grades_and_updates_stats(self):
+        first, second, third = self.students
+        response = self.post([(first, '5', 'Kartkówka'), (second, '3+', ''), (third, '', '')])
+        self.assertEqual(response.status_code, 302)
+        grades = Grade.objects.filter(subject=self.assignment.subject).order_by('student_id')
+        self.assertEqual([(g.student_id, g.mark, g.comment, g.teacher_id) for g in grades], [
+            (first.id, '5', 'Kartkówka', self.assignment.teacher_id), (second.id, '3+', '', self.assignment.teacher_id),
+        ])
+        stats = {s.student_id: s for s in GradeStats.objects.filter(subject=self.assignment.subject)}
+        self.assertEqual(set(stats), {first.id, second.id})
+        self.assertEqual((stats[first.id].count, stats[first.id].sum), (1, Decimal('5')))
+        self.assertEqual(stats[second.id].sum, grades[1].score)
+
+    def test_row_errors_are_reported_and_nothing_is_saved(self):
+        first, second, _ = self.students
+        response = self.post([(first, '5', ''), (second, '', 'Bez oceny')])
+        self.assertEqual(response.status_code, 200)
+        forms = response.context['bulk_formset'].forms
+        self.assertFalse(forms[0].errors)
+        self.assertIn('Komentarz bez oceny', forms[1].non_field_errors()[0])
+        self.assertFalse(Grade.objects.exists())
+
+    def test_empty_formset_is_rejected(self):
+        response = self.post([(student, '', '') for student in self.students])
+        self.assertEqual(response.context['bulk_formset'].non_form_errors(), ['Nie wpisano żadnej oceny.'])
+        self.assertFalse(Grade.objects.exists())
+
+    def test_student_from_another_class_is_rejected(self):
+        response = self.post([(self.students[0], '4', ''), (self.outsider, '1', '')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['bulk_formset'].forms[1].non_field_errors(), ['Uczeń nie należy do tej klasy.'])
+        self.assertFalse(Grade.objects.exists())
+        self.assertFalse(GradeStats.objects.exists())
+
+
+class GradeExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=2, students_per_class=3, subjects=2, grades_per_student=2,
+                     random_seed=3, stdout=StringIO())
+        cls.assignment = SubjectAssignment.objects.select_related('teacher').order_by('id').first()
+
+    def read_csv(self, response):
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(content.splitlines(), delimiter=';'))
+
+    def test_class_export_contains_only_that_class_and_subject(self):
+        a = self.assignment
+        self.client.force_login(a.teacher)
+        rows = self.read_csv(self.client.get(reverse('export_class_grades', args=[a.class_group_id, a.subject_id])))
+        self.assertEqual(rows[0][0], 'Klasa')
+        self.assertEqual(len(rows) - 1, Grade.objects.filter(subject=a.subject, student__class_group=a.class_group).count())
+        self.assertEqual({(row[0], row[1]) for row in rows[1:]}, {(a.class_group.name, a.subject.name)})
+
+    def test_class_export_requires_own_assignment(self):
+        other = SubjectAssignment.objects.exclude(teacher=self.assignment.teacher).first()
+        self.client.force_login(self.assignment.teacher)
+        response = self.client.get(reverse('export_class_grades', args=[other.class_group_id, other.subject_id]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_school_export_streams_every_grade(self):
+        self.client.force_login(User.objects.create(email='sekretariat@szkola.pl', username='sekretariat@szkola.pl', role='admin'))
+        rows = self.read_csv(self.client.get(reverse('export_school_grades')))
+        self.assertEqual(len(rows) - 1, Grade.objects.count())
+
+    def test_formula_cells_are_escaped(self):
+        a = self.assignment
+        student = User.objects.filter(class_group=a.class_group, role='student').order_by('id').first()
+        User.objects.filter(id=student.id).update(last_name='=HYPERLINK("http://x")', first_name='@Jan')
+        Grade.objects.filter(student=student, subject=a.subject).update(comment='-2+3')
+        self.client.force_login(a.teacher)
+        rows = self.read_csv(self.client.get(reverse('export_class_grades', args=[a.class_group_id, a.subject_id])))
+        row = next(row for row in rows[1:] if row[4] == student.email)
+        self.assertEqual(row[2:4], ["'=HYPERLINK(\"http://x\")", "'@Jan"])
+        self.assertEqual(row[8], "'-2+3")
+        self.assertFalse([cell for row in rows[1:] for cell in row if cell[:1] in '=+-@'])
+
+    async def test_asgi_export_streams_asynchronously(self):
+        client = AsyncClient()
+        await client.aforce_login(await User.objects.acreate(email='sekretariat@szkola.pl', username='sekretariat@szkola.pl', role='admin'))
+        response = await client.get(reverse('export_school_grades'))
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8-sig')
+        self.assertEqual(len(content.splitlines()) - 1, await Grade.objects.acount())
+
+
+class FamilyImportTests(TestCase):
+    HEADER = 'imie_ucznia;nazwisko_ucznia;email_ucznia;klasa;imie_rodzica;nazwisko_rodzica;email_rodzica\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = ClassGroup.objects.create(name='1A')
+        cls.admin = User.objects.create(email='sekretariat@szkola.pl', username='sekretariat@szkola.pl', role='admin')
+        User.objects.create(email='zajety@szkola.pl', username='zajety@szkola.pl', role='teacher')
+
+    def write_csv(self, rows):
+        path = os.path.join(self.tmp, 'rodziny.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.HEADER + ''.join(row + '\n' for row in rows))
+        return path
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def test_command_imports_valid_rows_and_reports_invalid(self):
+        path = self.write_csv([
+            'Łucja;Żak;lucja@szkola.pl;1a;Anna;Żak;anna@poczta.pl',
+            'Piotr;Żak;piotr@szkola.pl;1A;Anna;Żak;anna@poczta.pl',    # rodzeństwo
+            'Jan2;Nowak;jan@szkola.pl;1A;Ewa;Nowak;ewa@poczta.pl',      # cyfra w imieniu
+            'Ola;Kot;ola@szkola.pl;7Z;Ewa;Kot;ewa.kot@poczta.pl',       # nie ma klasy
+            'Adam;Lis;lucja@szkola.pl;1A;Iza;Lis;iza@poczta.pl',        # e-mail ucznia powtórzony
+            'Adam;Mak;adam@szkola.pl;1A;Zenon;Mak;zajety@szkola.pl',    # e-mail rodzica to konto nauczyciela
+        ])
+        report = os.path.join(self.tmp, 'bledy.csv')
+        links = os.path.join(self.tmp, 'linki.csv')
+        err = StringIO()
+        call_command('import_families', path, batch_size=2, report=report, activations=links,
+                     stdout=StringIO(), stderr=err)
+
+        students = User.objects.filter(role='student').order_by('email')
+        self.assertEqual([s.email for s in students], ['lucja@szkola.pl', 'piotr@szkola.pl'])
+        self.assertEqual({s.parent.email for s in students}, {'anna@poczta.pl'})
+        self.assertEqual(User.objects.filter(role='parent').count(), 1)
+        self.assertEqual(students[0].class_group, self.group)
+        self.assertEqual(students[0].search_name, 'zak lucja')
+        self.assertFalse(students[0].has_usable_password())
+        self.assertTrue(students[0].activation_token)
+        with open(report, encoding='utf-8-sig') as f:
+            lines = [row.split(';')[0] for row in f.read().splitlines()[1:]]
+        self.assertEqual(lines, ['4', '5', '6', '7'])
+        self.assertIn('linia 5: Klasa ucznia: Nie ma klasy 7Z.', err.getvalue())
+        with open(links, encoding='utf-8-sig') as f:
+            self.assertEqual(len(f.read().splitlines()), 1 + 3)  # dwoje uczniów i jeden rodzic
+
+    def test_command_refuses_to_import_without_activation_links(self):
+        path = self.write_csv(['Łucja;Żak;lucja@szkola.pl;1A;Anna;Żak;anna@poczta.pl'])
+        with self.assertRaisesMessage(CommandError, '--activations'):
+            call_command('import_families', path, stdout=StringIO(), stderr=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('import_families', path, activations=os.path.join(self.tmp, 'brak', 'linki.csv'), stdout=StringIO())
+        self.assertFalse(User.objects.filter(role__in=['student', 'parent']).exists())
+
+    def test_encoding_error_late_in_file_creates_no_accounts(self):
+        # Zły bajt za pierwszym buforem dekodera (8 KB), po kilku paczkach poprawnych wierszy.
+        rows = ''.join(f'Jan;Nowak;jan{i}@szkola.pl;1A;Ewa;Nowak;ewa{i}@poczta.pl\n' for i in range(300))
+        path = os.path.join(self.tmp, 'rodziny.csv')
+        with open(path, 'wb') as f:
+            f.write((self.HEADER + rows).encode('utf-8') + b'Ola;\xff;ola@szkola.pl;1A;Iza;Kot;iza@poczta.pl\n')
+        links = os.path.join(self.tmp, 'linki.csv')
+        with self.assertRaisesMessage(CommandError, 'UTF-8'):
+            call_command('import_families', path, batch_size=50, activations=links, stdout=StringIO())
+        self.assertFalse(User.objects.filter(role__in=['student', 'parent']).exists())
+
+        self.client.force_login(self.admin)
+        with open(path, 'rb') as f:
+            response = self.client.post(reverse('import_families'), {'file': SimpleUploadedFile('rodziny.csv', f.read())})
+        self.assertContains(response, 'UTF-8')
+        self.assertFalse(User.objects.filter(role__in=['student', 'parent']).exists())
+
+    def test_admin_upload(self):
+        self.client.force_login(self.admin)
+        upload = SimpleUploadedFile('rodziny.csv', (
+            self.HEADER.replace(';', ',') + 'Łucja,Żak,lucja@szkola.pl,1A,Anna,Żak,anna@poczta.pl\n'
+        ).encode('utf-8-sig'))
+        response = self.client.post(reverse('import_families'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.filter(email='lucja@szkola.pl', parent__email='anna@poczta.pl').exists())
+
+    def test_missing_columns(self):
+        self.client.force_login(self.admin)
+        upload = SimpleUploadedFile('rodziny.csv', b'imie;nazwisko\nJan;Nowak\n')
+        response = self.client.post(reverse('import_families'), {'file': upload})
+        self.assertContains(response, 'Brak kolumn')
+
+
+class AssignmentPermissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=2, students_per_class=2, subjects=2, teachers=2, random_seed=9, stdout=StringIO())
+        cls.assignment = SubjectAssignment.objects.select_related('teacher').order_by('id').first()
+        cls.teacher = cls.assignment.teacher
+        cls.foreign = SubjectAssignment.objects.exclude(teacher=cls.teacher).first()
+        cls.admin = User.objects.create(email='sekretariat@szkola.pl', username='sekretariat@szkola.pl', role='admin')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.teacher)
+
+    def url(self, assignment):
+        return reverse('class_grades_detail', args=[assignment.class_group_id, assignment.subject_id])
+
+    def test_teacher_cannot_open_foreign_class(self):
+        self.assertEqual(self.client.get(self.url(self.foreign)).status_code, 403)
+        self.assertEqual(self.client.post(self.url(self.foreign), {
+            'action': 'add_grade', 'student_id': User.objects.filter(role='student').first().id, 'value': '1',
+        }).status_code, 403)
+
+    def test_cannot_edit_or_delete_own_grade_from_another_gradebook(self):
+        other = Grade.objects.create(
+            student=User.objects.filter(role='student', class_group=self.foreign.class_group).first(),
+            teacher=self.teacher, subject=self.foreign.subject, value='3',
+        )
+        url = self.url(self.assignment)
+        self.assertEqual(self.client.post(url, {'action': 'edit_grade', 'grade_id': other.id, 'value': '1'}).status_code, 404)
+        self.assertEqual(self.client.post(url, {'action': 'delete_grade', 'grade_id': other.id}).status_code, 404)
+        other.refresh_from_db()
+        self.assertEqual(other.mark, '3')
+
+    def test_cannot_grade_student_from_another_class(self):
+        outsider = User.objects.filter(role='student').exclude(class_group=self.assignment.class_group).first()
+        grades = Grade.objects.count()
+        response = self.client.post(self.url(self.assignment), {'action': 'add_grade', 'student_id': outsider.id, 'value': '1'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Grade.objects.count(), grades)
+
+    def test_permission_check_costs_no_query_when_cached(self):
+        self.client.get(self.url(self.assignment))
+        with CaptureQueriesContext(connection) as teacher_queries:
+            self.assertEqual(self.client.get(self.url(self.assignment)).status_code, 200)
+        self.assertFalse([q for q in teacher_queries if 'core_subjectassignment' in q['sql']])
+        superuser = Client()
+        superuser.force_login(User.objects.get(email='admin@szkola.pl'))
+        superuser.get(self.url(self.assignment))
+        with CaptureQueriesContext(connection) as superuser_queries:
+            superuser.get(self.url(self.assignment))
+        self.assertEqual(len(teacher_queries), len(superuser_queries))
+
+    def test_new_assignment_is_visible_immediately(self):
+        self.assertEqual(self.client.get(self.url(self.foreign)).status_code, 403)
+        admin = Client()
+        admin.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.post(reverse('admin_dashboard'), {
+                'action': 'assign_teacher', 'teacher': self.teacher.id,
+                'subject': self.foreign.subject_id, 'class_group': self.foreign.class_group_id,
+            })
+        self.assertEqual(self.client.get(self.url(self.foreign)).status_code, 200)
+
+    def test_dashboard_router(self):
+        self.assertRedirects(self.client.get(reverse('dashboard_router')), reverse('teacher_panel'))
+
+
+class TeacherOverviewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=6, students_per_class=4, subjects=3, teachers=2, grades_per_student=3,
+                     random_seed=11, stdout=StringIO())
+        cls.teacher = SubjectAssignment.objects.values_list('teacher', flat=True).annotate(n=Count('id')).order_by('-n').first()
+        cls.teacher = User.objects.get(id=cls.teacher)
+
+    def test_stats_match_grades_and_use_one_query(self):
+        school_year = SchoolYear.current()
+        with self.assertNumQueries(1):
+            overview = services.teacher_overview(self.teacher.id, school_year)
+        assignments = SubjectAssignment.objects.filter(teacher=self.teacher)
+        self.assertEqual(set(overview), {(a.class_group_id, a.subject_id) for a in assignments})
+        for a in assignments:
+            grades = Grade.objects.filter(subject=a.subject, student__class_group=a.class_group)
+            values = list(grades.values_list('value', flat=True))
+            weighted = float(sum(g.score * g.weight for g in grades)) / sum(g.weight for g in grades)
+            stats = overview[a.class_group_id, a.subject_id]
+            self.assertEqual(stats['count'], len(values))
+            self.assertEqual(stats['average'], round(weighted, 2))
+            self.assertEqual([d['count'] for d in stats['distribution']], [values.count(v) for v in range(1, 7)])
+
+    def test_panel_shows_new_grade(self):
+        cache.clear()
+        a = SubjectAssignment.objects.filter(teacher=self.teacher).first()
+        self.client.force_login(self.teacher)
+        count = services.teacher_overview(self.teacher.id)[a.class_group_id, a.subject_id]['count']
+        self.assertContains(self.client.get(reverse('teacher_panel')), f'Ocen: <strong class="text-dark">{count}</strong>')
+        student = User.objects.filter(class_group=a.class_group, role='student').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('class_grades_detail', args=[a.class_group_id, a.subject_id]),
+                             {'action': 'add_grade', 'student_id': student.id, 'value': '6'})
+        self.assertContains(self.client.get(reverse('teacher_panel')), f'Ocen: <strong class="text-dark">{count + 1}</strong>')
+
+
+class AnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=3, students_per_class=4, subjects=3, grades_per_student=3,
+                     random_seed=13, stdout=StringIO())
+        Grade.objects.update(date_created=timezone.now() - timedelta(days=20))
+
+    def snapshot_totals(self):
+        return sorted(GradeSnapshot.objects.values_list(
+            'week', 'class_group_id', 'subject_id', 'teacher_id', 'count', 'sum', 'value_1', 'value_6'))
+
+    def test_incremental_run_matches_full_recompute(self):
+        call_command('compute_analytics', stdout=StringIO())
+        self.assertEqual(GradeSnapshot.objects.aggregate(n=Sum('count'))['n'], Grade.objects.count())
+        AnalyticsRun.objects.update(processed_until=timezone.now() - timedelta(days=5))  # "wczorajszy" przebieg
+
+        grade = Grade.objects.first()
+        new = Grade.objects.bulk_create([
+            Grade(student_id=grade.student_id, subject_id=grade.subject_id, teacher_id=grade.teacher_id, value=v, score=v,
+                  school_year_id=grade.school_year_id, term=grade.term)
+            for v in (1, 6, 6)
+        ])
+        Grade.objects.filter(id__in=[g.id for g in new]).update(date_created=timezone.now() - timedelta(days=2))
+        call_command('compute_analytics', incremental=True, stdout=StringIO())
+        self.assertEqual(AnalyticsRun.objects.latest('id').grades_processed, 3)
+        incremental = self.snapshot_totals()
+
+        call_command('compute_analytics', stdout=StringIO())
+        self.assertEqual(incremental, self.snapshot_totals())
+
+    def test_admin_dashboard_reads_snapshots(self):
+        analytics.compute()
+        admin = User.objects.create(email='sekretariat@szkola.pl', username='sekretariat@szkola.pl', role='admin')
+        self.client.force_login(admin)
+        cache.clear()
+        self.client.get(reverse('admin_dashboard'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertContains(response, 'Ranking klas')
+        self.assertFalse([q for q in queries if 'core_grade"' in q['sql'] or 'core_grade ' in q['sql']])
+
+
+class GradeAveragingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=2, students_per_class=3, subjects=2, teachers=2, grades_per_student=4,
+                     random_seed=17, stdout=StringIO())
+        cls.assignment = SubjectAssignment.objects.select_related('teacher').order_by('id').first()
+        cls.student = User.objects.filter(role='student', class_group=cls.assignment.class_group).order_by('id').first()
+        cls.test = GradeCategory.objects.get(name='Sprawdzian')
+
+    def setUp(self):
+        self.client.force_login(self.assignment.teacher)
+        self.url = reverse('class_grades_detail', args=[self.assignment.class_group_id, self.assignment.subject_id])
+
+    def assertStatsFresh(self):
+        fresh = Grade.objects.values_list(*grade_stats.KEY).annotate(**grade_stats.TOTALS).order_by(*grade_stats.KEY)
+        self.assertEqual(
+            list(GradeStats.objects.values_list(*grade_stats.KEY, *grade_stats.FIELDS).order_by(*grade_stats.KEY)),
+            list(fresh),
+        )
+
+    def test_modes(self):
+        # 5 (waga 3) i 4- (waga 1) w semestrze 1, 2+ (waga 2) w semestrze 2
+        columns = ((1, 1, 1), (5, 5, 5), (Decimal('5'), Decimal('3.75'), Decimal('2.5')), (3, 1, 2), (1, 1, 2))
+        for mode, expected in (('simple', 3.75), ('weighted', 3.96), ('term', 3.59)):
+            self.assertEqual(averages.compute(columns, mode), {(1, 5): expected})
+            self.assertEqual(averages._python_averages(*columns, mode), {(1, 5): expected})
+        with self.assertRaises(ValueError):
+            averages.compute(columns, 'median')
+
+    def test_school_averages_match_grade_stats(self):
+        with self.assertNumQueries(1):
+            school = averages.school_averages('weighted')
+        self.assertEqual(school, {
+            (s.student_id, s.subject_id): averages.from_totals(s.count, s.sum, s.weighted_sum, s.weight_total, 'weighted')
+            for s in GradeStats.objects.all()
+        })
+
+    def test_plus_minus_and_category_in_gradebook(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'action': 'add_grade', 'student_id': self.student.id, 'value': '4+', 'category': self.test.id})
+        grade = Grade.objects.latest('id')
+        self.assertEqual((grade.mark, grade.score, grade.weight), ('4+', Decimal('4.5'), 3))
+        self.client.post(self.url, {'action': 'edit_grade', 'grade_id': grade.id, 'value': '2-', 'category': ''})
+        grade.refresh_from_db()
+        self.assertEqual((grade.mark, grade.score, grade.weight, grade.category), ('2-', Decimal('1.75'), 1, None))
+        self.assertStatsFresh()
+
+        count = Grade.objects.count()
+        self.client.post(self.url, {'action': 'add_grade', 'student_id': self.student.id, 'value': '6+'})
+        self.assertEqual(Grade.objects.count(), count)
+
+    def test_category_weight_change_reweights_existing_grades(self):
+        self.client.force_login(User.objects.get(email='admin@szkola.pl'))
+        self.client.post(reverse('admin:core_gradecategory_change', args=[self.test.id]), {'name': self.test.name, 'weight': 5})
+        self.assertEqual(set(Grade.objects.filter(category=self.test).values_list('weight', flat=True)), {5})
+        self.assertStatsFresh()
+
+
+class GradeJournalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=2, students_per_class=2, subjects=2, teachers=2, grades_per_student=2,
+                     random_seed=23, stdout=StringIO())
+        cls.assignment = SubjectAssignment.objects.select_related('teacher').order_by('id').first()
+        cls.student = User.objects.filter(role='student', class_group=cls.assignment.class_group).order_by('id').first()
+        cls.other = User.objects.filter(role='student').exclude(parent=cls.student.parent).order_by('id').first()
+
+    def setUp(self):
+        self.client.force_login(self.assignment.teacher)
+        self.url = reverse('class_grades_detail', args=[self.assignment.class_group_id, self.assignment.subject_id])
+
+    def test_grade_changes_are_journaled(self):
+        self.client.post(self.url, {'action': 'add_grade', 'student_id': self.student.id, 'value': '3'})
+        grade = Grade.objects.latest('id')
+        self.client.post(self.url, {'action': 'edit_grade', 'grade_id': grade.id, 'value': '4+'})
+        self.client.post(self.url, {'action': 'delete_grade', 'grade_id': grade.id})
+
+        events = list(GradeEvent.objects.filter(grade_id=grade.id).order_by('id').values_list('action', 'old_mark', 'new_mark', 'actor'))
+        self.assertEqual(events, [
+            ('created', '', '3', self.assignment.teacher.id),
+            ('changed', '3', '4+', self.assignment.teacher.id),
+            ('deleted', '4+', '', self.assignment.teacher.id),
+        ])
+        first = GradeEvent.objects.filter(grade_id=grade.id).earliest('id')
+        with self.assertNumQueries(1):
+            page = grade_journal.events_since([self.student.id], first.id)
+        self.assertEqual([event['action'] for event in page['events']], ['changed', 'deleted'])
+        self.assertEqual(page['cursor'], first.id)  # świeże zdarzenia nie przesuwają kursora przed SETTLE_TIME
+
+        with self.assertRaises(ValueError):
+            first.save()
+
+    def test_parent_sees_only_children_events(self):
+        for student in (self.student, self.other):
+            grade = Grade.objects.filter(student=student).first()
+            grade_journal.grade_removed(grade, None)
+        client = Client()
+        client.force_login(self.student.parent)
+        page = client.get(reverse('parent_events'), {'after': 0}).json()
+        self.assertEqual({event['student_id'] for event in page['events']}, {self.student.id})
+        self.assertEqual(client.get(reverse('parent_events'), {'after': 'x'}).status_code, 400)
+        self.assertEqual(client.get(reverse('student_events')).status_code, 403)
+
+    def test_archive_writes_jsonl_and_deletes(self):
+        grade = Grade.objects.filter(student=self.student).first()
+        grade_journal.grade_removed(grade, None)
+        grade_journal.grade_added(grade, None)
+        GradeEvent.objects.update(created_at=timezone.now() - timedelta(days=400))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'events.jsonl')
+            call_command('archive_grade_events', before=timezone.localdate().isoformat(), output=path,
+                         batch_size=1, stdout=StringIO())
+            with open(path, encoding='utf-8') as archive:
+                rows = [json.loads(line) for line in archive]
+        self.assertEqual([row['action'] for row in rows], ['deleted', 'created'])
+        self.assertFalse(GradeEvent.objects.exists())
+
+
+class GradeAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=1, students_per_class=2, subjects=1, teachers=1, grades_per_student=2,
+                     random_seed=29, stdout=StringIO())
+        cls.grade = Grade.objects.select_related('student').order_by('id').first()
+        cls.superuser = User.objects.get(email='admin@szkola.pl')
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def stats(self):
+        return GradeStats.objects.get(student=self.grade.student, subject=self.grade.subject_id, school_year=self.grade.school_year_id)
+
+    def test_change_updates_stats_journal_and_cache(self):
+        self.grade.value, self.grade.modifier = 1, ''
+        self.grade.save()
+        grade_stats.rebuild()
+        before = self.stats().sum
+        version = dashboard_cache.version('grades', self.grade.student_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:core_grade_change', args=[self.grade.id]), {
+                'value': '5', 'modifier': '+', 'category': '', 'weight': '1', 'comment': 'Poprawa',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stats().sum, before + Decimal('4.5'))
+        event = GradeEvent.objects.filter(grade_id=self.grade.id).latest('id')
+        self.assertEqual((event.action, event.old_mark, event.new_mark), ('changed', '1', '5+'))
+        self.assertNotEqual(dashboard_cache.version('grades', self.grade.student_id), version)
+
+    def test_bulk_delete_refreshes_stats_and_journal(self):
+        grades = Grade.objects.filter(student=self.grade.student)
+        ids = list(grades.values_list('id', flat=True))
+        self.assertEqual(self.client.get(reverse('admin:core_grade_changelist')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('admin:core_grade_change', args=[self.grade.id])).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:core_grade_changelist'), {
+                'action': 'delete_selected', '_selected_action': ids, 'post': 'yes',
+            })
+        self.assertFalse(grades.exists())
+        self.assertFalse(GradeStats.objects.filter(student=self.grade.student).exists())
+        self.assertEqual(GradeEvent.objects.filter(grade_id__in=ids, action='deleted').count(), len(ids))
+
+
+class GradeStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=1, students_per_class=2, subjects=1, grades_per_student=1,
+                     random_seed=29, stdout=StringIO())
+        cls.student = User.objects.filter(role='student').select_related('parent').order_by('id').first()
+        cls.grade = Grade.objects.filter(student=cls.student).first()
+
+    def remove_grade(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            grade_journal.grade_removed(self.grade, None)
+        return GradeEvent.objects.latest('id').id
+
+    async def test_stream_pushes_child_grade_events(self):
+        client = AsyncClient()
+        await client.aforce_login(self.student.parent)
+        response = await client.get(reverse('parent_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = response.streaming_content
+        self.assertEqual(await anext(chunks), b'retry: 10000\n\n')
+
+        event_id = await sync_to_async(self.remove_grade)()
+        chunk = await anext(chunks)
+        self.assertEqual(chunk, f'id: {event_id}\nevent: grade\ndata: {{"student_id": {self.student.id}}}\n\n'.encode())
+
+        waiting = asyncio.ensure_future(anext(chunks))  # rozłączenie klienta anuluje czekający strumień
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(notifications.subscriber_count(), 0)
+
+    async def test_reconnect_replays_missed_events_from_journal(self):
+        event_id = await sync_to_async(self.remove_grade)()
+        client = AsyncClient()
+        await client.aforce_login(self.student)
+        response = await client.get(reverse('student_stream'), headers={'Last-Event-ID': str(event_id - 1)})
+        chunks = response.streaming_content
+        await anext(chunks)
+        self.assertEqual(await anext(chunks), f'id: {event_id}\nevent: grade\ndata: {{}}\n\n'.encode())
+
+    def test_wsgi_falls_back_to_polling(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('student_stream')).status_code, 204)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=2, students_per_class=3, subjects=2, teachers=2, grades_per_student=3,
+                     random_seed=31, stdout=StringIO())
+        cls.assignment = SubjectAssignment.objects.select_related('teacher').order_by('id').first()
+        cls.student = User.objects.filter(role='student', class_group=cls.assignment.class_group).order_by('id').first()
+
+    def test_student_payload_and_conditional_get(self):
+        self.client.force_login(self.student)
+        url = reverse('api_student')
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(len(data['grades']), Grade.objects.filter(student=self.student).count())
+        grade = dict(zip(data['grade_fields'], data['grades'][0]))
+        self.assertIn(str(grade['subject']), data['subjects'])
+        self.assertIn(str(grade['teacher']), data['teachers'])
+        self.assertEqual(data['student']['average'], services.student_summary(self.student.id)['average'])
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertFalse([q for q in queries if 'core_grade' in q['sql']])
+
+        teacher = Client()
+        teacher.force_login(self.assignment.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher.post(reverse('class_grades_detail', args=[self.assignment.class_group_id, self.assignment.subject_id]),
+                         {'action': 'add_grade', 'student_id': self.student.id, 'value': '5'})
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['grades']), len(data['grades']) + 1)
+
+    def test_parent_payload_lists_only_children(self):
+        self.client.force_login(self.student.parent)
+        data = self.client.get(reverse('api_parent')).json()
+        self.assertEqual([child['id'] for child in data['children']], [self.student.id])
+        self.assertEqual({row[data['grade_fields'].index('student')] for row in data['grades']}, {self.student.id})
+
+    def test_class_gradebook_matches_html_view(self):
+        a = self.assignment
+        self.client.force_login(a.teacher)
+        data = self.client.get(reverse('api_class_grades', args=[a.class_group_id, a.subject_id])).json()
+        page = self.client.get(reverse('class_grades_detail', args=[a.class_group_id, a.subject_id]))
+        self.assertEqual({s['id']: s['average'] for s in data['students']},
+                         {row['student'].id: row['average'] for row in page.context['gradebook']})
+        self.assertEqual(data['subjects'], {str(a.subject_id): a.subject.name})
+
+        other = SubjectAssignment.objects.exclude(teacher=a.teacher).first()
+        self.assertEqual(self.client.get(reverse('api_class_grades', args=[other.class_group_id, other.subject_id])).status_code, 403)
+
+
+class SchoolYearTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=2, students_per_class=3, subjects=2, teachers=2, grades_per_student=3,
+                     random_seed=37, stdout=StringIO())
+        cls.student = User.objects.filter(role='student').select_related('parent').order_by('id').first()
+        # Połowa ocen ucznia "z zeszłego roku": rok zamknięty, więc można go zarchiwizować.
+        cls.current = SchoolYear.current()
+        cls.past = SchoolYear.for_date(cls.current.start - timedelta(days=30))
+        old_ids = list(Grade.objects.filter(student=cls.student).order_by('id').values_list('id', flat=True)[:3])
+        Grade.objects.filter(id__in=old_ids).update(
+            school_year=cls.past, term=2, date_created=timezone.make_aware(datetime.combine(cls.past.end, datetime.min.time())),
+        )
+        grade_stats.rebuild()
+        cls.old_ids = old_ids
+
+    def setUp(self):
+        cache.clear()
+
+    def test_new_grade_gets_year_and_term(self):
+        grade = Grade.objects.exclude(id__in=self.old_ids).first()
+        self.assertEqual(grade.school_year, self.current)
+        self.assertEqual(grade.term, self.current.term_of(grade.date_created))
+        self.assertEqual(self.past.name, f'{self.past.start.year}/{self.past.start.year + 1}')
+        self.assertEqual(self.past.term_of(timezone.make_aware(datetime.combine(self.past.second_term_start, datetime.min.time()))), 2)
+
+    def test_archive_moves_closed_year_only(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_school_year', self.current.name, stdout=StringIO())
+        call_command('archive_school_year', self.past.name, batch_size=2, stdout=StringIO())
+        self.assertFalse(Grade.objects.filter(id__in=self.old_ids).exists())
+        self.assertEqual(sorted(GradeArchive.objects.values_list('id', flat=True)), self.old_ids)
+        self.assertFalse(GradeStats.objects.filter(school_year=self.past).exists())
+        self.past.refresh_from_db()
+        self.assertIsNotNone(self.past.archived_at)
+        self.assertEqual(services.student_summary(self.student.id, self.past)['count'], 3)
+
+    def test_panels_show_current_year_and_archive_on_demand(self):
+        call_command('archive_school_year', self.past.name, stdout=StringIO())
+        self.client.force_login(self.student)
+        current = self.client.get(reverse('student_panel'))
+        self.assertContains(current, 'id="grade-events"')
+        self.assertEqual(current.context['summary']['count'], Grade.objects.filter(student=self.student).count())
+
+        archived = self.client.get(reverse('student_panel'), {'year': self.past.id})
+        self.assertNotContains(archived, 'id="grade-events"')
+        self.assertEqual(archived.context['summary']['count'], 3)
+        data = self.client.get(reverse('api_student'), {'year': self.past.id}).json()
+        self.assertEqual(sorted(row[0] for row in data['grades']), self.old_ids)
+        self.assertEqual(self.client.get(reverse('student_panel'), {'year': 'x'}).status_code, 404)
+
+    def test_school_export_includes_archived_years(self):
+        call_command('archive_school_year', self.past.name, stdout=StringIO())
+        self.client.force_login(User.objects.create(email='sekretariat@szkola.pl', username='sekretariat@szkola.pl', role='admin'))
+        response = self.client.get(reverse('export_school_grades'))
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(content.splitlines(), delimiter=';'))[1:]
+        self.assertEqual(len(rows), Grade.objects.count() + 3)
+        self.assertEqual([row[-2] for row in rows[:3]], [self.past.name] * 3)
+        self.assertEqual({row[-2] for row in rows[3:]}, {self.current.name})
+
+
+class ReportCardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=2, students_per_class=3, subjects=2, teachers=2, grades_per_student=3,
+                     random_seed=41, stdout=StringIO())
+        cls.group = ClassGroup.objects.order_by('name').first()
+        cls.school_year = SchoolYear.current()
+
+    def setUp(self):
+        self.output = self.tmp_dir()
+
+    def tmp_dir(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return tmp.name
+
+    def cards(self, output=None):
+        return {path.name: path.read_text(encoding='utf-8') for path in Path(output or self.output).rglob('*.html')}
+
+    def test_one_query_per_class_and_averages_match(self):
+        students = list(User.objects.filter(class_group=self.group, role='student').values('id', 'first_name', 'last_name'))
+        with self.assertNumQueries(1):
+            cards = report_cards.class_cards(self.group, self.school_year, students, 'weighted')
+        expected = averages.class_averages(self.group.id, 'weighted', self.school_year)
+        self.assertEqual({(card['student']['id'], subject['id']): subject['average'] for card in cards for subject in card['subjects']},
+                         expected)
+        for card in cards:
+            marks = sum(len(subject['marks'][1]) + len(subject['marks'][2]) for subject in card['subjects'])
+            self.assertEqual(marks, Grade.objects.filter(student_id=card['student']['id']).count())
+
+    def test_class_filter_and_resume(self):
+        students = User.objects.filter(class_group=self.group, role='student')
+        call_command('generate_report_cards', output=self.output, classes=[self.group.name], workers=1, stdout=StringIO())
+        self.assertEqual(len(self.cards()), students.count())
+        student = students.values('id', 'first_name', 'last_name').first()
+        path = Path(report_cards.card_path(self.output, self.school_year, self.group.name, student))
+        self.assertIn(f"{student['first_name']} {student['last_name']}, klasa {self.group.name}", path.read_text(encoding='utf-8'))
+
+        path.unlink()
+        out = StringIO()
+        call_command('generate_report_cards', output=self.output, workers=1, stdout=out)
+        self.assertIn(f'wygenerowano {User.objects.filter(role="student").count() - students.count() + 1}, '
+                      f'pominięto {students.count() - 1}', out.getvalue())
+        self.assertEqual(len(self.cards()), User.objects.filter(role='student').count())
+        with self.assertRaises(CommandError):
+            call_command('generate_report_cards', output=self.output, classes=['9Z'], stdout=StringIO())
+
+    def test_process_pool_renders_same_files(self):
+        report_cards.generate(self.output, self.school_year, workers=1)
+        pooled = self.tmp_dir()
+        counts = report_cards.generate(pooled, self.school_year, workers=2)
+        self.assertEqual(counts, {'generated': len(self.cards()), 'skipped': 0})
+        self.assertEqual(self.cards(pooled), self.cards())
+
+    def test_only_current_year(self):
+        past = SchoolYear.for_date(self.school_year.start - timedelta(days=30))
+        with self.assertRaises(ValueError):
+            report_cards.generate(self.output, past, workers=1)
+        self.assertEqual(self.cards(), {})
+
+
+class AccountActivationTests(TestCase):
+    def setUp(self):
+        self.user = User(email='nowy@szkola.pl', username='nowy@szkola.pl', role='teacher',
+                         first_name='Jan', last_name='Nowak')
+        self.token = activation.issue(self.user)
+        self.user.save()
+
+    def activate(self, password='Trudne-haslo-2026'):
+        return self.client.post(reverse('activate_account', args=[self.token]),
+                                {'new_password1': password, 'new_password2': password})
+
+    def test_link_shows_form_and_password_post_activates(self):
+        self.assertFalse(self.user.has_usable_password())
+        response = self.client.get(reverse('activate_account', args=[self.token]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Aktywuj konto')
+        self.assertNotIn('_auth_user_id', self.client.session)  # sam link nie loguje
+
+        response = self.activate()
+        self.assertRedirects(response, reverse('dashboard_router'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('Trudne-haslo-2026'))
+        self.assertEqual((self.user.activation_token, self.user.activation_sent_at), ('', None))
+        self.assertEqual(self.client.get(reverse('teacher_panel')).status_code, 200)
+
+    def test_link_cannot_be_replayed(self):
+        self.activate()
+        self.client.logout()
+        self.assertRedirects(self.client.get(reverse('activate_account', args=[self.token])), reverse('login'))
+        self.assertRedirects(self.activate('Inne-haslo-2026'), reverse('login'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('Trudne-haslo-2026'))
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_link_expires(self):
+        User.objects.filter(id=self.user.id).update(activation_sent_at=timezone.now() - timedelta(days=8))
+        with self.settings(ACCOUNT_ACTIVATION_DAYS=7):
+            self.assertRedirects(self.client.get(reverse('activate_account', args=[self.token])), reverse('login'))
+            self.assertRedirects(self.activate(), reverse('login'))
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.has_usable_password())
+
+    def test_admin_created_teacher_gets_activation_link(self):
+        admin = User.objects.create(email='sekretariat@szkola.pl', username='sekretariat@szkola.pl', role='admin')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin_dashboard'), {
+            'action': 'add_teacher', 'email': 'anna@szkola.pl', 'first_name': 'Anna', 'last_name': 'Lis',
+        }, follow=True)
+        teacher = User.objects.get(email='anna@szkola.pl')
+        self.assertFalse(teacher.has_usable_password())
+        self.assertContains(response, '/activate/')
+
+    def test_pbkdf2_iterations_follow_settings(self):
+        with self.settings(PBKDF2_ITERATIONS=1000):
+            self.assertTrue(make_password('x').startswith('pbkdf2_sha256$1000$'))
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', classes=1, students_per_class=2, subjects=2, random_seed=5, stdout=StringIO())
+        cls.student = User.objects.filter(role='student').select_related('class_group').first()
+
+    async def test_async_panel_and_role_check(self):
+        client = AsyncClient()
+        response = await client.get(reverse('student_panel'))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('student_panel')}", fetch_redirect_response=False)
+
+        await client.aforce_login(self.student)
+        response = await client.get(reverse('student_panel'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.student.class_group.name)
+        self.assertIn('Server-Timing', response)
+        self.assertEqual((await client.get(reverse('teacher_panel'))).status_code, 403)
+
+
+class RequestTimingMiddlewareTests(TestCase):
+    def test_server_timing_header_and_slow_log(self):
+        with self.settings(REQUEST_TIMING_SLOW_MS=0), self.assertLogs('core.slow_requests', 'WARNING') as logs:
+            response = self.client.get(reverse('login'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ SQL", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], reverse('login'))
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['template_ms'], 0)
+
+    def test_unsampled_request_is_not_measured(self):
+        with self.settings(REQUEST_TIMING_SAMPLE_RATE=0):
+            response = self.client.get(reverse('login'))
+        self.assertNotIn('Server-Timing', response)
@@ -1,111 +1,283 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import io
+import json
+
+from asgiref.sync import sync_to_async
+
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.contrib import messages
-from django.contrib.auth.hashers import make_password
-from django.contrib.auth.forms import PasswordChangeForm
-from django.contrib.auth import update_session_auth_hash
+from django.contrib.auth.forms import PasswordChangeForm, SetPasswordForm
+from django.contrib.auth import login, update_session_auth_hash
 from django.db import transaction
-from django.db.models import Q 
-from .models import Grade, User, ClassGroup, Subject, SubjectAssignment
+from django.conf import settings
+from django.db.models import Count, Prefetch, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils.html import format_html_join
+from .models import Grade, GradeCategory, SchoolYear, User, ClassGroup, Subject, SubjectAssignment
+from . import (
+    activation, analytics, api, averages, dashboard_cache, exports, family_import, grade_journal, grade_stats,
+    notifications, school_years, services,
+)
+from .pagination import keyset_page, page_url, prefix_search
+from .permissions import DASHBOARDS, assignment_required, role_of, role_required, teaches
 from .forms import (
     ClassGroupForm, TeacherCreationForm, SubjectForm, 
-    AssignTeacherForm, StudentBasicForm, ParentBasicForm
+    AssignTeacherForm, StudentBasicForm, ParentBasicForm, GradeForm, GradeEntryFormSet, BulkGradeForm, FamilyImportForm
 )
 
 
-def role_required(role_name):
-    def decorator(view_func):
-        @login_required
-        def _wrapped_view(request, *args, **kwargs):
-            if request.user.role == role_name or request.user.is_superuser:
-                return view_func(request, *args, **kwargs)
-            raise PermissionDenied 
-        return _wrapped_view
-    return decorator
-
-
-
 @login_required
 def dashboard_router(request):
-    if request.user.role == 'admin' or request.user.is_superuser:
-        return redirect('admin_dashboard') 
-    elif request.user.role == 'teacher':
-        return redirect('teacher_panel')
-    elif request.user.role == 'parent':
-        return redirect('parent_panel')
-    else:
-        return redirect('student_panel')
+    if not request.user.has_usable_password():
+        return redirect('change_password')
+    return redirect(DASHBOARDS.get(role_of(request.user), 'student_panel'))
 
 @login_required
 def change_password(request):
+    # Konto z linku aktywacyjnego nie ma jeszcze hasła - ustawia je bez podawania starego.
+    form_class = PasswordChangeForm if request.user.has_usable_password() else SetPasswordForm
     if request.method == 'POST':
-        form = PasswordChangeForm(request.user, request.POST)
+        form = form_class(request.user, request.POST)
         if form.is_valid():
-            user = form.save()
+            user = form.save(commit=False)
+            user.activation_token, user.activation_sent_at = '', None
+            user.save(update_fields=['password', 'activation_token', 'activation_sent_at'])
             update_session_auth_hash(request, user)
             messages.success(request, 'Twoje hasło zostało pomyślnie zmienione!')
             return redirect('dashboard_router')
         else:
             messages.error(request, 'Popraw błędy w formularzu.')
     else:
-        form = PasswordChangeForm(request.user)
+        form = form_class(request.user)
+        if form_class is SetPasswordForm:
+            messages.info(request, 'Ustaw własne hasło, aby aktywować konto.')
     return render(request, 'core/change_password.html', {'form': form})
 
+def activate_account(request, token):
+    # Sam link (GET) nie loguje - token zużywa dopiero POST z nowym hasłem.
+    user = activation.user_for_token(token)
+    if user is None:
+        messages.error(request, 'Link aktywacyjny jest nieprawidłowy, wygasł albo został już wykorzystany.')
+        return redirect('login')
+    if request.method == 'POST':
+        form = SetPasswordForm(user, request.POST)
+        if form.is_valid():
+            user = form.save(commit=False)
+            if not activation.activate(user, token):
+                messages.error(request, 'Link aktywacyjny został już wykorzystany.')
+                return redirect('login')
+            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+            messages.success(request, 'Konto aktywne - możesz korzystać z dziennika.')
+            return redirect('dashboard_router')
+        messages.error(request, 'Popraw błędy w formularzu.')
+    else:
+        form = SetPasswordForm(user)
+    return render(request, 'core/change_password.html', {'form': form, 'activation': True})
+
 
 
+# Panele tylko do odczytu są async: pod ASGI (uvicorn) czekanie na bazę nie blokuje wątku.
+# Konteksty fragmentów zwracają gotowe listy - szablon nie może już odpytywać bazy.
+# Panele ucznia i rodzica pokazują bieżący rok szkolny; ?year=<id> pokazuje rok archiwalny.
+
+async def year_context(school_year):
+    return {'school_year': school_year, 'school_years': [year async for year in SchoolYear.objects.all()]}
+
 @role_required('student')
-def student_panel(request):
-    grades_list = Grade.objects.filter(student=request.user).select_related('subject', 'teacher').order_by('subject__name')
-    all_values = [g.value for g in grades_list]
-    average = round(sum(all_values) / len(all_values), 2) if all_values else 0
-    
-    return render(request, 'core/student_dashboard.html', {
-        'grades_list': grades_list,
-        'average': average
-    })
+async def student_panel(request):
+    async def context():
+        events_cursor = await grade_journal.alatest_cursor([request.user.id]) if school_year.is_current else 0  # przed odczytem ocen
+        grades_list = [grade async for grade in school_years.grades_of(school_year).filter(student=request.user).select_related('teacher', 'category').order_by('date_created', 'id')]
+        class_group = await ClassGroup.objects.filter(id=request.user.class_group_id).afirst()
+        return {'summary': services.attach_grades(await services.astudent_summary(request.user.id, school_year), grades_list),
+                'class_group': class_group, 'events_cursor': events_cursor, **await year_context(school_year)}
+
+    school_year = await school_years.aselected(request)
+    fragment = await dashboard_cache.arender_fragment(
+        'student', [request.user.id, school_year.id, await dashboard_cache.aversion('grades', request.user.id)],
+        'core/fragments/student_dashboard.html', context, request,
+    )
+    return render(request, 'core/student_dashboard.html', {'fragment': fragment})
 
 @role_required('teacher')
-def teacher_panel(request):
-    assignments = SubjectAssignment.objects.filter(teacher=request.user).select_related('subject', 'class_group')
-    return render(request, 'core/teacher_dashboard.html', {'assignments': assignments})
+async def teacher_panel(request):
+    async def context():
+        assignments = SubjectAssignment.objects.filter(teacher=request.user).select_related('subject', 'class_group').annotate(
+            student_count=Count('class_group__user', filter=Q(class_group__user__role='student'))
+        )
+        assignments = [a async for a in assignments.order_by('class_group__name', 'subject__name')]
+        overview = await services.ateacher_overview(request.user.id, school_year)
+        for a in assignments:
+            a.stats = overview.get((a.class_group_id, a.subject_id))
+        return {'assignments': assignments}
+
+    school_year = await SchoolYear.acurrent()
+    fragment = await dashboard_cache.arender_fragment(
+        'teacher', [request.user.id, school_year.id, await dashboard_cache.aversion('teacher', request.user.id), await dashboard_cache.aversion(dashboard_cache.ROSTER)],
+        'core/fragments/teacher_dashboard.html', context, request,
+    )
+    return render(request, 'core/teacher_dashboard.html', {'fragment': fragment})
 
 @role_required('parent')
-def parent_panel(request):
-    children = User.objects.filter(parent=request.user).prefetch_related(
-        'grades_received__subject', 'grades_received__teacher'
-    ).select_related('class_group')
+async def parent_panel(request):
+    async def context():
+        events_cursor = await grade_journal.alatest_cursor(child_ids) if school_year.is_current else 0  # przed odczytem ocen
+        children = [child async for child in User.objects.filter(parent=request.user).select_related('class_group')]
+        grades = [grade async for grade in school_years.grades_of(school_year).filter(student_id__in=child_ids)
+                  .select_related('teacher', 'category').order_by('date_created', 'id')]
+        summaries = await services.agrade_summary([child.id for child in children], school_year)
+
+        for child in children:
+            grades_list = [grade for grade in grades if grade.student_id == child.id]
+            child.summary = services.attach_grades(summaries[child.id], grades_list)
+            child.teachers_contact = {g.teacher for g in grades_list if g.teacher is not None}
+        return {'children': children, 'events_cursor': events_cursor, **await year_context(school_year)}
+
+    school_year = await school_years.aselected(request)
+    child_ids = [pk async for pk in User.objects.filter(parent=request.user).order_by('id').values_list('id', flat=True)]
+    fragment = await dashboard_cache.arender_fragment(
+        'parent', [request.user.id, school_year.id, *child_ids, *await dashboard_cache.aversions('grades', child_ids)],
+        'core/fragments/parent_dashboard.html', context, request,
+    )
+    return render(request, 'core/parent_dashboard.html', {'fragment': fragment})
+
+async def grade_events(request, student_ids):
+    """Zdarzenia z dziennika zmian ocen po kursorze ?after= (odpytywane z paneli ucznia i rodzica)."""
+    try:
+        cursor = int(request.GET.get('after', 0))
+    except ValueError:
+        return HttpResponseBadRequest("Niepoprawny kursor.")
+    return JsonResponse(await grade_journal.aevents_since(student_ids, cursor))
 
-    for child in children:
-        child.grades_list = child.grades_received.all().order_by('subject__name')
-        all_values = [g.value for g in child.grades_list]
-        child.average = round(sum(all_values) / len(all_values), 2) if all_values else 0
-        child.teachers_contact = {g.teacher for g in child.grades_list}
+@role_required('student')
+async def student_events(request):
+    return await grade_events(request, [request.user.id])
+
+@role_required('parent')
+async def parent_events(request):
+    child_ids = [pk async for pk in User.objects.filter(parent=request.user).values_list('id', flat=True)]
+    return await grade_events(request, child_ids)
+
+async def grade_stream(request, student_ids):
+    """SSE "nowa zmiana ocen ucznia X" z core.notifications; szczegóły klient dociąga z *_events.
+
+    Czekający strumień to tylko korutyna i kolejka - połączenie z bazą zamykamy po odczycie kursora. Po
+    ponownym połączeniu (Last-Event-ID) jedno zapytanie do dziennika nadrabia
+    zdarzenia, które przyszły w przerwie albo z innego procesu.
+    """
+    try:
+        cursor = int(request.headers.get('Last-Event-ID') or request.GET.get('after', 0))
+    except ValueError:
+        return HttpResponseBadRequest("Niepoprawny kursor.")
+
+    async def stream():
+        subscription = notifications.subscribe(student_ids)  # przed odczytem dziennika - nic nie zginie pomiędzy
+        try:
+            latest = await grade_journal.alatest_cursor(student_ids)
+            await sync_to_async(notifications.release_connections)()
+            yield 'retry: 10000\n\n'
+            if latest > cursor:
+                yield f'id: {latest}\nevent: grade\ndata: {{}}\n\n'
+            while True:
+                item = await subscription.get(timeout=notifications.HEARTBEAT)
+                if item is None:
+                    yield ': ping\n\n'
+                    continue
+                student_id, event_id = item
+                yield f'id: {event_id}\nevent: grade\ndata: {json.dumps({"student_id": student_id})}\n\n'
+        finally:
+            subscription.close()
+
+    return StreamingHttpResponse(stream(), content_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@role_required('student')
+async def student_stream(request):
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)  # pod WSGI strumień zająłby wątek; 204 = EventSource kończy, panel odpytuje
+    return await grade_stream(request, [request.user.id])
+
+@role_required('parent')
+async def parent_stream(request):
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    child_ids = [pk async for pk in User.objects.filter(parent=request.user).values_list('id', flat=True)]
+    return await grade_stream(request, child_ids)
 
-    return render(request, 'core/parent_dashboard.html', {'children': children})
+
+# JSON dla aplikacji mobilnej (core.api): ETag z wersji w cache, więc 304 nie odpytuje tabeli ocen.
+
+@role_required('student')
+async def api_student(request):
+    school_year = await school_years.aselected(request)
+    tag = api.etag('student', request.user.id, school_year.id, await dashboard_cache.aversion('grades', request.user.id),
+                   await dashboard_cache.aversion(dashboard_cache.CATEGORIES))
+    if response := api.not_modified(request, tag):
+        return response
+    class_group = await ClassGroup.objects.filter(id=request.user.class_group_id).afirst()
+    return api.json_response(request, await api.astudent_data(request.user, class_group, school_year), tag)
+
+@role_required('parent')
+async def api_parent(request):
+    school_year = await school_years.aselected(request)
+    child_ids = [pk async for pk in User.objects.filter(parent=request.user).order_by('id').values_list('id', flat=True)]
+    tag = api.etag('parent', request.user.id, school_year.id, *child_ids, *await dashboard_cache.aversions('grades', child_ids),
+                   await dashboard_cache.aversion(dashboard_cache.CATEGORIES))
+    if response := api.not_modified(request, tag):
+        return response
+    children = [child async for child in User.objects.filter(id__in=child_ids).select_related('class_group').order_by('id')]
+    return api.json_response(request, await api.aparent_data(children, school_year), tag)
+
+@role_required('teacher')
+async def api_teacher(request):
+    school_year = await SchoolYear.acurrent()
+    tag = api.etag('teacher', request.user.id, school_year.id, await dashboard_cache.aversion('teacher', request.user.id),
+                   await dashboard_cache.aversion(dashboard_cache.ROSTER))
+    if response := api.not_modified(request, tag):
+        return response
+    return api.json_response(request, await api.ateacher_data(request.user.id, school_year), tag)
+
+@role_required('teacher')
+@assignment_required
+def api_class_grades(request, class_id, subject_id):
+    students = list(User.objects.filter(class_group_id=class_id, role='student').order_by('last_name', 'id'))
+    school_year = SchoolYear.current()
+    tag = api.etag('class', class_id, subject_id, school_year.id, *[student.id for student in students],
+                   *dashboard_cache.versions('grades', [student.id for student in students]),
+                   dashboard_cache.version(dashboard_cache.CATEGORIES))
+    if response := api.not_modified(request, tag):
+        return response
+    group = get_object_or_404(ClassGroup, id=class_id)
+    subject = get_object_or_404(Subject, id=subject_id)
+    return api.json_response(request, api.gradebook_data(group, subject, students, school_year), tag)
 
 
 @role_required('admin')
 def admin_dashboard(request):
-    stats = {
-        'total_students': User.objects.filter(role='student').count(),
-        'total_teachers': User.objects.filter(role='teacher').count(),
-        'total_classes': ClassGroup.objects.count(),
-        'total_subjects': Subject.objects.count(),
-    }
-
     student_q = request.GET.get('student_q', '')
     teacher_q = request.GET.get('teacher_q', '')
-
-    classes = ClassGroup.objects.all().order_by('name')
-    subjects = Subject.objects.all().order_by('name')
-    students = User.objects.filter(role='student').select_related('class_group', 'parent').order_by('last_name')
-    teachers = User.objects.filter(role='teacher').order_by('last_name')
-
-    if student_q:
-        students = students.filter(Q(last_name__icontains=student_q) | Q(first_name__icontains=student_q) | Q(email__icontains=student_q))
-    if teacher_q:
-        teachers = teachers.filter(Q(last_name__icontains=teacher_q) | Q(first_name__icontains=teacher_q) | Q(email__icontains=teacher_q))
+    page_size = settings.ADMIN_PAGE_SIZE
+
+    classes = list(ClassGroup.objects.annotate(student_count=Count('user')).order_by('name'))
+    subjects = list(Subject.objects.all().order_by('name'))
+    stats = User.objects.aggregate(
+        total_students=Count('id', filter=Q(role='student')),
+        total_teachers=Count('id', filter=Q(role='teacher')),
+    )
+    stats['total_classes'] = len(classes)
+    stats['total_subjects'] = len(subjects)
+    students = prefix_search(User.objects.filter(role='student').select_related('class_group', 'parent'), student_q)
+    teachers = prefix_search(User.objects.filter(role='teacher'), teacher_q)
+    students = keyset_page(students, page_size, request.GET.get('student_after'), request.GET.get('student_before'))
+    teachers = keyset_page(teachers, page_size, request.GET.get('teacher_after'), request.GET.get('teacher_before'))
+    pages = {
+        'students_next': page_url(request, student_after=students.next_cursor, student_before=None),
+        'students_previous': page_url(request, student_before=students.previous_cursor, student_after=None),
+        'teachers_next': page_url(request, teacher_after=teachers.next_cursor, teacher_before=None),
+        'teachers_previous': page_url(request, teacher_before=teachers.previous_cursor, teacher_after=None),
+    }
 
     class_form = ClassGroupForm()
     subject_form = SubjectForm()
@@ -139,9 +311,9 @@ def admin_dashboard(request):
                 teacher = teacher_form.save(commit=False)
                 teacher.username = teacher.email 
                 teacher.role = 'teacher'
-                teacher.password = make_password('nauczyciel123')
+                token = activation.issue(teacher)
                 teacher.save()
-                messages.success(request, f"Nauczyciel {teacher.first_name} utworzony!")
+                messages.success(request, f"Nauczyciel {teacher.first_name} utworzony! Link aktywacyjny: {activation.activation_url(request, token)}")
                 return redirect('/admin-panel/#staff-pane')
 
         elif action == 'assign_teacher':
@@ -150,10 +322,12 @@ def admin_dashboard(request):
                 teacher = assign_form.cleaned_data['teacher']
                 subject = assign_form.cleaned_data['subject']
                 class_group = assign_form.cleaned_data['class_group']
+                previous = SubjectAssignment.objects.filter(subject=subject, class_group=class_group).values_list('teacher_id', flat=True).first()
                 SubjectAssignment.objects.update_or_create(
                     subject=subject, class_group=class_group, 
                     defaults={'teacher': teacher}
                 )
+                dashboard_cache.bump_assignments(*{teacher.id, previous} - {None})
                 messages.success(request, f"Przypisano {teacher.last_name} do {subject.name}")
                 return redirect('/admin-panel/#staff-pane')
 
@@ -166,28 +340,64 @@ def admin_dashboard(request):
                         parent = parent_f.save(commit=False)
                         parent.username = parent.email
                         parent.role = 'parent'
-                        parent.password = make_password('rodzic123')
+                        parent_token = activation.issue(parent)
                         parent.save()
                         student = student_f.save(commit=False)
                         student.username = student.email
                         student.role = 'student'
-                        student.password = make_password('uczen123')
+                        student_token = activation.issue(student)
                         student.parent = parent
                         student.save()
+                        dashboard_cache.bump_roster()
                     messages.success(request, f"Dodano duet: {student.last_name} + Rodzic")
+                    messages.info(request, f"Link aktywacyjny ucznia: {activation.activation_url(request, student_token)}")
+                    messages.info(request, f"Link aktywacyjny rodzica: {activation.activation_url(request, parent_token)}")
                     return redirect('/admin-panel/#students-pane')
                 except Exception as e:
                     messages.error(request, f"Błąd bazy danych: {e}")
 
+    analytics_data = analytics.dashboard_data()
+    analytics_rankings = [
+        ("Ranking klas", analytics_data['classes']),
+        ("Ranking przedmiotów", analytics_data['subjects']),
+        ("Ranking nauczycieli", analytics_data['teachers']),
+    ] if analytics_data else []
+
     return render(request, 'core/admin_dashboard.html', {
+        'analytics': analytics_data, 'analytics_rankings': analytics_rankings,
         'stats': stats, 'classes': classes, 'teachers': teachers, 'subjects': subjects,
         'students': students, 'class_form': class_form, 'subject_form': subject_form,
         'teacher_form': teacher_form, 'assign_form': assign_form,
         'student_f': student_f, 'parent_f': parent_f,
-        'student_search': student_q, 'teacher_search': teacher_q
+        'student_search': student_q, 'teacher_search': teacher_q, 'pages': pages,
     })
 
 
+@role_required('admin')
+def import_families(request):
+    form = FamilyImportForm()
+    result = None
+    if request.method == 'POST':
+        form = FamilyImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            source = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            try:
+                result = family_import.import_families(source)
+            except family_import.FamilyImportError as e:
+                form.add_error('file', str(e))
+            except UnicodeDecodeError:
+                form.add_error('file', "Plik musi być zapisany w kodowaniu UTF-8.")
+            else:
+                messages.success(request, f"Dodano {result.students} uczniów i {result.parents} rodziców.")
+                if result.errors:
+                    messages.error(request, f"Pominięto błędne wiersze: {len(result.errors)}.")
+    activations = [
+        (email, role, activation.activation_url(request, token)) for email, role, token in result.activations
+    ] if result else []
+    return render(request, 'core/import_families.html', {
+        'form': form, 'result': result, 'activations': activations, 'columns': ';'.join(family_import.COLUMNS),
+    })
+
 @role_required('admin')
 def edit_student_family(request, student_id):
     student = get_object_or_404(User, id=student_id, role='student')
@@ -199,6 +409,8 @@ def edit_student_family(request, student_id):
             with transaction.atomic():
                 s_form.save()
                 if p_form: p_form.save()
+                dashboard_cache.bump_grades(student.id)
+                dashboard_cache.bump_roster()
             messages.success(request, "Zaktualizowano dane rodziny.")
             return redirect('/admin-panel/#students-pane')
     else:
@@ -209,24 +421,37 @@ def edit_student_family(request, student_id):
 @role_required('admin')
 def delete_student_family(request, student_id):
     student = get_object_or_404(User, id=student_id, role='student')
-    if student.parent: student.parent.delete()
-    student.delete()
+    with transaction.atomic():
+        if student.parent: student.parent.delete()
+        student.delete()
+        dashboard_cache.bump_grades(student_id)
+        dashboard_cache.bump_roster()
     messages.success(request, "Usunięto rodzinę.")
     return redirect('/admin-panel/#students-pane')
 
 @role_required('admin')
 def delete_class(request, class_id):
-    class_obj = get_object_or_404(ClassGroup, id=class_id)
-    if class_obj.user_set.count() > 0:
+    class_obj = get_object_or_404(ClassGroup.objects.annotate(student_count=Count('user')), id=class_id)
+    if class_obj.student_count > 0:
         messages.error(request, "Klasa posiada uczniów!")
     else:
+        teacher_ids = set(class_obj.subjectassignment_set.values_list('teacher_id', flat=True))
         class_obj.delete()
+        dashboard_cache.bump_roster()
+        dashboard_cache.bump_assignments(*teacher_ids)
         messages.success(request, "Klasa usunięta.")
     return redirect('/admin-panel/#dashboard-pane')
 
 @role_required('admin')
 def delete_teacher(request, teacher_id):
-    get_object_or_404(User, id=teacher_id, role='teacher').delete()
+    teacher = get_object_or_404(User, id=teacher_id, role='teacher')
+    with transaction.atomic():
+        pairs = grade_stats.affected_pairs(teacher.grades_given.all())
+        grade_journal.grades_removed(teacher.grades_given.all(), request.user)
+        teacher.delete()
+        grade_stats.refresh_pairs(pairs)
+        dashboard_cache.bump_grades(*{student_id for student_id, *_ in pairs})
+        dashboard_cache.bump_roster()  # statystyki klas w panelach pozostałych nauczycieli
     messages.success(request, "Nauczyciel usunięty.")
     return redirect('/admin-panel/#staff-pane')
 
@@ -236,7 +461,10 @@ def delete_subject(request, subject_id):
     if SubjectAssignment.objects.filter(subject=subject).exists():
         messages.error(request, "Przedmiot jest przypisany!")
     else:
-        subject.delete()
+        with transaction.atomic():
+            student_ids = grade_journal.grades_removed(subject.grade_set.all(), request.user)
+            subject.delete()
+            dashboard_cache.bump_grades(*student_ids)
         messages.success(request, "Przedmiot usunięty.")
     return redirect('/admin-panel/#dashboard-pane')
 
@@ -249,6 +477,8 @@ def edit_teacher(request, teacher_id):
             teacher = form.save(commit=False)
             teacher.username = teacher.email 
             teacher.save()
+            # Dane kontaktowe nauczyciela są w panelach rodziców jego uczniów.
+            dashboard_cache.bump_grades(*teacher.grades_given.values_list('student_id', flat=True).distinct())
             messages.success(request, f"Zaktualizowano nauczyciela {teacher.last_name}")
             return redirect('/admin-panel/#staff-pane')
     else:
@@ -256,9 +486,9 @@ def edit_teacher(request, teacher_id):
     return render(request, 'core/edit_teacher.html', {'form': form, 'teacher': teacher})
 
 @role_required('admin')
-def teacher_details(request, teacher_id):
-    teacher = get_object_or_404(User, id=teacher_id, role='teacher')
-    assignments = SubjectAssignment.objects.filter(teacher=teacher).select_related('subject', 'class_group').order_by('class_group__name')
+async def teacher_details(request, teacher_id):
+    teacher = await aget_object_or_404(User, id=teacher_id, role='teacher')
+    assignments = [a async for a in SubjectAssignment.objects.filter(teacher=teacher).select_related('subject', 'class_group').order_by('class_group__name')]
     return render(request, 'core/teacher_details.html', {'teacher': teacher, 'assignments': assignments})
 
 @role_required('admin')
@@ -266,36 +496,170 @@ def remove_assignment(request, assignment_id):
     assignment = get_object_or_404(SubjectAssignment, id=assignment_id)
     teacher_id = assignment.teacher.id # Zapamiętujemy ID, żeby wrócić na ten sam profil
     assignment.delete()
+    dashboard_cache.bump_assignments(teacher_id)
     messages.success(request, "Przypisanie zostało usunięte.")
     return redirect('teacher_details', teacher_id=teacher_id)
 
+def build_gradebook(students, grades):
+    """Układa oceny w wiersze dziennika (uczeń -> oceny) w jednym przejściu; średnie wg GRADE_AVERAGE_MODE."""
+    rows = {}
+    for student in students:
+        rows[student.id] = {'student': student, 'grades': [], 'count': 0, 'average': None}
+    shown = []
+    for grade in grades:
+        row = rows.get(grade.student_id)
+        if row is None:
+            continue
+        row['grades'].append(grade)
+        row['count'] += 1
+        shown.append(grade)
+    for (student_id, _), average in averages.compute(averages.object_columns(shown)).items():
+        rows[student_id]['average'] = average
+    return list(rows.values())
+
+def gradebook_changed(request, class_id, subject_id, *student_ids):
+    """Po zapisie ocen: panele uczniów/rodziców i statystyki klasy w panelu nauczyciela."""
+    dashboard_cache.bump_grades(*student_ids)
+    if request.user.role == 'teacher':
+        teacher_id = request.user.id  # assignment_required: to jego przypisanie
+    else:
+        teacher_id = SubjectAssignment.objects.filter(
+            class_group_id=class_id, subject_id=subject_id
+        ).values_list('teacher_id', flat=True).first()
+    if teacher_id is not None:
+        dashboard_cache.bump_teachers(teacher_id)
+
+def save_bulk_grades(request, group, subject, school_year, students, formset, options):
+    """Zapisuje oceny całej klasy jednym bulk_create. Zwraca False, gdy formularz ma błędy."""
+    if not (formset.is_valid() and options.is_valid()):
+        return False
+
+    by_id = {student.id: student for student in students}
+    new_grades = []
+    for form in formset:
+        value = form.cleaned_data.get('value')
+        if value is None:
+            continue
+        student = by_id.get(form.cleaned_data['student_id'])
+        if student is None:
+            form.add_error(None, "Uczeń nie należy do tej klasy.")
+            continue
+        grade = Grade(student=student, teacher=request.user, subject=subject, comment=form.cleaned_data['comment'])
+        grade.value, grade.modifier = value
+        grade.set_category(options.cleaned_data['category'])
+        grade.score = grade.build_score()  # bulk_create omija Grade.save()
+        grade.assign_school_year(school_year)
+        new_grades.append(grade)
+    if any(form.errors for form in formset):
+        return False
+
+    with transaction.atomic():
+        Grade.objects.bulk_create(new_grades)
+        grade_stats.grades_added(new_grades)
+        grade_journal.grades_added(new_grades, request.user)
+        gradebook_changed(request, group.id, subject.id, *{grade.student_id for grade in new_grades})
+    for grade in new_grades:
+        messages.success(request, f"Dodano ocenę dla: {grade.student.last_name}")
+    return True
+
+def select_options(choices, selected=''):
+    return format_html_join('', '<option value="{}"{}>{}</option>', (
+        (value, ' selected' if str(value) == str(selected) else '', label) for value, label in choices
+    ))
+
+def render_class_grades(request, group, subject, students, grades, bulk_formset=None, bulk_options=None):
+    gradebook = build_gradebook(students, grades)
+    # Każdy modal edycji ma własne <select>; listy opcji renderujemy raz na możliwą wartość, nie raz na ocenę.
+    mark_options = {mark: select_options(Grade.MARK_CHOICES, mark) for mark, _ in Grade.MARK_CHOICES}
+    category_choices = [('', 'Bez kategorii (waga 1)')] + [(c.id, str(c)) for c in GradeCategory.objects.all()]
+    category_options = {value: select_options(category_choices, value) for value, _ in category_choices}
+    for row in gradebook:
+        for grade in row['grades']:
+            grade.mark_options = mark_options[grade.mark]
+            grade.category_options = category_options.get(grade.category_id or '', category_options[''])
+    if bulk_formset is None:
+        bulk_formset = GradeEntryFormSet(prefix='bulk', initial=[{'student_id': row['student'].id} for row in gradebook])
+    if bulk_options is None:
+        bulk_options = BulkGradeForm(prefix='bulk')
+    by_id = {row['student'].id: row['student'] for row in gradebook}
+    for form in bulk_formset:
+        try:
+            form.student = by_id.get(int(form['student_id'].value()))
+        except (TypeError, ValueError):
+            form.student = None
+    return render(request, 'core/class_grades_detail.html', {
+        'group': group, 'subject': subject, 'gradebook': gradebook, 'bulk_formset': bulk_formset,
+        'bulk_options': bulk_options, 'mark_options': mark_options['5'], 'category_options': category_options[''],
+        'bulk_category_options': select_options(category_choices, bulk_options['category'].value() or ''),
+    })
+
 @role_required('teacher')
+@assignment_required
 def class_grades_detail(request, class_id, subject_id):
     group = get_object_or_404(ClassGroup, id=class_id)
     subject = get_object_or_404(Subject, id=subject_id)
     students = User.objects.filter(class_group=group, role='student').order_by('last_name')
-    grades = Grade.objects.filter(subject=subject, student__class_group=group).select_related('student')
+    school_year = SchoolYear.current()
+    # Także zakres edycji i usuwania: tylko oceny z tego dziennika (klasa, przedmiot, bieżący rok).
+    grades = Grade.objects.filter(subject=subject, school_year=school_year, student__class_group=group).select_related('category').order_by('date_created', 'id')
 
     if request.method == 'POST':
         action = request.POST.get('action')
-        if action == 'add_grade':
-            student = get_object_or_404(User, id=request.POST.get('student_id'), role='student')
-            Grade.objects.create(
-                student=student, teacher=request.user, subject=subject,
-                value=request.POST.get('value'), comment=request.POST.get('comment', '')
-            )
+        form = GradeForm(request.POST)
+        if action in ('add_grade', 'edit_grade') and not form.is_valid():
+            messages.error(request, "Niepoprawna ocena: " + " ".join(e for errors in form.errors.values() for e in errors))
+        elif action == 'add_grade':
+            student = get_object_or_404(User, id=request.POST.get('student_id'), role='student', class_group=group)
+            grade = Grade(student=student, teacher=request.user, subject=subject, comment=form.cleaned_data['comment'])
+            grade.value, grade.modifier = form.cleaned_data['value']
+            grade.set_category(form.cleaned_data['category'])
+            grade.assign_school_year(school_year)
+            with transaction.atomic():
+                grade.save()
+                grade_stats.grade_added(grade)
+                grade_journal.grade_added(grade, request.user)
+                gradebook_changed(request, class_id, subject_id, student.id)
             messages.success(request, f"Dodano ocenę dla: {student.last_name}")
         elif action == 'edit_grade':
-            grade = get_object_or_404(Grade, id=request.POST.get('grade_id'), teacher=request.user)
-            grade.value = request.POST.get('value')
-            grade.comment = request.POST.get('comment', '')
-            grade.save()
+            grade = get_object_or_404(grades, id=request.POST.get('grade_id'), teacher=request.user)
+            old_score, old_mark, old_weight = grade.score, grade.mark, grade.weight
+            grade.value, grade.modifier = form.cleaned_data['value']
+            grade.comment = form.cleaned_data['comment']
+            category = form.cleaned_data['category']
+            if (category.id if category else None) != grade.category_id:
+                grade.set_category(category)
+            with transaction.atomic():
+                grade.save()
+                grade_stats.grade_changed(grade, old_score, old_weight)
+                grade_journal.grade_changed(grade, old_mark, old_weight, request.user)
+                gradebook_changed(request, class_id, subject_id, grade.student_id)
             messages.success(request, "Zaktualizowano ocenę.")
         elif action == 'delete_grade':
-            get_object_or_404(Grade, id=request.POST.get('grade_id'), teacher=request.user).delete()
+            grade = get_object_or_404(grades, id=request.POST.get('grade_id'), teacher=request.user)
+            with transaction.atomic():
+                grade_journal.grade_removed(grade, request.user)
+                grade.delete()
+                grade_stats.grade_removed(grade)
+                gradebook_changed(request, class_id, subject_id, grade.student_id)
             messages.success(request, "Usunięto ocenę.")
+        elif action == 'bulk_grades':
+            bulk_formset = GradeEntryFormSet(request.POST, prefix='bulk')
+            bulk_options = BulkGradeForm(request.POST, prefix='bulk')
+            if not save_bulk_grades(request, group, subject, school_year, students, bulk_formset, bulk_options):
+                messages.error(request, "Popraw błędy w formularzu ocen dla całej klasy.")
+                return render_class_grades(request, group, subject, students, grades, bulk_formset, bulk_options)
         return redirect('class_grades_detail', class_id=class_id, subject_id=subject_id)
 
-    return render(request, 'core/class_grades_detail.html', {
-        'group': group, 'subject': subject, 'students': students, 'grades': grades,
-    })
\ No newline at end of file
+    return render_class_grades(request, group, subject, students, grades)
+
+@role_required('teacher', 'admin')
+def export_class_grades(request, class_id, subject_id):
+    if role_of(request.user) != 'admin' and not teaches(request.user, class_id, subject_id):
+        raise PermissionDenied
+    group = get_object_or_404(ClassGroup, id=class_id)
+    subject = get_object_or_404(Subject, id=subject_id)
+    return exports.csv_response(request, exports.class_grades(group, subject), f"oceny_{group.name}_{subject.name}.csv")
+
+@role_required('admin')
+def export_school_grades(request):
+    return exports.csv_response(request, exports.school_grades(), "oceny_szkola.csv")
\ No newline at end of file